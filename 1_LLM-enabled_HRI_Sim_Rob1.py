@@ -26,47 +26,232 @@ Optional: COMPAS FAB or a similar robotics framework for implementing the genera
 """
 # Import prerequisite libraries
 import os
-from openai import OpenAI
-from playsound import playsound
-from HRILLM import AudioToText, generate_response_robmove, TextToAudio, generate_response_ask4conf, confirm2action
+import time
+import importlib.util
+startTime = time.perf_counter()
+from HRILLM import AudioToText, generate_response_robmove, generate_response_robmove_local, TextToAudio, generate_response_ask4conf, speak_ask4conf_streaming, confirm2action, generate_response_fused, generate_response_template, speak_streaming, TRACER, JSONLExporter, HotkeyDictationRecognizer, VoskRecognizer, SpeculativeInterpreter, CachedClient, ResponseCache, AudioClipCache, CONFIRM_TEXT_ACCEPTED, CONFIRM_TEXT_REJECTED, create_client, load_test_sessions, load_prompt_table, extract_prompts, MotionDelta, MotionQueue, confirm2action_bargein, synthesize_speech_chunks, KeyboardDecision, speech_decision, UsageLedger, MeteredClient, BudgetExceeded, CONFIRMATION_PHRASES, play_pcm
 
 # locate audio streaming file location
 audioStreamFilePath = "AudioStream\speech.mp3"
 
-# set API key
-client = OpenAI(
+# interpret simple movement commands locally and only ask the LLM when the parser is unsure
+useLocalParser = True
+
+# how the confirmation is produced: "two-call" (robmove then ask4conf), "fused" (one JSON request)
+# or "template" (rendered locally from the parsed deltas)
+confirmationMode = "two-call"
+
+# speak the confirmation sentence by sentence while it is still being generated (without useBargeIn)
+useStreamingSpeech = True
+
+# play the fixed confirmation phrases from pre-rendered clips held in memory; in "template" mode the
+# confirmation itself is spoken from phrase and distance clips, only the repeated command is synthesized
+useAudioClipCache = True
+
+# speech recognition backend: None keeps the Windows dictation hotkey (Win+H),
+# a Vosk model folder switches to offline streaming recognition with automatic end of utterance
+voskModelPath = None
+
+# interpret stable partial transcripts while the operator is still speaking (needs a backend with
+# partial transcripts, i.e. voskModelPath)
+useSpeculativeInterpretation = True
+
+# write every timing span to this JSONL file (None to only print the per-stage summary)
+traceFilePath = None
+
+# cache repeated chat requests on disk; the cache file is shared by the interactive and batch scripts
+useResponseCache = True
+
+# book tokens, speech characters, latency and cost of every API call of this shift in Cache\usage.sqlite
+# and end the session once a budget is used up; usageWindowBudget applies to the last hour of operator
+# shifts (batch runs booked in the same file do not count), reloaded from the file on a restart
+useUsageLedger = True
+usageBudget = None # e.g. {"cost": 2.0}
+usageWindowBudget = None # e.g. {"cost": 0.5, "tts_characters": 20000}
+
+# open the connection to the API at start-up so the first command does not pay for the handshake
+warmUpClient = True
+
+# play the question in the background and listen for the answer at the same time, so the operator can
+# confirm or cancel mid-sentence (needs sounddevice to cut the audio off; without it the question is
+# played first and the answer read afterwards)
+useBargeIn = True
+
+# refuse moves outside the workspace or larger than the per-move cap before asking for confirmation
+checkMotionEnvelope = True
+
+# load test instead of the interactive loop: number of simulated operators sharing one process
+# against the local stub API (0 runs the interactive session); commands are drawn from loadTestFilePath
+loadTestOperators = 0
+loadTestFilePath = "TestData\\Prompts_TestData_4_1.xlsx"
+
+# export timing spans
+if traceFilePath is not None:
+    TRACER.add_exporter(JSONLExporter(traceFilePath))
+
+# set API key; the client keeps its connection to the API open between turns
+client = create_client(
 # defaults to os.environ.get("OPENAI_API_KEY")
 api_key=os.getenv("OPENAI_API_KEY"),
+warm_up=warmUpClient,
 )
 
+# answer repeated prompts from the cache at zero token cost
+if useResponseCache:
+    client = CachedClient(client, ResponseCache())
+
+# book every call of this run under one shift
+if useUsageLedger:
+    # the budgets count the operator shifts only, not the batch runs booked in the same file
+    usageLedger = UsageLedger(budget=usageBudget, window_budget=usageWindowBudget, scope="shift-")
+    client = MeteredClient(client, usageLedger, session=time.strftime("shift-%Y%m%d-%H%M%S"))
+
+# pick the speech recognition backend
+speechRecognizer = VoskRecognizer(voskModelPath) if voskModelPath is not None else HotkeyDictationRecognizer()
+
+# load the pre-rendered audio clips into memory
+clipCache = AudioClipCache() if useAudioClipCache else None
+
+# without sounddevice the question cannot be interrupted, so fall back to the blocking confirmation
+if useBargeIn and importlib.util.find_spec("sounddevice") is None:
+    print("sounddevice is not installed: barge-in is off.")
+    useBargeIn = False
+
+# the operator answers on the keyboard, or by saying yes / no / stop when a Vosk model is configured
+decisionSources = [KeyboardDecision()] + ([speech_decision(speechRecognizer)] if voskModelPath is not None else [])
+
+# position of the robot relative to the start of the session, for the envelope check; every confirmed
+# move is sent at once, so there is nothing to merge here (see MotionQueue.drain for queued moves)
+motionQueue = MotionQueue()
+
+# parse a robmove completion and check it against the safety envelope
+def check_motion(answerA):
+    delta = MotionDelta.parse(answerA)
+    # an answer without deltas is refused even when the envelope check is off
+    problems = motionQueue.violations(delta) if checkMotionEnvelope or delta is None else []
+    for problem in problems:
+        print(f"Refused: {problem} ({answerA})")
+    return delta, not problems
+
+# hand the confirmed move to the robot controller
+def send_motion(delta):
+    motionQueue.push(delta, check=checkMotionEnvelope)
+    for move in motionQueue.drain():
+        print(f"Sending to robot: {move}")
+
+# interpretation of the same command as the robmove step, started on partial transcripts; one
+# interpreter (and thread pool) for the whole session
+speculator = SpeculativeInterpreter(client, generate_response_robmove_local if useLocalParser else generate_response_robmove) \
+    if useSpeculativeInterpretation else None
+
 def main(client, audioStreamFilePath):
+    generate_response_func = generate_response_robmove_local if useLocalParser else generate_response_robmove
+
+    def on_partial(text):
+        print("... " + text)
+        if speculator is not None:
+            speculator.on_partial(text)
+
     try:
         # convert audio input to text (speech recognition)
-        prompt = AudioToText()     
+        prompt = speechRecognizer.listen(on_partial=on_partial)
     except ValueError:
         #handle the case where the input is not recognized as valid audio
         print("don't recognize input")
     
+    # generate robot movement trajectory and the confirmation in one step
+    if confirmationMode != "two-call":
+        generate_response_func = generate_response_fused if confirmationMode == "fused" else generate_response_template
+        answerA, answerB = generate_response_func(prompt, client)[0]
+        delta, safe = check_motion(answerA)
+        if not safe:
+            return 0
+        # a template confirmation is spoken from the phrase and distance clips
+        useClips = confirmationMode == "template" and clipCache is not None
+        if useBargeIn:
+            print(answerB)
+            audio = clipCache.confirmation_clips(prompt, delta, client) if useClips else synthesize_speech_chunks(answerB, client)
+            return confirm2action_bargein(audio, client, clipCache, decisionSources,
+                                          on_accept=lambda: send_motion(delta))
+        if useClips:
+            play_pcm(b"".join(clipCache.confirmation_clips(prompt, delta, client)))
+        else:
+            speak_streaming([answerB], client)
+        print(answerB)
+        outcome = confirm2action(audioStreamFilePath, client, clipCache)
+        if outcome == 1:
+            send_motion(delta)
+        return outcome
+
     # generate robot movement trajectory and ask for confirmation
-    answerA = generate_response_robmove(prompt, client)[0]
-    answerB = generate_response_ask4conf(prompt, answerA, client)[0]
+    if speculator is not None:
+        answerA = speculator.final(prompt)[0]
+        speculator.report()
+    else:
+        answerA = generate_response_func(prompt, client)[0]
+    delta, safe = check_motion(answerA)
+    if not safe:
+        return 0
+    if useBargeIn:
+        answerB = generate_response_ask4conf(prompt, answerA, client)[0]
+        print(answerB)
+        return confirm2action_bargein(synthesize_speech_chunks(answerB, client), client, clipCache, decisionSources,
+                                      on_accept=lambda: send_motion(delta))
+    if useStreamingSpeech:
+        answerB, timings = speak_ask4conf_streaming(prompt, answerA, client)
+        print(answerB)
+        print(f"Time to first audio: {timings['time_to_first_audio']:.3f} seconds")
+    else:
+        answerB = generate_response_ask4conf(prompt, answerA, client)[0]
 
-    TextToAudio(answerB, audioStreamFilePath, client)
-    print(answerB)
+        TextToAudio(answerB, audioStreamFilePath, client)
+        print(answerB)
 
-    outcome = confirm2action(audioStreamFilePath, client)
+    outcome = confirm2action(audioStreamFilePath, client, clipCache)
+    if outcome == 1:
+        send_motion(delta)
     return outcome
 
-if __name__ == "__main__":
+if __name__ == "__main__" and loadTestOperators > 0:
+    generate_response_func = generate_response_robmove_local if useLocalParser else generate_response_robmove
+    load_test_sessions(extract_prompts(load_prompt_table(loadTestFilePath), 'Prompt Contents'), operators=loadTestOperators,
+                       generate_response_func=generate_response_func, latency=0.3, jitter=0.2)
+
+elif __name__ == "__main__":
+    # synthesize any constant phrase that is not rendered yet
+    if clipCache is not None:
+        clipCache.preload([CONFIRM_TEXT_ACCEPTED, CONFIRM_TEXT_REJECTED] +
+                          (CONFIRMATION_PHRASES if confirmationMode == "template" else []), client)
+    print(f"Ready to listen {time.perf_counter() - startTime:.2f} seconds after start-up.")
+
     # initialize the flag to track whether the move was successful
     move_successful = False
 
     # loop until successful execution
     while not move_successful:
-        result = main(client, audioStreamFilePath)
+        try:
+            result = main(client, audioStreamFilePath)
+        except BudgetExceeded as error:
+            print(f"Usage budget reached, ending the session: {error}")
+            break
         if result == 1: 
             move_successful = True
 
+        # print per-stage latency percentiles of the session so far
+        TRACER.print_summary()
+        if useUsageLedger:
+            rolling = usageLedger.rolling()
+            print(f"Usage in the last hour: {rolling['calls']} calls, {rolling['total_tokens']} tokens, "
+                  f"{rolling['tts_characters']} speech characters, ${rolling['cost']:.4f}")
+
+    if speculator is not None:
+        speculator.shutdown()
+
+    # tokens, speech and cost of the session per stage
+    if useUsageLedger:
+        usageLedger.print_summary(by=("stage", "model"))
+        usageLedger.close()
+
 
 
 
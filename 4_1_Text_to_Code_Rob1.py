@@ -29,63 +29,241 @@ Optional: COMPAS FAB or a similar robotics framework for implementing the genera
 """
 # Import prerequisite libraries
 import os
-from openai import OpenAI
 import time
-import pandas as pd
-from HRILLM import extract_prompts, generate_response_robmove, process_prompts, save_to_excel_with_suffix, execution_time_per_prompt
+from HRILLM import extract_prompts, generate_response_robmove, generate_response_robmove_local, compare_local_parser, process_prompts, process_prompts_concurrent, save_to_excel_with_suffix, execution_time_per_prompt, build_messages_robmove, profile_prompt_tokens, ablate_prompt_prefix, load_prompt_table, run_batch_resumable, TRACER, JSONLExporter, ReplayStubServer, load_recorded_responses, run_offline_benchmark, CachedClient, ResponseCache, create_client, parse_delta_array, MotionQueue, ExampleIndex, seed_example_index, retrieval_response_robmove, benchmark_example_selection, ROBMOVE_EXAMPLES, ModelRouter, ROUTER_TIERS, process_prompts_packed, compare_packed_requests, write_command_corpus, stress_pipeline, UsageLedger, MeteredClient
 
 # load DataFrame
 file_path = "TestData\Prompts_TestData_4_1.xlsx" # Excel file of prompts
 
-# total number of test prompts
-promptCount = 130
+# labeled prompts ('Prompt Execution' column) used by the prompt prefix ablation
+groundTruthFilePath = "TestData\Prompts_TestData_4_3.xlsx"
 
-# set API key
-client = OpenAI(
+# number of concurrent API requests (set to 1 for the original sequential run)
+maxWorkers = 8
+
+# answer simple commands with the local rule-based parser and only send the rest to the LLM
+useLocalParser = False
+
+# report the local parser's hit rate and agreement with the LLM instead of saving completions
+compareLocalParser = False
+
+# profile the prompt tokens per section and measure accuracy as few-shot examples are dropped or shortened
+# (turn useResponseCache off so every variant is really sent)
+ablatePromptPrefix = False
+
+# pick the few-shot examples most similar to each prompt from a local index (seeded with the built-in
+# examples and the labeled prompts) instead of always sending the fixed list
+useExampleRetrieval = False
+exampleCount = 4
+exampleIndexPath = os.path.join("Cache", "examples_robmove.json")
+
+# compare accuracy, prompt tokens and wall time of the fixed examples and retrieved examples
+# (turn useResponseCache off so every variant is really sent)
+benchmarkExampleSelection = False
+
+# send simple commands to a fast model tier and complex ones to a strong tier (unparsable answers are
+# escalated); with useLocalParser confidently parsed commands never leave the machine
+useModelRouter = False
+routerTiers = ROUTER_TIERS
+routerThreshold = 2 # lowest complexity score sent to the strong tier
+routerLogPath = None # JSONL file of the routing decisions
+
+# send packSize commands per request so the few-shot prefix is paid once per pack instead of once per row
+# (the pack size adapts to parse failures; rows whose answer does not parse are re-run one by one)
+usePackedRequests = False
+packSize = 10
+
+# compare tokens and wall time of packed requests with one request per row
+# (turn useResponseCache off so both paths are really sent)
+comparePackedRequests = False
+
+# append every result to a JSONL checkpoint next to the input and skip finished rows on restart
+# (rows are only reused for the same prompt text and the same parser/model/retrieval settings;
+# delete the checkpoint to start over)
+useResumableRunner = False
+
+# replay recorded completions from a local stand-in server instead of calling the API
+# (no tokens spent; latency, jitter and error rate of the stand-in are configurable)
+offlineBenchmark = False
+recordedFilePath = "TestData\\Prompts_TestData_4_1_Completion.xlsx"
+stubLatency = 0.5 # seconds
+stubJitter = 0.2 # seconds
+stubErrorRate = 0.02
+stubModelLatency = {"gpt-4o": 0.5} # extra seconds of the strong tier
+
+# stream a large synthetic labeled corpus through the local parser, response cache, scoring and
+# motion check and report commands per second and peak memory of each stage (no API calls);
+# the corpus is generated once and kept on disk (.parquet needs pyarrow, .csv works without it)
+stressTest = False
+syntheticCorpusPath = os.path.join("Cache", "synthetic_commands.parquet")
+syntheticCommandCount = 1000000
+stressBatchSize = 100000
+
+# write every timing span to this JSONL file (None to only print the per-stage summary)
+traceFilePath = None
+
+# cache repeated chat requests on disk; the cache file is shared by the interactive and batch scripts
+# (off by default here: cached answers report no tokens and cache-speed timings, so a cached rerun
+# is not a measurement)
+useResponseCache = False
+
+# book tokens, speech characters, latency and cost of every API call in Cache\usage.sqlite (shared by the
+# scripts, one session per input file) and stop once a budget is used up; with useResumableRunner the
+# finished rows are kept and a second run continues where the first one stopped
+useUsageLedger = True
+usageBudget = None # e.g. {"cost": 0.5, "total_tokens": 200000}
+
+# export timing spans
+if traceFilePath is not None:
+    TRACER.add_exporter(JSONLExporter(traceFilePath))
+
+# set API key; one connection pool is shared by all workers
+client = create_client(
 # defaults to os.environ.get("OPENAI_API_KEY")
 api_key=os.getenv("OPENAI_API_KEY"),
+max_connections=maxWorkers,
+# every batch call goes through call_with_retry, which does the retrying
+max_retries=0,
 )
 
+# answer repeated prompts from the cache at zero token cost
+if useResponseCache:
+    client = CachedClient(client, ResponseCache())
+
+# book every call under this input file
+if useUsageLedger:
+    usageLedger = UsageLedger(budget=usageBudget)
+    client = MeteredClient(client, usageLedger, session=os.path.basename(file_path))
+
+# few-shot example index, built incrementally and kept on disk
+if useExampleRetrieval or benchmarkExampleSelection:
+    exampleIndex = ExampleIndex(exampleIndexPath, ROBMOVE_EXAMPLES)
+    seed_example_index(exampleIndex, groundTruthFilePath)
+    exampleIndex.save()
+
 # main function
 def main(file_path, client):
     """
     Main function to process prompts, generate completions, and save results.
     
     Args:
-    - file_path (str): Path to the Excel file containing the DataFrame.
+    - file_path (str): Path to the Excel, CSV or Parquet file containing the DataFrame.
     - client: The OpenAI API client.
     """
-    # load the Excel file into a DataFrame
-    df = pd.read_excel(file_path)
+    # throughput of the offline stages on the synthetic corpus
+    if stressTest:
+        if not os.path.exists(syntheticCorpusPath):
+            write_command_corpus(syntheticCorpusPath, syntheticCommandCount, batch_size=stressBatchSize)
+        stress_pipeline(syntheticCorpusPath, batch_size=stressBatchSize)
+        return
+
+    # load the Excel (or CSV/Parquet) file into a DataFrame
+    df = load_prompt_table(file_path)
     
     # extract prompts
     prompt_list = extract_prompts(df, 'Prompt Contents')
     
+    # token profile of the prompt and accuracy/token trade-off of the few-shot prefix
+    if ablatePromptPrefix:
+        profile_prompt_tokens(build_messages_robmove(prompt_list[0]))
+        df_truth = load_prompt_table(groundTruthFilePath)
+        ablate_prompt_prefix(extract_prompts(df_truth, 'Prompt Contents'), extract_prompts(df_truth, 'Prompt Execution'), client)
+        return
+
+    # fixed few-shot examples against retrieved ones on the labeled prompts
+    if benchmarkExampleSelection:
+        df_truth = load_prompt_table(groundTruthFilePath)
+        benchmark_example_selection(extract_prompts(df_truth, 'Prompt Contents'), extract_prompts(df_truth, 'Prompt Execution'), client, exampleIndex, max_workers=maxWorkers)
+        return
+
+    # packed requests against one request per row
+    if comparePackedRequests:
+        compare_packed_requests(prompt_list, client, packSize, max_workers=maxWorkers)
+        return
+
+    # compare the local parser against the LLM
+    if compareLocalParser:
+        compare_local_parser(prompt_list, client)
+        return
+
+    # the local parser and the router have their own request path without retrieved examples
+    if useExampleRetrieval and (useLocalParser or useModelRouter):
+        print("Warning: useExampleRetrieval is ignored when useLocalParser or useModelRouter is set.")
+    # the index holds the labeled answers of these prompts, so a prompt's own answer is never one of its examples
+    generate_response_func = retrieval_response_robmove(exampleIndex, exampleCount, exclude_same=True) if useExampleRetrieval else generate_response_robmove
+    if useLocalParser:
+        generate_response_func = generate_response_robmove_local
+    router = ModelRouter(routerTiers, routerThreshold, use_local_parser=useLocalParser, log_path=routerLogPath) if useModelRouter else None
+    if router is not None:
+        generate_response_func = router.generate_response
+
+    # offline benchmark: throughput, latency and accuracy against the labeled prompts
+    if offlineBenchmark:
+        df_truth = load_prompt_table(groundTruthFilePath)
+        expected = dict(zip(extract_prompts(df_truth, 'Prompt Contents'), extract_prompts(df_truth, 'Prompt Execution')))
+        with ReplayStubServer(load_recorded_responses(recordedFilePath), latency=stubLatency, jitter=stubJitter, error_rate=stubErrorRate, model_latency=stubModelLatency) as server:
+            run_offline_benchmark(prompt_list, generate_response_func, server, [expected.get(prompt) for prompt in prompt_list], max_workers=maxWorkers)
+        if router is not None:
+            router.print_summary()
+        return
+
     # generate completions
-    completions, token_usage = process_prompts(prompt_list, client, generate_response_robmove)
+    if usePackedRequests:
+        completions, token_usage, pack_stats = process_prompts_packed(prompt_list, client, packSize, max_workers=maxWorkers)
+        print(f"Packed requests: {pack_stats}")
+        df['Completion'] = completions
+        save_to_excel_with_suffix(df, file_path, suffix="_Completion")
+    elif useResumableRunner:
+        # checkpoint every row and build the Excel output from the checkpoint at the end
+        df, token_usage = run_batch_resumable(file_path, client, generate_response_func, max_workers=maxWorkers,
+                                             config={"useLocalParser": useLocalParser, "useExampleRetrieval": useExampleRetrieval, "exampleCount": exampleCount, "useModelRouter": useModelRouter, "routerTiers": routerTiers, "routerThreshold": routerThreshold})
+    else:
+        if maxWorkers > 1:
+            completions, token_usage = process_prompts_concurrent(prompt_list, client, generate_response_func, max_workers=maxWorkers)
+        else:
+            completions, token_usage = process_prompts(prompt_list, client, generate_response_func)
     
-    # add completions to the DataFrame
-    df['Completion'] = completions
+        # add completions to the DataFrame
+        df['Completion'] = completions
     
-    # save the updated DataFrame
-    save_to_excel_with_suffix(df, file_path, suffix="_Completion")
-    
-    # calculate and print token usage statistics per prompt
-    token_usage = {key: value / promptCount for key, value in token_usage.items()}
+        # save the updated DataFrame
+        save_to_excel_with_suffix(df, file_path, suffix="_Completion")
+
+    # parse the completions into deltas and check each against the safety envelope
+    motion_check = MotionQueue().check(parse_delta_array(df['Completion']), cumulative=False)
+    print(f"Motion check: {motion_check['parsed'].sum()} of {len(df)} completions parsed, "
+          f"{(motion_check['parsed'] & ~motion_check['ok']).sum()} outside the safety envelope")
+
+    if router is not None:
+        router.print_summary()
+
+    # calculate and print token usage statistics per prompt over the rows actually processed
+    token_usage = {key: value / max(len(df), 1) for key, value in token_usage.items()}
     print(f"Average Token Usage per Prompt: {token_usage}")
+    if useResponseCache:
+        print(f"Response cache: {client.cache.stats()}")
+    if useUsageLedger:
+        usageLedger.print_summary(by=("stage", "model"))
+    return len(df)
 
 if __name__ == "__main__":
     # start the timer
     start_time = time.time()
 
-    # main()
-    main(file_path, client)
+    # main() returns the number of rows processed (None for the comparison and benchmark modes)
+    prompt_count = main(file_path, client)
 
     # stop the timer
     end_time = time.time()
 
     # print average execution time per prompt
-    execution_time_per_prompt(start_time, end_time, promptCount)
+    if prompt_count:
+        execution_time_per_prompt(start_time, end_time, prompt_count)
+
+    # print per-stage latency percentiles
+    TRACER.print_summary()
+    if useUsageLedger:
+        usageLedger.close()
 
 
 
@@ -26,64 +26,154 @@ Requirements:
 """
 # Import prerequisite libraries
 import os
-from openai import OpenAI
 import time
-import pandas as pd
-from HRILLM import extract_prompts, generate_response_ask4conf, process_prompts, save_to_excel_with_suffix, execution_time_per_prompt
+from HRILLM import extract_prompts, generate_response_ask4conf, process_prompts, process_prompts_concurrent, save_to_excel_with_suffix, execution_time_per_prompt, compare_confirmation_modes, load_prompt_table, run_batch_resumable, TRACER, JSONLExporter, ReplayStubServer, load_recorded_responses, run_offline_benchmark, CachedClient, ResponseCache, create_client, ExampleIndex, seed_example_index, retrieval_response_ask4conf, ASK4CONF_EXAMPLES, UsageLedger, MeteredClient
 
 # load DataFrame
 file_path = "TestData\Prompts_TestData_4_3.xlsx" # Excel file of prompts
 
-# total number of test prompts
-promptCount = 20
+# number of concurrent API requests (set to 1 for the original sequential run)
+maxWorkers = 8
 
-# set API key
-client = OpenAI(
+# compare the two-call chain with the fused and template confirmation modes instead of saving completions
+# (turn useResponseCache off for a fair comparison)
+compareConfirmationModes = False
+
+# pick the few-shot examples most similar to each prompt from a local index (seeded with the built-in
+# examples and the completions of an earlier run) instead of always sending the fixed list
+useExampleRetrieval = False
+exampleCount = 2
+exampleIndexPath = os.path.join("Cache", "examples_ask4conf.json")
+
+# append every result to a JSONL checkpoint next to the input and skip finished rows on restart
+# (rows are only reused for the same prompt text and the same parser/model/retrieval settings;
+# delete the checkpoint to start over)
+useResumableRunner = False
+
+# replay recorded completions from a local stand-in server instead of calling the API
+# (no tokens spent; latency, jitter and error rate of the stand-in are configurable)
+offlineBenchmark = False
+recordedFilePath = "TestData\\Prompts_TestData_4_3_Completion.xlsx"
+stubLatency = 0.5 # seconds
+stubJitter = 0.2 # seconds
+stubErrorRate = 0.02
+
+# write every timing span to this JSONL file (None to only print the per-stage summary)
+traceFilePath = None
+
+# cache repeated chat requests on disk; the cache file is shared by the interactive and batch scripts
+# (off by default here: cached answers report no tokens and cache-speed timings, so a cached rerun
+# is not a measurement)
+useResponseCache = False
+
+# book tokens, speech characters, latency and cost of every API call in Cache\usage.sqlite (shared by the
+# scripts, one session per input file) and stop once a budget is used up; with useResumableRunner the
+# finished rows are kept and a second run continues where the first one stopped
+useUsageLedger = True
+usageBudget = None # e.g. {"cost": 0.5, "total_tokens": 200000}
+
+# export timing spans
+if traceFilePath is not None:
+    TRACER.add_exporter(JSONLExporter(traceFilePath))
+
+# set API key; one connection pool is shared by all workers
+client = create_client(
 # defaults to os.environ.get("OPENAI_API_KEY")
 api_key=os.getenv("OPENAI_API_KEY"),
+max_connections=maxWorkers,
+# every batch call goes through call_with_retry, which does the retrying
+max_retries=0,
 )
 
+# answer repeated prompts from the cache at zero token cost
+if useResponseCache:
+    client = CachedClient(client, ResponseCache())
+
+# book every call under this input file
+if useUsageLedger:
+    usageLedger = UsageLedger(budget=usageBudget)
+    client = MeteredClient(client, usageLedger, session=os.path.basename(file_path))
+
+# few-shot example index, built incrementally and kept on disk
+if useExampleRetrieval:
+    exampleIndex = ExampleIndex(exampleIndexPath, ASK4CONF_EXAMPLES)
+    if os.path.exists(recordedFilePath):
+        seed_example_index(exampleIndex, recordedFilePath, completion_column='Completion', prompt_exe_column='Prompt Execution')
+    exampleIndex.save()
+
 # main function
 def main(file_path, client):
     """
     Main function to process prompts, generate completions, and save results.
     
     Args:
-    - file_path (str): Path to the Excel file containing the DataFrame.
+    - file_path (str): Path to the Excel, CSV or Parquet file containing the DataFrame.
     - client: The OpenAI API client.
     """
-    # load the Excel file into a DataFrame
-    df = pd.read_excel(file_path)
+    # load the Excel (or CSV/Parquet) file into a DataFrame
+    df = load_prompt_table(file_path)
     
     # extract prompts and previous completion for robot executation
     prompt_list = extract_prompts(df, 'Prompt Contents')
     prompt_exe_list = extract_prompts(df, 'Prompt Execution')
     
+    generate_response_func = retrieval_response_ask4conf(exampleIndex, exampleCount) if useExampleRetrieval else generate_response_ask4conf
+
+    # benchmark tokens and wall time of the confirmation modes
+    if compareConfirmationModes:
+        compare_confirmation_modes(prompt_list, client)
+        return
+
+    # offline benchmark: throughput and latency without spending tokens
+    if offlineBenchmark:
+        with ReplayStubServer(load_recorded_responses(recordedFilePath, prompt_exe_column='Prompt Execution'), latency=stubLatency, jitter=stubJitter, error_rate=stubErrorRate) as server:
+            run_offline_benchmark(prompt_list, generate_response_func, server, prompt_exe_list=prompt_exe_list, max_workers=maxWorkers)
+        return
+
     # generate completions
-    completions, token_usage = process_prompts(prompt_list, client, generate_response_ask4conf, prompt_exe_list)
-    
-    # add completions to the DataFrame
-    df['Completion'] = completions
+    if useResumableRunner:
+        # checkpoint every row and build the Excel output from the checkpoint at the end
+        df, token_usage = run_batch_resumable(file_path, client, generate_response_func, prompt_exe_column='Prompt Execution', max_workers=maxWorkers,
+                                             config={"useExampleRetrieval": useExampleRetrieval, "exampleCount": exampleCount})
+    else:
+        if maxWorkers > 1:
+            completions, token_usage = process_prompts_concurrent(prompt_list, client, generate_response_func, prompt_exe_list, max_workers=maxWorkers)
+        else:
+            completions, token_usage = process_prompts(prompt_list, client, generate_response_func, prompt_exe_list)
     
-    # save the updated DataFrame
-    save_to_excel_with_suffix(df, file_path, suffix="_Completion")
+        # add completions to the DataFrame
+        df['Completion'] = completions
     
-    # calculate and print token usage statistics per prompt
-    token_usage = {key: value / promptCount for key, value in token_usage.items()}
+        # save the updated DataFrame
+        save_to_excel_with_suffix(df, file_path, suffix="_Completion")
+
+    # calculate and print token usage statistics per prompt over the rows actually processed
+    token_usage = {key: value / max(len(df), 1) for key, value in token_usage.items()}
     print(f"Average Token Usage per Prompt: {token_usage}")
+    if useResponseCache:
+        print(f"Response cache: {client.cache.stats()}")
+    if useUsageLedger:
+        usageLedger.print_summary(by=("stage", "model"))
+    return len(df)
 
 if __name__ == "__main__":
     # start the timer
     start_time = time.time()
 
-    # main()
-    main(file_path, client)
+    # main() returns the number of rows processed (None for the comparison and benchmark modes)
+    prompt_count = main(file_path, client)
 
     # stop the timer
     end_time = time.time()
 
     # print average execution time per prompt
-    execution_time_per_prompt(start_time, end_time, promptCount)
+    if prompt_count:
+        execution_time_per_prompt(start_time, end_time, prompt_count)
+
+    # print per-stage latency percentiles
+    TRACER.print_summary()
+    if useUsageLedger:
+        usageLedger.close()
 
 
 
@@ -11,37 +11,242 @@ Collection of reusable functions for the rest of the definitions in this folder.
 """
 
 import os
-from openai import OpenAI
+import sys
+import io
+import re
+import math
+import functools
+import contextlib
+import collections
+import copy
+import json
 import time
-import pyautogui
-from playsound import playsound
-import pandas as pd
+import random
+import hashlib
+import threading
+import queue
+import wave
+import tempfile
+import importlib
+import importlib.util
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# module placeholder that imports the real module on first attribute access
+class LazyModule:
+    """
+    Defers a heavy import until the module is first used, so scripts that never touch it
+    (e.g. the batch scripts never need pyautogui) do not pay for it at start-up.
+
+    Args:
+    - name (str): Name of the module to import.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+openai = LazyModule("openai")
+pyautogui = LazyModule("pyautogui")
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+# standard library modules only needed by the caches, the stub servers, HRIServer and benchmark_startup
+sqlite3 = LazyModule("sqlite3")
+http_server = LazyModule("http.server")
+asyncio = LazyModule("asyncio")
+subprocess = LazyModule("subprocess")
+
+# play an audio file; playsound is imported on first use
+def playsound(path):
+    from playsound import playsound as play_file
+    play_file(path)
+
+# collects timing spans of the voice-to-motion loop
+class Tracer:
+    """
+    Lightweight span recorder. Each span has a stage name, start time, duration and attributes
+    (token counts, time to first token, errors). Finished spans are kept per stage in bounded deques
+    for percentile summaries and handed to every registered exporter.
+
+    Args:
+    - max_spans_per_stage (int): Durations kept per stage for the summary.
+    """
+    def __init__(self, max_spans_per_stage=10000):
+        self.max_spans_per_stage = max_spans_per_stage
+        self.durations = {}
+        self.attributes = {}
+        self.exporters = []
+        self.enabled = True
+        self.lock = threading.Lock()
+        # names of the spans open in each thread, innermost last
+        self.local = threading.local()
+
+    def add_exporter(self, exporter):
+        """Registers a callable that receives every finished span as a dict."""
+        self.exporters.append(exporter)
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """
+        Context manager timing the enclosed block. The yielded dict can be filled with attributes.
+
+        Example:
+            with TRACER.span("tts_download") as span:
+                ...
+                span["bytes"] = size
+        """
+        record = {"name": name, **attributes}
+        stages = self.open_stages()
+        stages.append(name)
+        try:
+            if not self.enabled:
+                yield record
+                return
+            start_wall = time.time()
+            start_time = time.perf_counter()
+            try:
+                yield record
+            except Exception as error:
+                record["error"] = type(error).__name__
+                raise
+            finally:
+                record["start"] = start_wall
+                record["duration"] = time.perf_counter() - start_time
+                self.record(record)
+        finally:
+            # a span opened in a suspended generator may close after a span opened later
+            if name in stages:
+                del stages[len(stages) - 1 - stages[::-1].index(name)]
+
+    def open_stages(self):
+        """Returns the list of span names open in the calling thread, innermost last."""
+        if not hasattr(self.local, "stages"):
+            self.local.stages = []
+        return self.local.stages
+
+    def current_stage(self):
+        """Returns the name of the innermost span open in the calling thread, or None."""
+        stages = self.open_stages()
+        return stages[-1] if stages else None
+
+    def record(self, record):
+        """Stores a finished span and passes it to the exporters."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.durations.setdefault(record["name"], collections.deque(maxlen=self.max_spans_per_stage)).append(record["duration"])
+            totals = self.attributes.setdefault(record["name"], collections.Counter())
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                if key in record:
+                    totals[key] += record[key]
+            # time_to_first_token, time_to_first_audio, ... get their own percentile rows
+            for key, value in record.items():
+                if key.startswith("time_to_first") and value is not None:
+                    self.durations.setdefault(f"{record['name']}.{key}", collections.deque(maxlen=self.max_spans_per_stage)).append(value)
+        for exporter in self.exporters:
+            exporter(record)
+
+    def summary(self):
+        """Returns {stage: {count, p50, p95, p99, mean, tokens...}} with durations in seconds."""
+        with self.lock:
+            stages = {}
+            for name, durations in self.durations.items():
+                values = sorted(durations)
+                stages[name] = {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+                                "p99": percentile(values, 99), "mean": sum(values) / len(values),
+                                **self.attributes.get(name, {})}
+            return stages
+
+    def print_summary(self):
+        """Prints the per-stage latency table."""
+        print(f"{'stage':40s} {'count':>6s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'tokens':>8s}")
+        for name, stats in self.summary().items():
+            print(f"{name:40s} {stats['count']:6d} {1000 * stats['p50']:9.1f} {1000 * stats['p95']:9.1f} "
+                  f"{1000 * stats['p99']:9.1f} {stats.get('total_tokens', 0):8d}")
+
+    def reset(self):
+        """Forgets all recorded spans."""
+        with self.lock:
+            self.durations.clear()
+            self.attributes.clear()
+
+# nearest-rank percentile of a sorted list
+def percentile(sorted_values, q):
+    """Returns the q-th percentile (0-100) of an already sorted, non-empty list."""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+# default tracer used by the functions of this module
+TRACER = Tracer()
+
+# decorator recording a span around every call of a function
+def traced(name):
+    """
+    Wraps a function in TRACER.span(name). If the function returns (content, usage) like the
+    generate_response_* functions, the token counts are added to the span.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with TRACER.span(name) as span:
+                result = func(*args, **kwargs)
+                usage = result[1] if isinstance(result, tuple) and len(result) == 2 else None
+                if hasattr(usage, "total_tokens"):
+                    span["prompt_tokens"] = usage.prompt_tokens
+                    span["completion_tokens"] = usage.completion_tokens
+                    span["total_tokens"] = usage.total_tokens
+                return result
+        return wrapper
+    return decorator
+
+# span exporter writing one JSON line per span
+class JSONLExporter:
+    """Appends every span to a JSONL file."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def __call__(self, record):
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as trace_file:
+                trace_file.write(json.dumps(record, default=str) + "\n")
+
+# span exporter forwarding to OpenTelemetry
+class OpenTelemetryExporter:
+    """
+    Re-emits every span through the OpenTelemetry API (requires the opentelemetry-api package and a
+    configured tracer provider).
+    """
+    def __init__(self, instrumentation_name="HRILLM"):
+        from opentelemetry import trace
+        self.tracer = trace.get_tracer(instrumentation_name)
+
+    def __call__(self, record):
+        start_ns = int(record["start"] * 1e9)
+        otel_span = self.tracer.start_span(record["name"], start_time=start_ns)
+        for key, value in record.items():
+            if key not in ("name", "start", "duration") and isinstance(value, (str, bool, int, float)):
+                otel_span.set_attribute(key, value)
+        otel_span.end(end_time=start_ns + int(record["duration"] * 1e9))
+
+# span exporter printing every span as it finishes
+def console_exporter(record):
+    """Prints one line per span."""
+    print(f"[trace] {record['name']}: {1000 * record['duration']:.1f} ms")
 
 # extract prompts from the DataFrame
 def extract_prompts(df, var):
     """Extracts prompt contents from the DataFrame."""
     return df[var].tolist()
 
-# generate a single response using OpenAI API for changing robot parameters; instruction & few-shot prompting
-def generate_response_robmove(prompt, client):
-    """
-    Generates a response from the OpenAI API based on the given prompt.
-    Assumption: 
-        The human operator stands facing the robot. 
-    Args:
-    - prompt (str): The input prompt for the model.
-    - client: The OpenAI API client.
-    
-    Returns:
-    - str: The content of the assistant's response.
-    """
-    response = client.chat.completions.create(
-        # use GPT 3.5 as the LLM
-        model="gpt-3.5-turbo",
-        temperature=0,
-        # pre-define conversation messages for the possible roles
-        messages=[
-            {"role": "system", "content": """Interpret the user's input to control the robot's movement in millimeters along the x, y, and z axes. Strictly follow these rules:  
+# system prompt of generate_response_robmove
+ROBMOVE_SYSTEM_PROMPT = """Interpret the user's input to control the robot's movement in millimeters along the x, y, and z axes. Strictly follow these rules:  
             1) Convert all units to millimeters as follows:  
                 - Millimeters (mm): Use the value as-is.  
                 - Centimeters (cm): Multiply by 10 to convert to millimeters.  
@@ -58,50 +263,130 @@ def generate_response_robmove(prompt, client):
             6) Ensure the output is always in this exact format:  
                 - delta_x, delta_y, delta_z = a, b, c; where a, b, and c are floats representing distances in millimeters.    
             7) If the input mentions multiple directions or units, convert and apply each direction seperately, then output in the correct format.(e.g., 'move 2 cm up and 3 mm to the right', output 'delta_x, delta_y, delta_z = 3.0, 0.0, 20.0').
-            8) Never include any additional characters such as semicolons, quotes, or text outside of the output format."""},
-            
-            # few-shot examples:           
-            {"role": "user", "content": "Move up 36mm"},
-            {"role": "assistant", "content": "delta_x, delta_y, delta_z = 0.0, 0.0, 36.0"},
-
-            {"role": "user", "content": "Move backwards a lil bit"},
-            {"role": "assistant", "content": "delta_x, delta_y, delta_z = 0.0, 1.0, 0.0"},
+            8) Never include any additional characters such as semicolons, quotes, or text outside of the output format."""
 
-            {"role": "user", "content": "Shift left for 54cm"},
-            {"role": "assistant", "content": "delta_x, delta_y, delta_z = -540.0, 0.0, 0.0"},
+# few-shot examples of generate_response_robmove as (user, assistant) pairs
+ROBMOVE_EXAMPLES = (
+    ("Move up 36mm",
+     "delta_x, delta_y, delta_z = 0.0, 0.0, 36.0"),
+    ("Move backwards a lil bit",
+     "delta_x, delta_y, delta_z = 0.0, 1.0, 0.0"),
+    ("Shift left for 54cm",
+     "delta_x, delta_y, delta_z = -540.0, 0.0, 0.0"),
+    ("lower down for 70 centimeters and move to the left for 3 millimeters",
+     "delta_x, delta_y, delta_z = -3.0, 0.0, -700.0"),
+    ("lift the arm for 33 mm and forward for 13mm",
+     "delta_x, delta_y, delta_z = 0, -13.0, 33.0"),
+    ("move closer for 1 ft",
+     "delta_x, delta_y, delta_z = 0.0, -304.8, 0.0"),
+    ("Move away for 16 cm",
+     "delta_x, delta_y, delta_z = 0.0, 160.0, 0.0"),
+    ("Slide in the negative Y direction for 23cm",
+     "delta_x, delta_y, delta_z = 0.0, -230.0, 0.0"),
+    ("Shift along x-axis for 0.5 m",
+     "delta_x, delta_y, delta_z = 500.0, 0.0, 0.0"),
+    ("move towards me a little bit, move to the left for 6 cm, and lower for 12 mm",
+     "delta_x, delta_y, delta_z = -60.0, -1.0, -12.0"),
+    ("slide to the right for 40 mm, upward for 33 mm, and away for 54 mm",
+     "delta_x, delta_y, delta_z = 40.0, 54.0, 33.0"),
+)
 
-            {"role": "user", "content": "lower down for 70 centimeters and move to the left for 3 millimeters"},
-            {"role": "assistant", "content": "delta_x, delta_y, delta_z = -3.0, 0.0, -700.0"},
-
-            {"role": "user", "content": "lift the arm for 33 mm and forward for 13mm"},
-            {"role": "assistant", "content": "delta_x, delta_y, delta_z = 0, -13.0, 33.0"},
+# build a static conversation prefix once
+def build_prefix(system_prompt, examples):
+    """
+    Builds the system message and few-shot pairs as a tuple that is shared by every request,
+    so the identical prefix is not rebuilt per call and provider-side prompt caching can apply.
 
-            {"role": "user", "content": "move closer for 1 ft"},
-            {"role": "assistant", "content": "delta_x, delta_y, delta_z = 0.0, -304.8, 0.0"},
+    Args:
+    - system_prompt (str): The system message.
+    - examples (iterable of tuple): (user, assistant) few-shot pairs.
 
-            {"role": "user", "content": "Move away for 16 cm"},
-            {"role": "assistant", "content": "delta_x, delta_y, delta_z = 0.0, 160.0, 0.0"},
+    Returns:
+    - tuple of dict: The prefix messages; treat them as read-only.
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    for user_content, assistant_content in examples:
+        messages.append({"role": "user", "content": user_content})
+        messages.append({"role": "assistant", "content": assistant_content})
+    return tuple(messages)
 
-            {"role": "user", "content": "Slide in the negative Y direction for 23cm"},
-            {"role": "assistant", "content": "delta_x, delta_y, delta_z = 0.0, -230.0, 0.0"},
+# static prefix of generate_response_robmove: system prompt and few-shot examples
+ROBMOVE_PREFIX = build_prefix(ROBMOVE_SYSTEM_PROMPT, ROBMOVE_EXAMPLES)
 
-            {"role": "user", "content": "Shift along x-axis for 0.5 m"},
-            {"role": "assistant", "content": "delta_x, delta_y, delta_z = 500.0, 0.0, 0.0"},
+# build the robot movement conversation; instruction & few-shot prompting
+def build_messages_robmove(prompt, prefix=ROBMOVE_PREFIX):
+    """
+    Builds the message list sent by generate_response_robmove.
 
-            {"role": "user", "content": "move towards me a little bit, move to the left for 6 cm, and lower for 12 mm"},
-            {"role": "assistant", "content": "delta_x, delta_y, delta_z = -60.0, -1.0, -12.0"},
+    Args:
+    - prompt (str): The input prompt for the model.
+    - prefix (tuple of dict): Static system and few-shot messages.
 
-            {"role": "user", "content": "slide to the right for 40 mm, upward for 33 mm, and away for 54 mm"},
-            {"role": "assistant", "content": "delta_x, delta_y, delta_z = 40.0, 54.0, 33.0"},
+    Returns:
+    - list of dict: The chat messages.
+    """
+    # real Question
+    return [*prefix, {"role": "user", "content": prompt}]
 
-            # real Question
-            {"role": "user", "content": prompt}
-        ]
+# generate a single response using OpenAI API for changing robot parameters; instruction & few-shot prompting
+@traced("robmove_llm")
+def generate_response_robmove(prompt, client, prefix=ROBMOVE_PREFIX, model="gpt-3.5-turbo"):
+    """
+    Generates a response from the OpenAI API based on the given prompt.
+    Assumption: 
+        The human operator stands facing the robot. 
+    Args:
+    - prompt (str): The input prompt for the model.
+    - client: The OpenAI API client.
+    - prefix (tuple of dict): Static system and few-shot messages.
+    - model (str): The chat model; GPT 3.5 unless a router picks another tier.
+    
+    Returns:
+    - str: The content of the assistant's response.
+    """
+    response = client.chat.completions.create(
+        # use GPT 3.5 as the LLM
+        model=model,
+        temperature=0,
+        messages=build_messages_robmove(prompt, prefix)
     )
     return response.choices[0].message.content, response.usage
 
+# system prompt of generate_response_ask4conf
+ASK4CONF_SYSTEM_PROMPT = """You are a helpful assistant. 
+      Always start your answer by repeating the prompt by replying 'I heard you said ...'.
+      Then, say 'I will ...' following a natural language discription of the prompt_exe, where the unit is always in millimeters.
+      Always finish with a question for confirmation."""
+
+# few-shot examples of generate_response_ask4conf as (user, assistant) pairs
+ASK4CONF_EXAMPLES = (
+    ("prompt: Shift along x-axis for 0.5 m; prompt_exe: delta_x, delta_y, delta_z = 500.0, 0.0, 0.0",
+     "I heard you said shift along x-axis for 0.5 m. I will move along positive x-axis for 500 mm. Does that sound good to you?"),
+    ("prompt: move towards me a little bit, move to the left for 6 cm, and lower for 12 mm; prompt_exe: delta_x, delta_y, delta_z = -60.0, -1.0, -12.0",
+     "I heard you said move towards me a little bit, move to the left for 6 cm, and lower for 12 mm. I will move along negative x-axis for 60 mm, negative y-axis for 1 mm, and negative z-axis for 12 mm. Is that OK?"),
+)
+
+# static prefix of generate_response_ask4conf: system prompt and few-shot examples
+ASK4CONF_PREFIX = build_prefix(ASK4CONF_SYSTEM_PROMPT, ASK4CONF_EXAMPLES)
+
+# build the reiteration and confirmation conversation; instruction & few-shot prompting
+def build_messages_ask4conf(prompt, prompt_exe, prefix=ASK4CONF_PREFIX):
+    """
+    Builds the message list sent by generate_response_ask4conf and its streaming variant.
+
+    Args:
+    - prompt (str): The input prompt for the model.
+    - prompt_exe (str): The robmove completion for the prompt.
+    - prefix (tuple of dict): Static system and few-shot messages.
+
+    Returns:
+    - list of dict: The chat messages.
+    """
+    return [*prefix, {"role": "user", "content": "prompt: "+prompt+"; prompt_exe: "+prompt_exe}]
+
 # generate a single response using OpenAI API for reiteration and confirmatioin; instruction & few-shot prompting
-def generate_response_ask4conf(prompt, prompt_exe, client):
+@traced("ask4conf_llm")
+def generate_response_ask4conf(prompt, prompt_exe, client, prefix=ASK4CONF_PREFIX):
     """
     Generates a response from the OpenAI API based on the given prompt.
     Assumption: 
@@ -109,6 +394,7 @@ def generate_response_ask4conf(prompt, prompt_exe, client):
     Args:
     - prompt (str): The input prompt for the model.
     - client: The OpenAI API client.
+    - prefix (tuple of dict): Static system and few-shot messages.
     
     Returns:
     - str: The content of the assistant's response.
@@ -117,34 +403,204 @@ def generate_response_ask4conf(prompt, prompt_exe, client):
         # use GPT 3.5 as the LLM
         model="gpt-3.5-turbo",
         # temperature=1 # default
-        # pre-define conversation messages for the possible roles
-        messages=[
-      {"role": "system", "content": """You are a helpful assistant. 
-      Always start your answer by repeating the prompt by replying 'I heard you said ...'.
-      Then, say 'I will ...' following a natural language discription of the prompt_exe, where the unit is always in millimeters.
-      Always finish with a question for confirmation."""},
+        messages=build_messages_ask4conf(prompt, prompt_exe, prefix)
+    )
+    return response.choices[0].message.content, response.usage
 
+# unit table of the robmove system prompt, rule 1
+UNIT_TO_MM = {"mm": 1.0, "cm": 10.0, "m": 1000.0, "in": 25.4, "ft": 304.8}
 
-      # few-shot examples:   
-      {"role": "user", "content": "prompt: Shift along x-axis for 0.5 m; prompt_exe: delta_x, delta_y, delta_z = 500.0, 0.0, 0.0"},
-      {"role": "assistant", "content": "I heard you said shift along x-axis for 0.5 m. I will move along positive x-axis for 500 mm. Does that sound good to you?"},
+# direction vocabulary of the robmove system prompt, rule 5: (axis index, sign)
+DIRECTION_PATTERNS = [
+    (re.compile(r"\b(?:(positive|negative)\s+)?(?:the\s+)?([xyz])(?:\s*(?:axis|direction))*\b"), None),
+    (re.compile(r"\b(?:right|rightwards?)\b"), (0, 1.0)),
+    (re.compile(r"\b(?:left|leftwards?)\b"), (0, -1.0)),
+    (re.compile(r"\b(?:back|backwards?|away)\b"), (1, 1.0)),
+    (re.compile(r"\b(?:forwards?|closer|towards?\s+me|approach)\b"), (1, -1.0)),
+    (re.compile(r"\b(?:up|upwards?|raise|ascend|lift|increase\s+height)\b"), (2, 1.0)),
+    (re.compile(r"\b(?:down|downwards?|lower|descend|decrease\s+height)\b"), (2, -1.0)),
+]
 
-      {"role": "user", "content": "prompt: move towards me a little bit, move to the left for 6 cm, and lower for 12 mm; prompt_exe: delta_x, delta_y, delta_z = -60.0, -1.0, -12.0"},
-      {"role": "assistant", "content": "I heard you said move towards me a little bit, move to the left for 6 cm, and lower for 12 mm. I will move along negative x-axis for 60 mm, negative y-axis for 1 mm, and negative z-axis for 12 mm. Is that OK?"},
-      
-      {"role": "user", "content": "prompt: "+prompt+"; prompt_exe: "+prompt_exe}
-        ]
-    )
-    return response.choices[0].message.content, response.usage
+# distance with an optional unit (rule 2: no unit means millimeters)
+DISTANCE_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(mm|millimet(?:er|re)s?|cm|centimet(?:er|re)s?|m|met(?:er|re)s?|ft|foot|feet|inch(?:es)?"
+    r"|in(?=\s*(?:$|and\b|then\b)))?\b")
+
+# vague quantities of rule 3, always 1 mm
+VAGUE_PATTERN = re.compile(r"\b(?:a\s+(?:little|lil|tiny)(?:\s+bit)?|a\s+bit|slightly)\b")
+
+# words that may surround a command without changing its meaning; anything else makes the parser give up
+FILLER_WORDS = {
+    "move", "moving", "shift", "shifting", "slide", "displace", "adjust", "go", "the", "arm", "robot", "position",
+    "for", "by", "along", "in", "to", "of", "from", "me", "towards", "toward", "please", "a", "an", "axis",
+    "direction", "and", "then", "also",
+}
+
+# map a unit as written by the operator onto the unit table
+def normalize_unit(unit):
+    """Returns the UNIT_TO_MM key for a unit string; None or '' (no unit, as re.findall reports it) stands for millimeters."""
+    if not unit or unit.startswith("mm") or unit.startswith("millimet"):
+        return "mm"
+    if unit.startswith("c"):
+        return "cm"
+    if unit.startswith("f"):
+        return "ft"
+    if unit.startswith("in"):
+        return "in"
+    return "m"
+
+# format deltas exactly like the robmove completions
+def format_delta_string(delta):
+    """Formats (x, y, z) in millimeters as 'delta_x, delta_y, delta_z = a, b, c'."""
+    # round away float noise such as 0.3 * 1000 and turn -0.0 into 0.0
+    values = [round(value, 6) + 0.0 for value in delta]
+    return "delta_x, delta_y, delta_z = " + ", ".join(str(value) for value in values)
+
+# regular expression of the robmove output format
+DELTA_PATTERN = r"delta_x\s*,\s*delta_y\s*,\s*delta_z\s*=\s*([-+\d.eE]+)\s*,\s*([-+\d.eE]+)\s*,\s*([-+\d.eE]+)"
+
+# parse a robmove completion back into numbers
+def parse_delta_string(text):
+    """
+    Parses 'delta_x, delta_y, delta_z = a, b, c' into a tuple of three floats.
+
+    Returns:
+    - tuple of float, or None if the text does not follow the output format.
+    """
+    match = re.search(DELTA_PATTERN, str(text))
+    if match is None:
+        return None
+    try:
+        return tuple(float(value) for value in match.groups())
+    except ValueError:
+        return None
+
+# rule-based interpretation of simple movement commands
+@traced("local_parser")
+def parse_command_local(prompt):
+    """
+    Interprets a movement command with the unit table and direction vocabulary of the robmove system prompt.
+    Every clause must contain exactly one direction and one distance, and no unknown words,
+    otherwise the parser is not confident and returns None.
+
+    Args:
+    - prompt (str): The operator's command.
+
+    Returns:
+    - str: 'delta_x, delta_y, delta_z = a, b, c', or None if the command could not be parsed with confidence.
+    """
+    text = str(prompt).lower()
+    # "move up -5 mm" is ambiguous (a minus sign against the direction), so leave it to the LLM
+    if re.search(r"(?<![\w.])-\s*\d", text):
+        return None
+    text = text.replace("-", " ").strip().rstrip(".!")
+    delta = [0.0, 0.0, 0.0]
+    seen_axes = set()
+    clauses = [clause for clause in re.split(r"[,;]|\band\b|\bthen\b", text) if clause.strip()]
+    for clause in clauses:
+        # distances come first: once "x direction" is removed, "20 in x direction" would end in "20 in"
+        matches = list(DISTANCE_PATTERN.finditer(clause))
+        # "move 3 in to the left": "in" right after a bare number may be the inch or a preposition
+        if any(match.group(2) is None and re.match(r"\s*in\b", clause[match.end():]) for match in matches):
+            return None
+        distances = [float(match.group(1)) * UNIT_TO_MM[normalize_unit(match.group(2))] for match in matches]
+        clause = DISTANCE_PATTERN.sub(" ", clause)
+
+        directions = set()
+        for pattern, direction in DIRECTION_PATTERNS:
+            for match in pattern.finditer(clause):
+                if direction is None:
+                    sign = -1.0 if match.group(1) == "negative" else 1.0
+                    directions.add(("xyz".index(match.group(2)), sign))
+                else:
+                    directions.add(direction)
+            clause = pattern.sub(" ", clause)
+
+        distances += [1.0] * len(VAGUE_PATTERN.findall(clause))
+        clause = VAGUE_PATTERN.sub(" ", clause)
+
+        # any leftover word outside the known vocabulary lowers confidence too far
+        if any(word not in FILLER_WORDS for word in re.findall(r"[a-z']+", clause)):
+            return None
+        if not directions and not distances:
+            continue
+        # e.g. "move up z-axis a bit" names the same direction twice, which is fine
+        if len(directions) != 1 or len(distances) != 1:
+            return None
+        axis, sign = directions.pop()
+        if axis in seen_axes:
+            return None
+        seen_axes.add(axis)
+        delta[axis] = sign * distances[0]
+
+    # rule 4: no indication of distance at all means no movement
+    return format_delta_string(delta)
+
+# drop-in replacement for generate_response_robmove that tries the local parser first
+def generate_response_robmove_local(prompt, client):
+    """
+    Same interface as generate_response_robmove. Simple commands are answered by parse_command_local
+    with zero token usage; everything else falls back to the LLM.
+
+    Args:
+    - prompt (str): The input prompt for the model.
+    - client: The OpenAI API client.
+
+    Returns:
+    - str: The content of the response.
+    - usage: Token usage (all zeros for local answers).
+    """
+    local_answer = parse_command_local(prompt)
+    if local_answer is not None:
+        return local_answer, SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+    return generate_response_robmove(prompt, client)
+
+# report how often the local parser answers and how well it agrees with the LLM
+def compare_local_parser(prompt_list, client):
+    """
+    Runs both the local parser and the LLM over a prompt list and prints hit rate and agreement.
+
+    Args:
+    - prompt_list (list of str): List of prompts to process.
+    - client: The OpenAI API client.
+
+    Returns:
+    - list of dict: One row per prompt with the local answer, the LLM answer and whether they agree.
+    """
+    rows = []
+    hits = agreements = 0
+    parse_time = 0.0
+    for prompt in prompt_list:
+        start = time.perf_counter()
+        local_answer = parse_command_local(prompt)
+        parse_time += time.perf_counter() - start
+        llm_answer = generate_response_robmove(prompt, client)[0]
+        agree = None
+        if local_answer is not None:
+            hits += 1
+            llm_delta = parse_delta_string(llm_answer)
+            agree = llm_delta is not None and all(
+                abs(a - b) < 1e-6 for a, b in zip(parse_delta_string(local_answer), llm_delta))
+            agreements += agree
+        rows.append({"prompt": prompt, "local": local_answer, "llm": llm_answer, "agree": agree})
+        if agree is False:
+            print(f"Disagreement: {prompt!r} local={local_answer!r} llm={llm_answer!r}")
+
+    count = max(len(prompt_list), 1)
+    print(f"Local parser hit rate: {hits}/{len(prompt_list)} ({100 * hits / count:.1f}%)")
+    print(f"Agreement with LLM on parsed prompts: {agreements}/{hits} ({100 * agreements / max(hits, 1):.1f}%)")
+    print(f"Local parse time per prompt: {1e6 * parse_time / count:.1f} microseconds")
+    return rows
 
 # loop through the prompt list
-def process_prompts(prompt_list, client, generate_response_func, prompt_exe_list=None):
+def process_prompts(prompt_list, client, generate_response_func, prompt_exe_list=None, max_retries=5):
     """
     Processes a list of prompts, generating a completion for each.
     
     Args:
     - prompt_list (list of str): List of prompts to process.
     - client: The OpenAI API client.
+    - max_retries (int): Retries per prompt on 429/5xx errors, see call_with_retry.
     
     Returns:
     - list: A list of completions.
@@ -155,7 +611,7 @@ def process_prompts(prompt_list, client, generate_response_func, prompt_exe_list
     # if prompt_exe is not provided, default to an empty list
     if prompt_exe_list is None:    
         for prompt in prompt_list:
-            response_content, usage = generate_response_func(prompt, client)
+            response_content, usage = call_with_retry(generate_response_func, (prompt, client), max_retries=max_retries)
             completions.append(response_content)
             
             # accumulate token usage
@@ -171,7 +627,7 @@ def process_prompts(prompt_list, client, generate_response_func, prompt_exe_list
         
         # process both lists together
         for prompt, prompt_exe in zip(prompt_list, prompt_exe_list):
-            response_content, usage = generate_response_func(prompt, prompt_exe, client)
+            response_content, usage = call_with_retry(generate_response_func, (prompt, prompt_exe, client), max_retries=max_retries)
             completions.append(response_content)
             
             # accumulate token usage
@@ -179,7 +635,367 @@ def process_prompts(prompt_list, client, generate_response_func, prompt_exe_list
             total_usage['completion_tokens'] += usage.completion_tokens
             total_usage['total_tokens'] += usage.total_tokens 
 
-    return completions, total_usage       
+    return completions, total_usage
+
+# token bucket shared by the worker threads to stay under the API request rate
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Args:
+    - rate (float): Tokens (requests) added per second.
+    - capacity (int): Maximum burst size.
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until one token is available, then consumes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# check whether an API error is worth retrying (rate limit or server side)
+def is_retryable_error(error):
+    """Returns True for HTTP 429/5xx and connection errors raised by the OpenAI client."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+# call a response function, retrying with jittered exponential backoff
+def call_with_retry(func, args, rate_limiter=None, max_retries=5, base_delay=1.0, max_delay=30.0):
+    """
+    Calls func(*args), retrying on rate-limit and server errors.
+
+    Args:
+    - func (callable): The response function, e.g. generate_response_robmove.
+    - args (tuple): Positional arguments for func.
+    - rate_limiter (TokenBucket): Optional limiter acquired before every attempt.
+    - max_retries (int): Number of retries after the first attempt.
+    - base_delay (float): Initial backoff in seconds.
+    - max_delay (float): Upper bound of a single backoff in seconds.
+
+    Returns:
+    - The return value of func.
+    """
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return func(*args)
+        except Exception as error:
+            if attempt >= max_retries or not is_retryable_error(error):
+                raise
+            # full jitter: sleep a random time up to the exponential ceiling
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+            attempt += 1
+
+# loop through the prompt list with a pool of worker threads
+def process_prompts_concurrent(prompt_list, client, generate_response_func, prompt_exe_list=None,
+                               max_workers=8, requests_per_second=5.0, max_retries=5):
+    """
+    Concurrent version of process_prompts with bounded parallelism, rate limiting and retries.
+    Completions are returned in the same order as prompt_list.
+
+    Args:
+    - prompt_list (list of str): List of prompts to process.
+    - client: The OpenAI API client.
+    - generate_response_func (callable): generate_response_robmove or generate_response_ask4conf.
+    - prompt_exe_list (list of str): Optional second argument list for generate_response_ask4conf.
+    - max_workers (int): Maximum number of requests in flight.
+    - requests_per_second (float): Token bucket refill rate.
+    - max_retries (int): Retries per prompt on 429/5xx errors.
+
+    Returns:
+    - list: A list of completions.
+    - dict: Token usage statistics.
+    """
+    if prompt_exe_list is None:
+        args_list = [(prompt, client) for prompt in prompt_list]
+    else:
+        # ensure prompt_list and prompt_exe have the same length
+        if len(prompt_list) != len(prompt_exe_list):
+            raise ValueError("prompt_list and prompt_exe must have the same length")
+        args_list = [(prompt, prompt_exe, client) for prompt, prompt_exe in zip(prompt_list, prompt_exe_list)]
+
+    rate_limiter = TokenBucket(requests_per_second, capacity=max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # map keeps the input order regardless of completion order
+        results = list(executor.map(
+            lambda args: call_with_retry(generate_response_func, args, rate_limiter, max_retries),
+            args_list))
+
+    completions = []
+    total_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    for response_content, usage in results:
+        completions.append(response_content)
+
+        # accumulate token usage
+        total_usage['prompt_tokens'] += usage.prompt_tokens
+        total_usage['completion_tokens'] += usage.completion_tokens
+        total_usage['total_tokens'] += usage.total_tokens
+
+    return completions, total_usage
+
+# normalize a spoken/typed command so trivial variations share a cache entry
+def normalize_prompt(prompt):
+    """Lowercases, collapses whitespace and strips trailing punctuation."""
+    return re.sub(r"\s+", " ", str(prompt).lower()).strip().rstrip(".!?")
+
+# persistent on-disk cache of chat completions
+class ResponseCache:
+    """
+    SQLite-backed cache of chat completions with LRU and TTL eviction.
+    The key combines the model, the temperature, a hash of every message before the final user
+    message (system prompt and few-shot examples) and the normalized final user message.
+
+    Args:
+    - path (str): Location of the SQLite file, shared by the interactive and batch scripts.
+    - max_entries (int): Least recently used entries beyond this count are evicted.
+    - ttl (float): Entry lifetime in seconds; None keeps entries forever.
+    - bypass (bool): If True, never read or write the cache.
+    """
+    def __init__(self, path=os.path.join("Cache", "responses.sqlite"), max_entries=10000, ttl=None, bypass=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # one connection shared by the worker threads of process_prompts_concurrent, guarded by self.lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY, content TEXT, prompt_tokens INTEGER, completion_tokens INTEGER,
+            created REAL, last_access REAL)""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.connection.commit()
+        # entry count as far as this process knows; other processes sharing the file make it drift,
+        # so it is recounted whenever eviction runs
+        self.size = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, messages, temperature):
+        """Builds the cache key for a chat completion request."""
+        prefix = json.dumps(messages[:-1], sort_keys=True)
+        prefix_hash = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        prompt = normalize_prompt(messages[-1]["content"])
+        return hashlib.sha256(f"{model}\n{temperature}\n{prefix_hash}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns (content, prompt_tokens, completion_tokens) or None on a miss."""
+        if self.bypass:
+            return None
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT content, prompt_tokens, completion_tokens, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[3] > self.ttl:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.connection.commit()
+                self.size -= 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+            self.hits += 1
+            return row[:3]
+
+    def put(self, key, content, prompt_tokens, completion_tokens):
+        """
+        Stores a completion. Once there are more than max_entries entries, the least recently used ones
+        are evicted down to 90% of max_entries, so the eviction query runs once per many inserts
+        instead of sorting the table on every insert.
+        """
+        if self.bypass:
+            return
+        now = time.time()
+        with self.lock:
+            exists = self.connection.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                                    (key, content, prompt_tokens, completion_tokens, now, now))
+            self.size += not exists
+            if self.size > self.max_entries:
+                self.size = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                excess = self.size - int(0.9 * self.max_entries)
+                if excess > 0 and self.size > self.max_entries:
+                    self.connection.execute("""DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_access LIMIT ?)""", (excess,))
+                    self.size -= excess
+            self.connection.commit()
+
+    def clear(self):
+        """Removes every entry."""
+        with self.lock:
+            self.connection.execute("DELETE FROM responses")
+            self.connection.commit()
+            self.size = 0
+
+    def stats(self):
+        """Returns hit/miss counters and the hit rate."""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+# OpenAI client with an explicit keep-alive connection pool
+def create_client(api_key=None, base_url=None, max_connections=16, keepalive_expiry=120.0, timeout=60.0, max_retries=2, warm_up=False):
+    """
+    Creates an OpenAI client on a shared httpx connection pool whose idle connections are kept open,
+    so consecutive requests of a session reuse one TLS connection instead of handshaking again.
+    Create it once per process and pass it around.
+
+    Args:
+    - api_key (str): The API key; defaults to the OPENAI_API_KEY environment variable.
+    - base_url (str): Alternative API endpoint, e.g. StubOpenAIServer.base_url.
+    - max_connections (int): Size of the connection pool; at least the number of concurrent workers.
+    - keepalive_expiry (float): Seconds an idle connection is kept open.
+    - timeout (float): Request timeout in seconds.
+    - max_retries (int): Retries done by the OpenAI client itself. Pass 0 when the calls go through
+      call_with_retry (process_prompts*, run_batch_resumable, HRIServer): the two layers would
+      multiply the attempts and bypass the TokenBucket pacing.
+    - warm_up (bool): Open a connection right away, see warm_up_client.
+
+    Returns:
+    - OpenAI: The client.
+    """
+    import httpx
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                            keepalive_expiry=keepalive_expiry),
+        timeout=timeout,
+    )
+    client = openai.OpenAI(api_key=api_key if api_key is not None else os.getenv("OPENAI_API_KEY"),
+                           base_url=base_url, http_client=http_client, max_retries=max_retries)
+    if warm_up:
+        warm_up_client(client)
+    return client
+
+# open the connection to the API before the first command is spoken
+def warm_up_client(client):
+    """
+    Sends a cheap request (listing the models, no tokens) so that DNS lookup, the TCP and TLS handshakes
+    and the client's lazy initialisation are done before the first real request.
+    Failures are reported and ignored; the first real request will simply pay for the connection.
+
+    Args:
+    - client: The OpenAI API client (or a CachedClient).
+
+    Returns:
+    - float: Seconds the warm-up took, or None if it failed.
+    """
+    with TRACER.span("warm_up"):
+        start_time = time.perf_counter()
+        try:
+            client.models.list()
+        except Exception as e:
+            print(f"Warm-up request failed: {e}")
+            return None
+        return time.perf_counter() - start_time
+
+# measure start-up cost and the latency of the first request
+def benchmark_startup(make_client, repeats=3, modules=("openai", "pandas", "numpy", "pyautogui", "playsound", "sqlite3",
+                                                      "http.server", "asyncio", "subprocess")):
+    """
+    Compares the import time of this module with the time of importing its heavy dependencies eagerly,
+    and the time to first token of the first streamed request on a fresh client with and without warm-up.
+    Imports are timed in fresh interpreters so that nothing is already cached in sys.modules.
+
+    Args:
+    - make_client (callable): Returns a new client, e.g. lambda: create_client(base_url=server.base_url).
+    - repeats (int): Number of fresh interpreters and fresh clients per measurement.
+    - modules (tuple of str): Heavy dependencies to time; those not installed are skipped.
+
+    Returns:
+    - dict: Median seconds of "import_lazy", "import_eager", "first_token_cold" and "first_token_warm".
+    """
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    installed = [name for name in modules if importlib.util.find_spec(name) is not None]
+    def time_import(statement):
+        code = f"import time\nt = time.perf_counter()\n{statement}\nprint(time.perf_counter() - t)"
+        times = []
+        for _ in range(repeats):
+            result = subprocess.run([sys.executable, "-c", code], cwd=module_dir, capture_output=True, text=True)
+            if result.returncode == 0:
+                times.append(float(result.stdout.strip().splitlines()[-1]))
+        return sorted(times)[len(times) // 2] if times else float("nan")
+    def time_first_token(warm):
+        times = []
+        for _ in range(repeats):
+            client = make_client()
+            if warm:
+                warm_up_client(client)
+            start_time = time.perf_counter()
+            chunks = stream_chat_text([{"role": "user", "content": "move up 1 cm"}], client)
+            next(chunks, None)
+            times.append(time.perf_counter() - start_time)
+            # read the rest so the connection is closed cleanly
+            for _ in chunks:
+                pass
+        return sorted(times)[len(times) // 2]
+    # pyautogui fails without a display; the time spent before it fails still counts
+    eager = f"import HRILLM\nfor name in {installed!r}:\n    try: __import__(name)\n    except Exception: pass"
+    results = {
+        "import_lazy": time_import("import HRILLM"),
+        "import_eager": time_import(eager),
+        "first_token_cold": time_first_token(False),
+        "first_token_warm": time_first_token(True),
+    }
+    for name, seconds in results.items():
+        print(f"{name:>18}: {seconds:.3f} s")
+    return results
+
+# OpenAI client wrapper that answers repeated chat requests from a ResponseCache
+class CachedClient:
+    """
+    Wraps an OpenAI client so that client.chat.completions.create is served from a ResponseCache.
+    Cached answers report zero token usage and cache_hit=True. Every other attribute (e.g. client.audio) is passed through,
+    so the wrapper can be handed to any function in this module in place of the client.
+
+    Args:
+    - client: The OpenAI API client.
+    - cache (ResponseCache): The cache to read from and write to.
+    """
+    def __init__(self, client, cache):
+        self.client = client
+        self.cache = cache
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_chat_completion))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def create_chat_completion(self, **kwargs):
+        """Cached version of client.chat.completions.create."""
+        # streamed responses cannot be replayed from the cache
+        if kwargs.get("stream"):
+            return self.client.chat.completions.create(**kwargs)
+        key = ResponseCache.make_key(kwargs.get("model"), kwargs["messages"], kwargs.get("temperature"))
+        cached = self.cache.get(key)
+        if cached is not None:
+            content = cached[0]
+            usage = SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+        else:
+            response = self.client.chat.completions.create(**kwargs)
+            content = response.choices[0].message.content
+            usage = response.usage
+            self.cache.put(key, content, usage.prompt_tokens, usage.completion_tokens)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage,
+                               cache_hit=cached is not None)
 
 # save result to a new excel
 def save_to_excel_with_suffix(df, file_path, suffix="_Completion"):
@@ -213,6 +1029,248 @@ def save_to_excel(df, file_path):
     df.to_excel(file_path, index=False)
     print(f"Completion added to a new column in {file_path}")
 
+# load a prompt table from xlsx, csv or parquet
+def load_prompt_table(file_path):
+    """
+    Loads prompts into a DataFrame, choosing the reader from the file extension.
+    CSV and Parquet avoid openpyxl's parse cost for large prompt corpora.
+    """
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext == ".csv":
+        return pd.read_csv(file_path)
+    if file_ext == ".parquet":
+        return pd.read_parquet(file_path)
+    return pd.read_excel(file_path)
+
+# read the records of a JSONL checkpoint
+def read_checkpoint(checkpoint_path):
+    """
+    Returns the records of an append-only JSONL checkpoint, keyed by their "id" (see run_batch_resumable).
+    A partially written last line (e.g. after a crash) is ignored; trim_checkpoint removes it before appending.
+    """
+    records = {}
+    if not os.path.exists(checkpoint_path):
+        return records
+    with open(checkpoint_path, "r", encoding="utf-8") as checkpoint_file:
+        for line in checkpoint_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record["id"]] = record
+    return records
+
+# make a checkpoint safe to append to
+def trim_checkpoint(checkpoint_path):
+    """
+    Ends a JSONL checkpoint on a complete line before records are appended to it. A partially written
+    last line (e.g. after a crash) is cut off; otherwise the next record would be glued onto it and lost
+    on the following resume. A complete record that only lacks its newline gets one.
+    """
+    if not os.path.exists(checkpoint_path):
+        return
+    with open(checkpoint_path, "rb+") as checkpoint_file:
+        end = checkpoint_file.seek(0, os.SEEK_END)
+        # find the start of the last line, reading backwards in blocks
+        position = end
+        while position > 0:
+            start = max(position - 4096, 0)
+            checkpoint_file.seek(start)
+            newline = checkpoint_file.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position == end:
+            return
+        checkpoint_file.seek(position)
+        try:
+            json.loads(checkpoint_file.read().decode("utf-8"))
+        except ValueError:
+            checkpoint_file.truncate(position)
+        else:
+            checkpoint_file.write(b"\n")
+
+# generate completions for the rows that are not done yet
+def iter_completions(jobs, client, generate_response_func, max_workers=1, requests_per_second=5.0, max_retries=5):
+    """
+    Generator yielding one record per job as soon as it is finished.
+
+    Args:
+    - jobs (list of tuple): (row id, args) where args are passed to generate_response_func before client.
+    - client: The OpenAI API client.
+    - generate_response_func (callable): e.g. generate_response_robmove.
+    - max_workers (int): Concurrent requests; records arrive in completion order when > 1.
+    - requests_per_second (float): Token bucket refill rate.
+    - max_retries (int): Retries per row on 429/5xx errors.
+
+    Yields:
+    - dict: id, completion, token usage and latency in seconds.
+    """
+    rate_limiter = TokenBucket(requests_per_second, capacity=max_workers)
+
+    def run(job):
+        row_id, args = job
+        start_time = time.perf_counter()
+        completion, usage = call_with_retry(generate_response_func, (*args, client), rate_limiter, max_retries)
+        return {"id": row_id, "completion": completion, "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens, "total_tokens": usage.total_tokens,
+                "latency": time.perf_counter() - start_time}
+
+    if max_workers <= 1:
+        for job in jobs:
+            yield run(job)
+        return
+    # keep checkpointing the other rows when one fails, then report the first failure
+    first_error = None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for future in as_completed([executor.submit(run, job) for job in jobs]):
+            if future.exception() is not None:
+                first_error = first_error or future.exception()
+                continue
+            yield future.result()
+    if first_error is not None:
+        raise first_error
+
+# resumable batch run with incremental checkpointing
+def run_batch_resumable(file_path, client, generate_response_func, prompt_column='Prompt Contents',
+                        prompt_exe_column=None, id_column='Prompt ID', checkpoint_path=None,
+                        suffix="_Completion", max_workers=1, config=None):
+    """
+    Processes a prompt table row by row, appending every result to a JSONL checkpoint as soon as it
+    arrives. Rows already in the checkpoint are skipped, so a crashed or rate-limited run resumes where
+    it stopped without paying for the finished rows again. The Excel output is built from the
+    checkpoint only at the end. A checkpoint record is keyed on the row id, the prompt text, the
+    response function and config, so a run with another parser, model or example selection does not
+    reuse the completions of an earlier one.
+
+    Args:
+    - file_path (str): Prompt table (.xlsx, .csv or .parquet).
+    - client: The OpenAI API client.
+    - generate_response_func (callable): generate_response_robmove, generate_response_ask4conf, ...
+    - prompt_column (str): Column holding the prompts.
+    - prompt_exe_column (str): Optional second argument column for generate_response_ask4conf.
+    - id_column (str): Column identifying a row; the row index is used if it is missing.
+    - checkpoint_path (str): Defaults to the input path with suffix and a .jsonl extension.
+    - suffix (str): Suffix of the checkpoint and of the Excel output.
+    - max_workers (int): Concurrent requests.
+    - config: JSON-serializable description of everything else that changes the completions
+      (model, router, retrieval, ...).
+
+    Returns:
+    - DataFrame: The table with Completion and Latency columns. If a UsageLedger budget stops the run
+      early, only the finished rows are returned and saved; run again to continue.
+    - dict: Token usage statistics over the returned rows, including those from earlier runs.
+    """
+    df = load_prompt_table(file_path)
+    file_base = os.path.splitext(file_path)[0]
+    if checkpoint_path is None:
+        checkpoint_path = f"{file_base}{suffix}.jsonl"
+    row_ids = df[id_column].tolist() if id_column in df.columns else df.index.tolist()
+    # JSON turns numpy scalars and tuples into plain values, so compare ids as strings
+    row_ids = [str(row_id) for row_id in row_ids]
+    columns = [prompt_column] if prompt_exe_column is None else [prompt_column, prompt_exe_column]
+    row_args = [tuple(df[column].iloc[position] for column in columns) for position in range(len(df))]
+    # a record only counts for the same prompt text, response function and configuration
+    fingerprint = json.dumps([getattr(generate_response_func, "__qualname__", repr(generate_response_func)), config],
+                             sort_keys=True, default=str)
+    row_ids = [f"{row_id}:" + hashlib.sha256(json.dumps([fingerprint, args], default=str).encode("utf-8")).hexdigest()[:16]
+               for row_id, args in zip(row_ids, row_args)]
+
+    trim_checkpoint(checkpoint_path)
+    records = read_checkpoint(checkpoint_path)
+    jobs = [(row_id, args) for row_id, args in zip(row_ids, row_args) if row_id not in records]
+    print(f"{len(row_ids) - len(jobs)} rows already in {checkpoint_path}, {len(jobs)} to go")
+
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint_file:
+        try:
+            for record in iter_completions(jobs, client, generate_response_func, max_workers):
+                checkpoint_file.write(json.dumps(record) + "\n")
+                # make the record durable before moving on
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+                records[record["id"]] = record
+        except BudgetExceeded as error:
+            print(f"Stopped early: {error}. {sum(row_id in records for row_id in row_ids)} of {len(row_ids)} rows done; "
+                  "run again to continue.")
+
+    # keep the finished rows only
+    finished = [position for position, row_id in enumerate(row_ids) if row_id in records]
+    if len(finished) < len(row_ids):
+        df = df.iloc[finished].reset_index(drop=True)
+        row_ids = [row_ids[position] for position in finished]
+    df['Completion'] = [records[row_id]["completion"] for row_id in row_ids]
+    df['Latency'] = [records[row_id]["latency"] for row_id in row_ids]
+    total_usage = {key: sum(records[row_id][key] for row_id in row_ids)
+                   for key in ("prompt_tokens", "completion_tokens", "total_tokens")}
+    save_to_excel(df, f"{file_base}{suffix}.xlsx")
+    return df, total_usage
+
+# single reader of the console shared by every prompt of the program
+class ConsoleReader:
+    """
+    Reads stdin on one background thread, one line per request, so a prompt can stop waiting (e.g. a
+    KeyboardDecision that lost the race to a spoken answer) without leaving a stray input() call behind
+    that swallows the answer to the next prompt. A line read for a prompt that gave up is handed to the
+    next prompt instead. Every console prompt of the program must go through console_input.
+    """
+    def __init__(self):
+        self.lines = queue.Queue()
+        self.wanted = threading.Semaphore(0)
+        self.reading = False
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def run(self):
+        while True:
+            self.wanted.acquire()
+            try:
+                line = input()
+            except EOFError:
+                line = None
+            with self.lock:
+                self.reading = False
+            self.lines.put(line)
+
+    def readline(self, prompt="", stop_event=None):
+        """
+        Prints prompt and returns the next line, like input().
+
+        Args:
+        - prompt (str): Printed before waiting.
+        - stop_event (threading.Event): Gives up and returns None once set; the line being read is kept for the next prompt.
+
+        Returns:
+        - str: The line without the trailing newline.
+        """
+        print(prompt, end="", flush=True)
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            # read a new line unless one is being read or waiting already
+            if not self.reading and self.lines.empty():
+                self.reading = True
+                self.wanted.release()
+        while True:
+            try:
+                line = self.lines.get(timeout=0.05)
+            except queue.Empty:
+                if stop_event is not None and stop_event.is_set():
+                    return None
+                continue
+            if line is None:
+                raise EOFError
+            return line
+
+# console reader used by console_input
+CONSOLE = ConsoleReader()
+
+# input() through the shared console reader
+def console_input(prompt=""):
+    """Same as input(prompt), read through CONSOLE."""
+    return CONSOLE.readline(prompt)
+
 # calculate and print execution time per prompt
 def execution_time_per_prompt(start_time, end_time, promptCount):
     # calculate execution time
@@ -223,10 +1281,11 @@ def execution_time_per_prompt(start_time, end_time, promptCount):
     print(f"Execution time per Prompt: {execution_time_perP:.5f} seconds")
 
 # from audio input to text string
+@traced("stt")
 def AudioToText():
     # prompt the user to input 'Y' or 'N' 
     # note this interaction can be mapped instead to other physical buttons
-    startrecord = input("Start recording a clip? Y/N ").strip()
+    startrecord = console_input("Start recording a clip? Y/N ").strip()
 
     # check if start recording on Windows System
     if startrecord == "y" or startrecord == "Y":
@@ -235,7 +1294,7 @@ def AudioToText():
 
         # press the hotkey combination 'Windows logo key' +' H'
         pyautogui.hotkey('winleft', 'h')
-        audioinput = input("I'm listening ... (say \"new line\" to stop listening)").strip()
+        audioinput = console_input("I'm listening ... (say \"new line\" to stop listening)").strip()
         # print("Hotkey Windows + H pressed: start recording")
 
         pyautogui.hotkey('winleft', 'h')
@@ -245,37 +1304,2922 @@ def AudioToText():
     else:
         print("do not record")
 
-# from text to audio using openai 
-def TextToAudio(text, audioStreamFilePath, client, voice = "nova"):
-
-    # Start streaming the text-to-speech response from the OpenAI API
-    with client.audio.speech.with_streaming_response.create(
-        model="tts-1", # Specify the TTS model to use
-        voice="nova", # Specify the voice for speech synthesis
-        input=text, # The text to be converted into speech
-    ) as response:
-        # Stream the audio response directly to a file
-        response.stream_to_file(audioStreamFilePath)
-        
-    # Play the generated audio file after saving it
-    playsound(audioStreamFilePath)
+# sample format expected by the local speech recognizers: 16 kHz, 16-bit, mono
+STT_SAMPLE_RATE = 16000
+
+# read a WAV file as a stream of audio frames
+def wav_frames(path, frame_ms=30):
+    """
+    Yields 16-bit mono PCM frames of frame_ms milliseconds from a WAV file recorded at STT_SAMPLE_RATE.
+    """
+    with wave.open(path, "rb") as wav_file:
+        if wav_file.getnchannels() != 1 or wav_file.getsampwidth() != 2 or wav_file.getframerate() != STT_SAMPLE_RATE:
+            raise ValueError(f"{path} must be 16-bit mono PCM at {STT_SAMPLE_RATE} Hz")
+        frames_per_chunk = STT_SAMPLE_RATE * frame_ms // 1000
+        while True:
+            frame = wav_file.readframes(frames_per_chunk)
+            if not frame:
+                break
+            yield frame
+
+# record the microphone as a stream of audio frames
+def microphone_frames(frame_ms=30):
+    """Yields 16-bit mono PCM frames of frame_ms milliseconds from the default microphone (requires sounddevice)."""
+    import sounddevice
+    frames_per_chunk = STT_SAMPLE_RATE * frame_ms // 1000
+    with sounddevice.RawInputStream(samplerate=STT_SAMPLE_RATE, channels=1, dtype="int16",
+                                    blocksize=frames_per_chunk) as stream:
+        while True:
+            frame, _ = stream.read(frames_per_chunk)
+            yield bytes(frame)
+
+# energy-based voice activity detection
+class EnergyVAD:
+    """
+    Decides when an utterance is over: speech starts when a frame's RMS level exceeds threshold,
+    and ends after hangover_ms of consecutive quiet frames.
+
+    Args:
+    - threshold (float): RMS level (16-bit sample units) separating speech from silence.
+    - hangover_ms (int): Silence after speech that ends the utterance.
+    - frame_ms (int): Duration of one frame.
+    """
+    def __init__(self, threshold=500.0, hangover_ms=600, frame_ms=30):
+        self.threshold = threshold
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.reset()
+
+    def reset(self):
+        """Prepares for the next utterance."""
+        self.speech_started = False
+        self.quiet_frames = 0
+
+    def is_speech(self, frame):
+        """True if the frame is louder than the threshold."""
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        return samples.size > 0 and float(np.sqrt(np.mean(samples ** 2))) > self.threshold
+
+    def update(self, frame):
+        """Feeds one frame; returns True once the utterance has ended."""
+        if self.is_speech(frame):
+            self.speech_started = True
+            self.quiet_frames = 0
+        elif self.speech_started:
+            self.quiet_frames += 1
+        return self.speech_started and self.quiet_frames >= self.hangover_frames
+
+# interface of the speech-to-text backends
+class SpeechRecognizer:
+    """
+    Base class of the STT backends. listen() returns the final transcript of one utterance;
+    on_partial, if given, is called with every partial transcript while the operator speaks,
+    and stop_event, if given and set, makes listen() give up and return "" as soon as the backend can.
+    """
+    def listen(self, on_partial=None, stop_event=None):
+        raise NotImplementedError
+
+    def clone(self):
+        """Returns a recognizer for a second listener (e.g. speech_decision) that shares no per-utterance state with this one."""
+        return self
+
+# the original Windows dictation path as a backend
+class HotkeyDictationRecognizer(SpeechRecognizer):
+    """Windows dictation (Win+H through pyautogui), i.e. AudioToText. Produces no partial transcripts and cannot be stopped."""
+    def listen(self, on_partial=None, stop_event=None):
+        return AudioToText()
+
+# offline streaming recognizer on the CPU
+class VoskRecognizer(SpeechRecognizer):
+    """
+    Offline streaming recognition with Vosk (requires the vosk package and a downloaded model).
+    Frames come from the microphone by default or from any frame iterator (e.g. wav_frames),
+    and the utterance is ended automatically by voice-activity detection.
+
+    Args:
+    - model_path (str): Folder of a Vosk model, e.g. vosk-model-small-en-us-0.15.
+    - vad (EnergyVAD): End-of-utterance detector.
+    - frame_ms (int): Duration of one frame.
+    - max_seconds (float): Upper bound of one utterance.
+    """
+    def __init__(self, model_path, vad=None, frame_ms=30, max_seconds=15.0):
+        import vosk
+        self.vosk = vosk
+        self.model = vosk.Model(model_path)
+        self.vad = vad if vad is not None else EnergyVAD(frame_ms=frame_ms)
+        self.frame_ms = frame_ms
+        self.max_seconds = max_seconds
+        self.last_timings = {}
+
+    def clone(self):
+        """Returns a recognizer sharing the loaded model, with its own VAD and last_timings."""
+        twin = copy.copy(self)
+        twin.vad = copy.deepcopy(self.vad)
+        twin.last_timings = {}
+        return twin
+
+    def transcribe(self, frames, on_partial=None, stop_event=None):
+        """
+        Transcribes one utterance from an iterator of frames.
+
+        Args:
+        - stop_event (threading.Event): Checked before every frame; once set, "" is returned at once.
+
+        Returns:
+        - str: The final transcript.
+        """
+        recognizer = self.vosk.KaldiRecognizer(self.model, STT_SAMPLE_RATE)
+        self.vad.reset()
+        segments = []
+        partial = ""
+        audio_seconds = 0.0
+        processing_seconds = 0.0
+        with TRACER.span("stt") as span:
+            for frame in frames:
+                if stop_event is not None and stop_event.is_set():
+                    span.update({"stopped": True})
+                    return ""
+                start_time = time.perf_counter()
+                if recognizer.AcceptWaveform(frame):
+                    text = json.loads(recognizer.Result()).get("text", "")
+                    if text:
+                        segments.append(text)
+                else:
+                    text = json.loads(recognizer.PartialResult()).get("partial", "")
+                    if text and text != partial and on_partial is not None:
+                        on_partial(" ".join(segments + [text]))
+                    partial = text
+                processing_seconds += time.perf_counter() - start_time
+                audio_seconds += len(frame) / (2 * STT_SAMPLE_RATE)
+                if self.vad.update(frame) or audio_seconds >= self.max_seconds:
+                    break
+            # end of speech: only the final decode separates the operator from the text
+            start_time = time.perf_counter()
+            text = json.loads(recognizer.FinalResult()).get("text", "")
+            finalize_seconds = time.perf_counter() - start_time
+            if text:
+                segments.append(text)
+            transcript = " ".join(segments)
+            self.last_timings = {
+                "audio_seconds": audio_seconds,
+                "real_time_factor": (processing_seconds + finalize_seconds) / audio_seconds if audio_seconds else 0.0,
+                # the VAD hangover is spent waiting in real time before the final decode starts
+                "end_of_speech_to_text": self.vad.hangover_frames * self.frame_ms / 1000 + finalize_seconds,
+            }
+            span.update(self.last_timings)
+        return transcript
+
+    def listen(self, on_partial=None, stop_event=None):
+        print("I'm listening ...")
+        # closing releases the microphone as soon as the utterance ends or stop_event is set
+        with contextlib.closing(microphone_frames(self.frame_ms)) as frames:
+            transcript = self.transcribe(frames, on_partial, stop_event)
+        if stop_event is None or not stop_event.is_set():
+            print("What I heard: " + transcript)
+        return transcript
+
+# measure a recognizer on WAV fixtures
+def benchmark_stt(recognizer, wav_paths, references=None):
+    """
+    Transcribes WAV fixtures (16 kHz mono) as fast as possible and prints real-time factor and
+    end-of-speech-to-text latency per file.
+
+    Args:
+    - recognizer (VoskRecognizer): A recognizer with transcribe() and last_timings.
+    - wav_paths (list of str): WAV fixtures.
+    - references (list of str): Optional expected transcripts.
+
+    Returns:
+    - list of dict: One row per file with transcript and timings.
+    """
+    rows = []
+    for index, path in enumerate(wav_paths):
+        transcript = recognizer.transcribe(wav_frames(path, recognizer.frame_ms))
+        row = {"file": path, "transcript": transcript, **recognizer.last_timings}
+        if references is not None:
+            row["matches_reference"] = normalize_prompt(transcript) == normalize_prompt(references[index])
+        rows.append(row)
+        print(f"{os.path.basename(path)}: RTF {row['real_time_factor']:.3f}, "
+              f"end of speech to text {1000 * row['end_of_speech_to_text']:.0f} ms, {transcript!r}")
+    return rows
+
+# from text to audio using openai 
+def TextToAudio(text, audioStreamFilePath, client, voice = "nova"):
+
+    # Start streaming the text-to-speech response from the OpenAI API
+    with TRACER.span("tts_download", characters=len(text)):
+        with client.audio.speech.with_streaming_response.create(
+            model="tts-1", # Specify the TTS model to use
+            voice="nova", # Specify the voice for speech synthesis
+            input=text, # The text to be converted into speech
+        ) as response:
+            # Stream the audio response directly to a file
+            response.stream_to_file(audioStreamFilePath)
+        
+    # Play the generated audio file after saving it
+    with TRACER.span("playback"):
+        playsound(audioStreamFilePath)
+
+# fixed phrases spoken by confirm2action
+CONFIRM_TEXT_ACCEPTED = "Happy to help! Robot starts moving..."
+CONFIRM_TEXT_REJECTED = "Oops. Incorrect trajectory. Kindly input the correct parameters and attempt again."
 
 # simulate confirmation step before robot movement
-def confirm2action(audioStreamFilePath, client):
+def confirm2action(audioStreamFilePath, client, clip_cache=None):
     # prompt the user to input 'Y' or 'N' 
     # note this interaction can be mapped instead to other physical buttons
-    startrecord = input("Does the proposed movement align with expectations?? Y/N ").strip()
+    with TRACER.span("confirmation_wait"):
+        startrecord = console_input("Does the proposed movement align with expectations?? Y/N ").strip()
 
     # check if start recording on Windows System
     if startrecord == "y" or startrecord == "Y":
         # verbal confirmation
-        comfirm_text = "Happy to help! Robot starts moving..."
-        TextToAudio(comfirm_text, audioStreamFilePath, client)
+        comfirm_text = CONFIRM_TEXT_ACCEPTED
+        if clip_cache is not None:
+            play_pcm(clip_cache.get_clip(comfirm_text, client))
+        else:
+            TextToAudio(comfirm_text, audioStreamFilePath, client)
         print("Trajectory confirmed. The robot is now in motion...")
         return 1
     else:
         # verbal response and propose for another attempt
-        comfirm_text = "Oops. Incorrect trajectory. Kindly input the correct parameters and attempt again."
-        TextToAudio(comfirm_text, audioStreamFilePath, client)
+        comfirm_text = CONFIRM_TEXT_REJECTED
+        if clip_cache is not None:
+            play_pcm(clip_cache.get_clip(comfirm_text, client))
+        else:
+            TextToAudio(comfirm_text, audioStreamFilePath, client)
         print("Incorrect trajectory. Kindly input the correct parameters and attempt again.")
-        return 0
\ No newline at end of file
+        return 0
+
+# sample format of the "pcm" response format of the TTS API: 24 kHz, 16-bit, mono
+PCM_SAMPLE_RATE = 24000
+
+# stream the text deltas of a chat completion
+def stream_chat_text(messages, client, model="gpt-3.5-turbo", **kwargs):
+    """
+    Requests a streamed chat completion and yields the content deltas as they arrive.
+
+    Args:
+    - messages (list of dict): The chat messages.
+    - client: The OpenAI API client.
+    - model (str): The chat model.
+
+    Yields:
+    - str: Pieces of the assistant's response.
+    """
+    with TRACER.span("chat_stream", model=model) as span:
+        start_time = time.perf_counter()
+        stream = client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if "time_to_first_token" not in span:
+                    span["time_to_first_token"] = time.perf_counter() - start_time
+                yield chunk.choices[0].delta.content
+
+# cut a stream of text pieces into sentences
+def split_sentences(text_chunks):
+    """
+    Yields complete sentences from a stream of text pieces as soon as they end with '.', '!' or '?'
+    followed by whitespace; whatever is left when the stream ends is yielded last.
+    A decimal point such as '0.5' never ends a sentence because it is not followed by whitespace.
+
+    Args:
+    - text_chunks (iterable of str): e.g. the output of stream_chat_text.
+
+    Yields:
+    - str: One sentence at a time.
+    """
+    buffer = ""
+    for chunk in text_chunks:
+        buffer += chunk
+        while True:
+            match = re.search(r"[.!?]+\s+", buffer)
+            if match is None:
+                break
+            sentence = buffer[:match.end()].strip()
+            buffer = buffer[match.end():]
+            if sentence:
+                yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+# stream raw PCM audio for a piece of text
+def synthesize_speech_chunks(text, client, voice="nova", chunk_size=4096, model="tts-1"):
+    """
+    Streams the speech for text as 24 kHz 16-bit mono PCM without writing a file.
+
+    Args:
+    - text (str): The text to be converted into speech.
+    - client: The OpenAI API client.
+    - voice (str): The voice for speech synthesis.
+    - chunk_size (int): Bytes per yielded chunk.
+    - model (str): The TTS model.
+
+    Yields:
+    - bytes: PCM audio chunks.
+    """
+    with TRACER.span("tts_stream", characters=len(text)) as span:
+        start_time = time.perf_counter()
+        with client.audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text,
+            response_format="pcm",
+        ) as response:
+            for chunk in response.iter_bytes(chunk_size):
+                if "time_to_first_token" not in span:
+                    span["time_to_first_token"] = time.perf_counter() - start_time
+                yield chunk
+
+# wrap raw PCM into an in-memory WAV file
+def pcm_to_wav_bytes(pcm):
+    """Returns the bytes of a WAV file holding 24 kHz 16-bit mono PCM."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(PCM_SAMPLE_RATE)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+# audio sink for streamed PCM
+class PCMOutput:
+    """
+    Plays PCM chunks as they arrive. Uses a sounddevice output stream when sounddevice is installed;
+    otherwise each sentence is collected in memory and played through playsound once it is complete.
+    """
+    def __init__(self):
+        self.pending = bytearray()
+        try:
+            import sounddevice
+            self.stream = sounddevice.RawOutputStream(samplerate=PCM_SAMPLE_RATE, channels=1, dtype="int16")
+            self.stream.start()
+        except ImportError:
+            self.stream = None
+
+    def write(self, chunk):
+        """Plays (or queues) one chunk of PCM audio."""
+        if self.stream is not None:
+            self.stream.write(chunk)
+        else:
+            self.pending.extend(chunk)
+
+    def end_sentence(self):
+        """Marks the end of a sentence; the playsound fallback plays it now."""
+        if self.stream is None and self.pending:
+            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as wav_file:
+                wav_file.write(pcm_to_wav_bytes(bytes(self.pending)))
+            self.pending.clear()
+            playsound(wav_file.name)
+            os.remove(wav_file.name)
+
+    def close(self):
+        """Flushes and releases the audio device."""
+        self.end_sentence()
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+
+    def abort(self):
+        """Drops the audio that is still buffered and releases the audio device."""
+        self.pending.clear()
+        if self.stream is not None:
+            self.stream.abort()
+            self.stream.close()
+
+# audio sink that discards the audio, for benchmarks and stub runs
+class NullOutput:
+    """
+    Counts the received PCM bytes without playing them.
+
+    Args:
+    - paced (bool): Take as long as playing the audio would, like a blocking audio device.
+    """
+    def __init__(self, paced=False):
+        self.paced = paced
+        self.bytes_received = 0
+
+    def write(self, chunk):
+        self.bytes_received += len(chunk)
+        if self.paced:
+            time.sleep(len(chunk) / (2 * PCM_SAMPLE_RATE))
+
+    def end_sentence(self):
+        pass
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+# speak a text stream sentence by sentence: LLM streaming, TTS and playback overlap
+def speak_streaming(text_chunks, client, voice="nova", output=None):
+    """
+    Pipelines a stream of text into speech. Sentences are cut from text_chunks on the calling thread,
+    synthesized one after another on a TTS thread, and played on a playback thread,
+    so the first sentence is heard while later ones are still being generated.
+
+    Args:
+    - text_chunks (iterable of str): e.g. stream_chat_text(...).
+    - client: The OpenAI API client.
+    - voice (str): The voice for speech synthesis.
+    - output: Audio sink with write/end_sentence/close methods; defaults to PCMOutput().
+
+    Returns:
+    - str: The full text.
+    - dict: Timings in seconds (time_to_first_sentence, time_to_first_audio, total).
+    """
+    output = output if output is not None else PCMOutput()
+    start_time = time.perf_counter()
+    timings = {"time_to_first_sentence": None, "time_to_first_audio": None, "total": None}
+    sentence_queue = queue.Queue()
+    audio_queue = queue.Queue()
+    errors = []
+
+    def synthesize():
+        try:
+            while True:
+                sentence = sentence_queue.get()
+                if sentence is None:
+                    break
+                for chunk in synthesize_speech_chunks(sentence, client, voice):
+                    audio_queue.put(chunk)
+                audio_queue.put(b"")  # sentence boundary
+        except Exception as error:
+            errors.append(error)
+        finally:
+            audio_queue.put(None)
+
+    def play():
+        while True:
+            chunk = audio_queue.get()
+            if chunk is None:
+                break
+            if chunk == b"":
+                output.end_sentence()
+                continue
+            if timings["time_to_first_audio"] is None:
+                timings["time_to_first_audio"] = time.perf_counter() - start_time
+            output.write(chunk)
+
+    tts_thread = threading.Thread(target=synthesize, daemon=True)
+    player_thread = threading.Thread(target=play, daemon=True)
+    tts_thread.start()
+    player_thread.start()
+
+    sentences = []
+    try:
+        for sentence in split_sentences(text_chunks):
+            if timings["time_to_first_sentence"] is None:
+                timings["time_to_first_sentence"] = time.perf_counter() - start_time
+            sentences.append(sentence)
+            sentence_queue.put(sentence)
+    finally:
+        sentence_queue.put(None)
+        tts_thread.join()
+        player_thread.join()
+        output.close()
+    if errors:
+        raise errors[0]
+
+    timings["total"] = time.perf_counter() - start_time
+    TRACER.record({"name": "speech_pipeline", "start": time.time() - timings["total"], "duration": timings["total"],
+                   "time_to_first_sentence": timings["time_to_first_sentence"],
+                   "time_to_first_audio": timings["time_to_first_audio"]})
+    return " ".join(sentences), timings
+
+# streamed version of generate_response_ask4conf that speaks while it generates
+def speak_ask4conf_streaming(prompt, prompt_exe, client, voice="nova", output=None):
+    """
+    Streams the reiteration and confirmation answer and speaks it sentence by sentence.
+
+    Args:
+    - prompt (str): The input prompt for the model.
+    - prompt_exe (str): The robmove completion for the prompt.
+    - client: The OpenAI API client.
+    - voice (str): The voice for speech synthesis.
+    - output: Audio sink, see speak_streaming.
+
+    Returns:
+    - str: The full confirmation text.
+    - dict: Timings in seconds, see speak_streaming.
+    """
+    text_chunks = stream_chat_text(build_messages_ask4conf(prompt, prompt_exe), client)
+    return speak_streaming(text_chunks, client, voice, output)
+
+# local stand-in for the OpenAI API that returns canned chunks
+class StubOpenAIServer:
+    """
+    Minimal HTTP server implementing /chat/completions (plain and streamed), /audio/speech and /models
+    with canned content, so the pipeline can be run and timed without an API key.
+    Point a client at it with OpenAI(api_key="stub", base_url=server.base_url).
+
+    Args:
+    - chat_reply (str): Text returned by every chat completion.
+    - text_chunk_size (int): Characters per streamed chat chunk.
+    - chunk_delay (float): Seconds to wait before each streamed chat or audio chunk.
+    - audio_bytes_per_char (int): Length of the canned (silent) PCM audio per input character.
+    - audio_chunk_size (int): Bytes per audio chunk.
+    - latency (float): Seconds to wait before answering any request.
+    - jitter (float): Extra random wait of up to this many seconds.
+    - error_rate (float): Probability of answering with error_status instead of a response.
+    - error_status (int): HTTP status of injected errors (429 or 5xx exercise the retry path).
+    - model_latency (dict): Extra seconds per requested model, e.g. to tell a fast from a strong tier.
+    - seed: Seed of the latency and error draws. Draws depend only on the seed, the request body and
+      how often that body was sent before, so runs are reproducible even with concurrent requests.
+    """
+    def __init__(self, chat_reply="I heard you said move up 36 mm. I will move along positive z-axis for 36 mm. Is that OK?",
+                 text_chunk_size=4, chunk_delay=0.01, audio_bytes_per_char=960, audio_chunk_size=4096,
+                 latency=0.0, jitter=0.0, error_rate=0.0, error_status=429, model_latency=None, seed=0):
+        self.chat_reply = chat_reply
+        self.text_chunk_size = text_chunk_size
+        self.chunk_delay = chunk_delay
+        self.audio_bytes_per_char = audio_bytes_per_char
+        self.audio_chunk_size = audio_chunk_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.model_latency = model_latency or {}
+        self.seed = seed
+        self.attempts = collections.Counter()
+        self.requests_served = 0
+        self.errors_injected = 0
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def chat_response(self, request):
+        """Returns the reply text for a chat request; override to vary it per request."""
+        return self.chat_reply
+
+    def inject(self, handler, request):
+        """Applies latency and jitter; sends an injected error and returns True if this request fails."""
+        body = json.dumps(request, sort_keys=True)
+        with self.lock:
+            attempt = self.attempts[body]
+            self.attempts[body] += 1
+            self.requests_served += 1
+        rng = random.Random(f"{self.seed}:{attempt}:{body}")
+        time.sleep(self.latency + self.model_latency.get(request.get("model"), 0.0) + self.jitter * rng.random())
+        if rng.random() >= self.error_rate:
+            return False
+        with self.lock:
+            self.errors_injected += 1
+        error = json.dumps({"error": {"message": "injected error", "type": "stub_error", "code": None}}).encode("utf-8")
+        handler.send_response(self.error_status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(error)))
+        handler.end_headers()
+        handler.wfile.write(error)
+        return True
+
+    def usage(self, request, reply):
+        """Rough token usage of a request, four characters per token."""
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in request.get("messages", [])) // 4
+        completion_tokens = max(len(reply) // 4, 1)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def start(self):
+        """Starts serving on a free local port in a background thread."""
+        stub = self
+
+        class Handler(http_server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are separate writes; Nagle's algorithm would delay the second one
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_chunk(self, data):
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if stub.inject(self, request):
+                    return
+                if self.path.endswith("/chat/completions"):
+                    stub.handle_chat(self, request)
+                elif self.path.endswith("/audio/speech"):
+                    stub.handle_speech(self, request)
+                else:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+
+            def do_GET(self):
+                # answers the warm-up request of warm_up_client
+                if self.path.endswith("/models"):
+                    body = json.dumps({"object": "list", "data": []}).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                else:
+                    body = b""
+                    self.send_response(404)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = http_server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Shuts the server down."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle_chat(self, handler, request):
+        reply = self.chat_response(request)
+        model = request.get("model", "gpt-3.5-turbo")
+        if request.get("stream"):
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/event-stream")
+            handler.send_header("Transfer-Encoding", "chunked")
+            handler.end_headers()
+            for index in range(0, len(reply), self.text_chunk_size):
+                time.sleep(self.chunk_delay)
+                event = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": model,
+                         "choices": [{"index": 0, "delta": {"content": reply[index:index + self.text_chunk_size]},
+                                      "finish_reason": None}]}
+                handler.send_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            # like the API, a last chunk without choices carries the usage when it was asked for
+            if (request.get("stream_options") or {}).get("include_usage"):
+                event = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": model,
+                         "choices": [], "usage": self.usage(request, reply)}
+                handler.send_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            handler.send_chunk(b"data: [DONE]\n\n")
+            handler.send_chunk(b"")
+        else:
+            body = json.dumps({"id": "stub", "object": "chat.completion", "created": 0, "model": model,
+                               "choices": [{"index": 0, "finish_reason": "stop",
+                                            "message": {"role": "assistant", "content": reply}}],
+                               "usage": self.usage(request, reply)}).encode("utf-8")
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+
+    def handle_speech(self, handler, request):
+        audio = bytes(self.audio_bytes_per_char * len(request.get("input", "")))
+        handler.send_response(200)
+        handler.send_header("Content-Type", "audio/pcm")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+        for index in range(0, len(audio), self.audio_chunk_size):
+            time.sleep(self.chunk_delay)
+            handler.send_chunk(audio[index:index + self.audio_chunk_size])
+        handler.send_chunk(b"")
+
+# compare time-to-first-audio of the serial path with the streaming pipeline
+def compare_speech_latency(prompt, prompt_exe, client, voice="nova"):
+    """
+    Runs the confirmation step twice, once as in main() (full answer, then full audio) and once through
+    speak_ask4conf_streaming, with audio discarded, and prints the time until audio could start.
+
+    Args:
+    - prompt (str): The input prompt for the model.
+    - prompt_exe (str): The robmove completion for the prompt.
+    - client: The OpenAI API client, e.g. pointed at a StubOpenAIServer.
+    - voice (str): The voice for speech synthesis.
+
+    Returns:
+    - dict: Time to first audio in seconds for both paths.
+    """
+    # serial: the whole answer, then the whole clip, then playback
+    start_time = time.perf_counter()
+    answer = generate_response_ask4conf(prompt, prompt_exe, client)[0]
+    audio = b"".join(synthesize_speech_chunks(answer, client, voice))
+    serial_time = time.perf_counter() - start_time
+
+    streaming_time = speak_ask4conf_streaming(prompt, prompt_exe, client, voice, NullOutput())[1]["time_to_first_audio"]
+    print(f"Time to first audio, serial: {serial_time:.3f} s ({len(audio)} bytes)")
+    print(f"Time to first audio, streaming: {streaming_time:.3f} s")
+    return {"serial": serial_time, "streaming": streaming_time}
+
+
+# play a complete PCM buffer from memory
+def play_pcm(pcm, output=None):
+    """Plays 24 kHz 16-bit mono PCM through output (default PCMOutput) and waits until it is done."""
+    output = output if output is not None else PCMOutput()
+    output.write(pcm)
+    output.close()
+
+# spoken names of the axis directions used in the confirmation template
+AXIS_PHRASES = [("negative x-axis", "positive x-axis"), ("negative y-axis", "positive y-axis"),
+                ("negative z-axis", "positive z-axis")]
+
+# constant phrases of the template confirmation, pre-rendered as clips by AudioClipCache
+CONFIRMATION_PHRASES = ["I heard you said", "I will move along", "for", "and", "I will stay where I am", "Is that OK?"] + \
+    [phrase for phrases in AXIS_PHRASES for phrase in phrases]
+
+# break a confirmation for a delta into its spoken phrases
+def confirmation_fragments(delta):
+    """
+    Returns the fragments of 'I will move along positive x-axis for 500 mm and ... Is that OK?'
+    for (x, y, z) deltas in millimeters: phrases of CONFIRMATION_PHRASES and one '<N> mm' per distance.
+    """
+    moves = []
+    for axis, value in enumerate(delta):
+        if value != 0:
+            moves.append([AXIS_PHRASES[axis][value > 0], "for", f"{abs(value):g} mm"])
+    if not moves:
+        return ["I will stay where I am", "Is that OK?"]
+    fragments = ["I will move along"]
+    for index, move in enumerate(moves):
+        if index > 0:
+            fragments.append("and")
+        fragments.extend(move)
+    fragments.append("Is that OK?")
+    return fragments
+
+# template version of the ask4conf 'I will ...' sentence
+def confirmation_text_from_delta(delta):
+    """Renders the confirmation sentence for (x, y, z) deltas in millimeters without calling the LLM."""
+    fragments = confirmation_fragments(delta)
+    return " ".join(fragments[:-1]) + ". " + fragments[-1]
+
+# content-addressed store of synthesized speech clips
+class AudioClipCache:
+    """
+    In-memory and on-disk cache of TTS clips (24 kHz 16-bit mono PCM) keyed on a hash of text, voice and model.
+    All clips found on disk are loaded into memory when the cache is created, so constant phrases
+    are played without a network round-trip; only text that was never synthesized reaches client.audio.speech.
+
+    Args:
+    - directory (str): Folder holding one .pcm file per clip.
+    - voice (str): The voice for speech synthesis.
+    - model (str): The TTS model.
+    """
+    def __init__(self, directory=os.path.join("AudioStream", "clips"), voice="nova", model="tts-1"):
+        self.directory = directory
+        self.voice = voice
+        self.model = model
+        self.clips = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        for file_name in os.listdir(directory):
+            if file_name.endswith(".pcm"):
+                with open(os.path.join(directory, file_name), "rb") as clip_file:
+                    self.clips[file_name[:-4]] = clip_file.read()
+
+    def key(self, text):
+        """Content address of a clip."""
+        return hashlib.sha256(f"{self.model}\n{self.voice}\n{text}".encode("utf-8")).hexdigest()
+
+    def get_clip(self, text, client, store=True):
+        """
+        Returns the PCM audio for text, synthesizing it only on a cache miss.
+
+        Args:
+        - text (str): The text to be converted into speech.
+        - client: The OpenAI API client.
+        - store (bool): Keep a newly synthesized clip; set False for one-off text.
+
+        Returns:
+        - bytes: PCM audio.
+        """
+        key = self.key(text)
+        with self.lock:
+            clip = self.clips.get(key)
+            if clip is not None:
+                self.hits += 1
+                return clip
+            self.misses += 1
+        clip = b"".join(synthesize_speech_chunks(text, client, self.voice, model=self.model))
+        if store:
+            with self.lock:
+                self.clips[key] = clip
+            with open(os.path.join(self.directory, key + ".pcm"), "wb") as clip_file:
+                clip_file.write(clip)
+        return clip
+
+    def preload(self, texts, client):
+        """Makes sure every text in texts has a clip, e.g. the constant phrases at startup."""
+        for text in texts:
+            self.get_clip(text, client)
+
+    def confirmation_clips(self, prompt, delta, client):
+        """
+        Speaks the template-mode confirmation (render_confirmation_text) from clips: the constant phrases
+        and the '<N> mm' distances are cached, only the operator's own words are synthesized every time.
+
+        Args:
+        - prompt (str): The operator's command, repeated after 'I heard you said'.
+        - delta: (x, y, z) deltas in millimeters, e.g. a MotionDelta.
+
+        Yields:
+        - bytes: PCM audio of one fragment, so playback can start before the last fragment is ready.
+        """
+        yield self.get_clip("I heard you said", client)
+        yield self.get_clip(heard_text(prompt), client, store=False)
+        for fragment in confirmation_fragments(delta):
+            yield self.get_clip(fragment, client)
+
+    def stats(self):
+        """Returns hit/miss counters and the number of clips held in memory."""
+        return {"hits": self.hits, "misses": self.misses, "clips": len(self.clips)}
+
+# add up the token usage of several API calls
+def add_usage(*usages):
+    """Returns the summed prompt/completion/total tokens of usage objects as a SimpleNamespace."""
+    return SimpleNamespace(
+        prompt_tokens=sum(usage.prompt_tokens for usage in usages),
+        completion_tokens=sum(usage.completion_tokens for usage in usages),
+        total_tokens=sum(usage.total_tokens for usage in usages))
+
+# the operator's command as repeated in the confirmation
+def heard_text(prompt):
+    """Returns prompt without surrounding spaces and a final period, starting in lower case."""
+    heard = str(prompt).strip().rstrip(".")
+    return heard[:1].lower() + heard[1:]
+
+# full confirmation sentence as produced by ask4conf, rendered from a template
+def render_confirmation_text(prompt, delta):
+    """Returns 'I heard you said <prompt>. I will ... Is that OK?' for (x, y, z) deltas in millimeters."""
+    return f"I heard you said {heard_text(prompt)}. " + confirmation_text_from_delta(delta)
+
+# build the fused interpretation + confirmation prefix from the robmove examples
+def build_fused_prefix(prefix=ROBMOVE_PREFIX):
+    """
+    Builds the static prefix asking for both the robmove deltas and the spoken confirmation as one JSON object.
+    It reuses the robmove system prompt and few-shot examples; the example answers are rewritten as JSON
+    with confirmations rendered by render_confirmation_text.
+
+    Args:
+    - prefix (tuple of dict): A robmove prefix, see build_prefix.
+
+    Returns:
+    - tuple of dict: The prefix messages.
+    """
+    messages = [{"role": "system", "content": prefix[0]["content"] + """
+            9) Wrap the answer in a JSON object with two keys; rule 8 applies to the value of "prompt_exe":
+                - "prompt_exe": the output described above.
+                - "confirmation": start by repeating the prompt by replying 'I heard you said ...', then say 'I will ...' following a natural language discription of prompt_exe, where the unit is always in millimeters, and finish with a question for confirmation."""}]
+    for user_message, assistant_message in zip(prefix[1::2], prefix[2::2]):
+        delta = parse_delta_string(assistant_message["content"])
+        messages.append(user_message)
+        messages.append({"role": "assistant", "content": json.dumps({
+            "prompt_exe": format_delta_string(delta),
+            "confirmation": render_confirmation_text(user_message["content"], delta)})})
+    return tuple(messages)
+
+# static prefix of generate_response_fused
+FUSED_PREFIX = build_fused_prefix()
+
+# build the fused interpretation + confirmation conversation
+def build_messages_fused(prompt):
+    """Builds the message list sent by generate_response_fused."""
+    return [*FUSED_PREFIX, {"role": "user", "content": prompt}]
+
+# generate the deltas and the confirmation with a single request
+@traced("fused_llm")
+def generate_response_fused(prompt, client):
+    """
+    Replaces the generate_response_robmove -> generate_response_ask4conf chain with one JSON-mode request.
+    Falls back to the two-call chain if the answer is not valid JSON with a parsable prompt_exe.
+
+    Args:
+    - prompt (str): The input prompt for the model.
+    - client: The OpenAI API client.
+
+    Returns:
+    - tuple of str: (prompt_exe, confirmation).
+    - usage: Token usage of all requests made.
+    """
+    response = client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        temperature=0,
+        response_format={"type": "json_object"},
+        messages=build_messages_fused(prompt)
+    )
+    try:
+        answer = json.loads(response.choices[0].message.content)
+        prompt_exe, confirmation = answer["prompt_exe"], answer["confirmation"]
+        if parse_delta_string(prompt_exe) is not None and confirmation:
+            return (prompt_exe, confirmation), response.usage
+    except (ValueError, KeyError, TypeError):
+        pass
+    (prompt_exe, confirmation), usage = generate_response_chain(prompt, client)
+    return (prompt_exe, confirmation), add_usage(response.usage, usage)
+
+# the original two sequential requests, with the same return shape as generate_response_fused
+def generate_response_chain(prompt, client):
+    """
+    Runs generate_response_robmove, then generate_response_ask4conf on its answer.
+
+    Returns:
+    - tuple of str: (prompt_exe, confirmation).
+    - usage: Token usage of both requests.
+    """
+    prompt_exe, usage_robmove = generate_response_robmove(prompt, client)
+    confirmation, usage_ask4conf = generate_response_ask4conf(prompt, prompt_exe, client)
+    return (prompt_exe, confirmation), add_usage(usage_robmove, usage_ask4conf)
+
+# interpret with the local parser (LLM fallback) and render the confirmation from a template
+def generate_response_template(prompt, client):
+    """
+    Produces (prompt_exe, confirmation) with at most one robmove request: the confirmation
+    is rendered locally from the parsed deltas instead of asking the LLM.
+
+    Returns:
+    - tuple of str: (prompt_exe, confirmation).
+    - usage: Token usage (zero when the local parser handled the prompt).
+    """
+    prompt_exe, usage = generate_response_robmove_local(prompt, client)
+    delta = parse_delta_string(prompt_exe)
+    if delta is None:
+        # the model ignored the output format; let ask4conf phrase whatever it said
+        confirmation, usage_ask4conf = generate_response_ask4conf(prompt, prompt_exe, client)
+        return (prompt_exe, confirmation), add_usage(usage, usage_ask4conf)
+    return (prompt_exe, render_confirmation_text(prompt, delta)), usage
+
+# benchmark the confirmation modes against each other
+def compare_confirmation_modes(prompt_list, client, modes=None):
+    """
+    Runs every confirmation mode over a prompt list and prints tokens, wall time and how often
+    each mode's deltas agree with the two-call chain.
+
+    Args:
+    - prompt_list (list of str): List of prompts to process.
+    - client: The OpenAI API client.
+    - modes (dict): Name -> response function; defaults to chain, fused and template.
+
+    Returns:
+    - dict: Name -> {"completions", "token_usage", "seconds"}.
+    """
+    if modes is None:
+        modes = {"chain": generate_response_chain, "fused": generate_response_fused, "template": generate_response_template}
+    results = {}
+    for name, generate_response_func in modes.items():
+        start_time = time.perf_counter()
+        completions, token_usage = process_prompts(prompt_list, client, generate_response_func)
+        results[name] = {"completions": completions, "token_usage": token_usage,
+                         "seconds": time.perf_counter() - start_time}
+
+    reference = [parse_delta_string(prompt_exe) for prompt_exe, _ in next(iter(results.values()))["completions"]]
+    for name, result in results.items():
+        agreement = sum(parse_delta_string(prompt_exe) == expected
+                        for (prompt_exe, _), expected in zip(result["completions"], reference))
+        print(f"{name}: {result['token_usage']['total_tokens']} tokens, {result['seconds']:.3f} seconds, "
+              f"deltas agree with {next(iter(results))} on {agreement}/{len(prompt_list)} prompts")
+    return results
+
+
+# count tokens locally
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """
+    Counts the tokens of text with tiktoken when it is installed; otherwise approximates the count
+    by words and punctuation marks, which is close enough to rank prompt sections.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return len(re.findall(r"\w+|[^\w\s]", text))
+    return len(tiktoken.encoding_for_model(model).encode(text))
+
+# report the token cost of each section of a message list
+def profile_prompt_tokens(messages, model="gpt-3.5-turbo", verbose=True):
+    """
+    Breaks the prompt tokens of a chat request down into system prompt, each few-shot example
+    (user + assistant pair) and the final user message.
+
+    Args:
+    - messages (list of dict): The chat messages, e.g. build_messages_robmove(prompt).
+    - model (str): Model whose tokenizer is used.
+    - verbose (bool): Print the table.
+
+    Returns:
+    - list of tuple: (section name, tokens); the per-message overhead of 3 tokens is included.
+    """
+    # every message costs 3 tokens of framing on top of its content
+    message_tokens = [count_tokens(message["content"], model) + 3 for message in messages]
+    sections = [("system", message_tokens[0])]
+    for index in range(1, len(messages) - 1, 2):
+        sections.append((f"example {(index + 1) // 2}: {messages[index]['content'][:40]}",
+                         message_tokens[index] + message_tokens[index + 1]))
+    sections.append(("user", message_tokens[-1] + 3))  # the reply is primed with 3 more tokens
+    if verbose:
+        total = sum(tokens for _, tokens in sections)
+        for name, tokens in sections:
+            print(f"{tokens:6d} {100 * tokens / total:5.1f}%  {name}")
+        print(f"{total:6d} total")
+    return sections
+
+# score completions against expected deltas
+def delta_accuracy(completions, expected_list):
+    """Returns the share of completions whose parsed deltas equal the expected deltas."""
+    correct = 0
+    for completion, expected in zip(completions, expected_list):
+        delta, expected_delta = parse_delta_string(completion), parse_delta_string(expected)
+        correct += delta is not None and expected_delta is not None and all(
+            abs(a - b) < 1e-6 for a, b in zip(delta, expected_delta))
+    return correct / max(len(expected_list), 1)
+
+# strip the source-code indentation that the triple-quoted prompts carry into every request
+def compact_prompt_text(text):
+    """Removes leading and trailing whitespace of every line."""
+    return "\n".join(line.strip() for line in text.strip().splitlines())
+
+# prefix variants for the ablation: dropped and shortened example sets
+def ablation_variants(system_prompt=ROBMOVE_SYSTEM_PROMPT, examples=ROBMOVE_EXAMPLES):
+    """
+    Returns name -> prefix for: all examples, no examples, all examples with a compacted system prompt,
+    each example left out, and the k shortest examples for every k.
+    """
+    variants = {"all examples": build_prefix(system_prompt, examples), "no examples": build_prefix(system_prompt, ()),
+                "all examples, compacted system prompt": build_prefix(compact_prompt_text(system_prompt), examples)}
+    for index, (user_content, _) in enumerate(examples):
+        variants[f"without {user_content!r}"] = build_prefix(system_prompt, examples[:index] + examples[index + 1:])
+    by_length = sorted(examples, key=lambda example: len(example[0]))
+    for k in range(1, len(examples)):
+        variants[f"{k} shortest"] = build_prefix(system_prompt, by_length[:k])
+    return variants
+
+# trade accuracy against prompt tokens over a labeled prompt set
+def ablate_prompt_prefix(prompt_list, expected_list, client, variants=None, max_workers=8):
+    """
+    Runs generate_response_robmove with every prefix variant and prints accuracy against
+    prompt tokens per request, cheapest first.
+
+    Args:
+    - prompt_list (list of str): List of prompts to process.
+    - expected_list (list of str): Ground-truth 'delta_x, delta_y, delta_z = ...' strings.
+    - client: The OpenAI API client.
+    - variants (dict): Name -> prefix; defaults to ablation_variants().
+    - max_workers (int): Concurrent requests per variant.
+
+    Returns:
+    - list of dict: One row per variant with accuracy and token counts.
+    """
+    variants = variants if variants is not None else ablation_variants()
+    rows = []
+    for name, prefix in variants.items():
+        completions, token_usage = process_prompts_concurrent(
+            prompt_list, client, lambda prompt, client: generate_response_robmove(prompt, client, prefix),
+            max_workers=max_workers)
+        rows.append({"variant": name, "accuracy": delta_accuracy(completions, expected_list),
+                     "prefix_tokens": sum(tokens for _, tokens in profile_prompt_tokens([*prefix, {"content": ""}], verbose=False)[:-1]),
+                     "prompt_tokens_per_request": token_usage["prompt_tokens"] / max(len(prompt_list), 1)})
+    for row in sorted(rows, key=lambda row: row["prefix_tokens"]):
+        print(f"{row['accuracy']:6.1%} {row['prefix_tokens']:6d} prefix tokens "
+              f"{row['prompt_tokens_per_request']:8.1f} prompt tokens/request  {row['variant']}")
+    return rows
+
+
+# load completions recorded by an earlier live run for replay
+def load_recorded_responses(file_path, prompt_column='Prompt Contents', completion_column='Completion',
+                            prompt_exe_column=None):
+    """
+    Builds {normalized final user message: completion} from a _Completion workbook (or csv/parquet),
+    in the form ReplayStubServer looks requests up.
+
+    Args:
+    - file_path (str): Table written by a live run, e.g. TestData/Prompts_TestData_4_1_Completion.xlsx.
+    - prompt_column (str): Column holding the prompts.
+    - completion_column (str): Column holding the recorded completions.
+    - prompt_exe_column (str): Set for ask4conf recordings, whose user message also carries prompt_exe.
+    """
+    df = load_prompt_table(file_path)
+    responses = {}
+    for position in range(len(df)):
+        prompt = str(df[prompt_column].iloc[position])
+        if prompt_exe_column is not None:
+            prompt = "prompt: " + prompt + "; prompt_exe: " + str(df[prompt_exe_column].iloc[position])
+        responses[normalize_prompt(prompt)] = str(df[completion_column].iloc[position])
+    return responses
+
+# local stand-in for the OpenAI API that replays recorded completions
+class ReplayStubServer(StubOpenAIServer):
+    """
+    StubOpenAIServer answering each chat request with the completion recorded for its final user
+    message (see load_recorded_responses), with the latency, jitter and error injection of the base class.
+
+    Args:
+    - responses (dict): Normalized final user message -> completion.
+    - default_reply (str): Answer for messages that were never recorded.
+    - **kwargs: Passed to StubOpenAIServer.
+    """
+    def __init__(self, responses, default_reply="delta_x, delta_y, delta_z = 0.0, 0.0, 0.0", **kwargs):
+        super().__init__(chat_reply=default_reply, **kwargs)
+        self.responses = responses
+        self.misses = 0
+
+    def chat_response(self, request):
+        content = request["messages"][-1]["content"]
+        # packed requests (see build_messages_robmove_packed) are answered line by line
+        if content.startswith(PACKED_INSTRUCTION):
+            return "\n".join(f"{number}) {self.lookup(prompt)}" for number, prompt in PACKED_LINE_PATTERN.findall(content[len(PACKED_INSTRUCTION):]))
+        return self.lookup(content)
+
+    def lookup(self, content):
+        """Returns the recorded completion of a user message, or the default reply."""
+        reply = self.responses.get(normalize_prompt(content))
+        if reply is None:
+            with self.lock:
+                self.misses += 1
+            return self.chat_reply
+        return reply
+
+# parse many robmove completions at once
+def parse_delta_array(completions):
+    """Returns an (N, 3) float array of deltas in millimeters; rows that do not parse are NaN."""
+    extracted = pd.Series([str(completion) for completion in completions], dtype=object).str.extract(DELTA_PATTERN)
+    return extracted.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float).reshape(-1, 3)
+
+# vectorized accuracy of robmove completions
+def score_completions(completions, expected_list, tolerance=1e-6):
+    """
+    Scores completions against expected 'delta_x, delta_y, delta_z = ...' strings with NumPy.
+
+    Args:
+    - completions (list of str): Model outputs.
+    - expected_list (list of str): Ground truth in the same order.
+    - tolerance (float): Absolute tolerance in millimeters for a match.
+
+    Returns:
+    - dict: count, parse_failures, exact_match (rate), axis_match (rate per axis),
+      mean_abs_error and max_abs_error per axis (mm, parsed rows only), sign_errors per axis.
+    """
+    predicted = parse_delta_array(completions)
+    expected = parse_delta_array(expected_list)
+    parsed = ~np.isnan(predicted).any(axis=1) & ~np.isnan(expected).any(axis=1)
+    error = np.abs(predicted - expected)
+    axis_match = parsed[:, None] & (error <= tolerance)
+    # a sign error moves the robot the wrong way along an axis it should move along
+    sign_errors = parsed[:, None] & (np.sign(predicted) != np.sign(expected)) & (expected != 0)
+    count = len(expected)
+    return {
+        "count": count,
+        "parse_failures": int(count - parsed.sum()),
+        "exact_match": float(axis_match.all(axis=1).mean()) if count else 0.0,
+        "axis_match": axis_match.mean(axis=0).tolist() if count else [0.0] * 3,
+        "mean_abs_error": np.nanmean(np.where(parsed[:, None], error, np.nan), axis=0).tolist() if parsed.any() else [float("nan")] * 3,
+        "max_abs_error": np.nanmax(np.where(parsed[:, None], error, np.nan), axis=0).tolist() if parsed.any() else [float("nan")] * 3,
+        "sign_errors": sign_errors.sum(axis=0).astype(int).tolist(),
+    }
+
+# run a batch against a local stand-in server and report throughput, latency and accuracy
+def run_offline_benchmark(prompt_list, generate_response_func, server, expected_list=None, prompt_exe_list=None,
+                          max_workers=1, requests_per_second=1000.0):
+    """
+    Runs process_prompts_concurrent (one worker reproduces the sequential process_prompts run, plus retries)
+    against a running StubOpenAIServer / ReplayStubServer, without spending tokens.
+
+    Args:
+    - prompt_list (list of str): List of prompts to process.
+    - generate_response_func (callable): e.g. generate_response_robmove.
+    - server (StubOpenAIServer): A started server.
+    - expected_list (list of str): Optional ground truth; rows with a missing (None/NaN) value are not scored.
+    - prompt_exe_list (list of str): Second argument list for generate_response_ask4conf.
+    - max_workers (int): Concurrent requests.
+    - requests_per_second (float): Token bucket rate for concurrent runs.
+
+    Returns:
+    - dict: Throughput, per-stage latency summary, token usage, served/injected error counts and accuracy.
+    """
+    # retries are left to call_with_retry so injected errors are visible in the numbers
+    client = openai.OpenAI(api_key="stub", base_url=server.base_url, max_retries=0)
+    TRACER.reset()
+    start_time = time.perf_counter()
+    completions, token_usage = process_prompts_concurrent(prompt_list, client, generate_response_func, prompt_exe_list,
+                                                          max_workers=max_workers, requests_per_second=requests_per_second)
+    wall_time = time.perf_counter() - start_time
+
+    result = {"prompts": len(prompt_list), "wall_time": wall_time, "throughput": len(prompt_list) / wall_time,
+              "latency": TRACER.summary(), "token_usage": token_usage, "requests_served": server.requests_served,
+              "errors_injected": server.errors_injected, "completions": completions}
+    if expected_list is not None:
+        scored = [index for index, expected in enumerate(expected_list) if isinstance(expected, str)]
+        result["accuracy"] = score_completions([completions[index] for index in scored], [expected_list[index] for index in scored])
+
+    print(f"{len(prompt_list)} prompts in {wall_time:.3f} s ({result['throughput']:.1f} prompts/s), "
+          f"{server.requests_served} requests, {server.errors_injected} injected errors")
+    TRACER.print_summary()
+    if "accuracy" in result:
+        print(f"Accuracy: {result['accuracy']}")
+    return result
+
+# interpret partial transcripts ahead of the final one
+class SpeculativeInterpreter:
+    """
+    Starts robmove interpretation on partial transcripts while the operator is still speaking.
+    A speculation is fired once a partial transcript has been stable for stable_seconds; a materially
+    different partial (different normalized text) abandons it and starts over. When the final
+    transcript matches a speculation, its result is reused, so the LLM round-trip overlaps with speech.
+
+    A request that is already on the wire cannot be aborted, so abandoned speculations still finish;
+    their tokens are counted as wasted.
+
+    Args:
+    - client: The OpenAI API client.
+    - generate_response_func (callable): e.g. generate_response_robmove or generate_response_robmove_local.
+    - stable_seconds (float): How long a partial must stay unchanged before it is interpreted.
+    - max_workers (int): Speculations that may run at the same time.
+    """
+    def __init__(self, client, generate_response_func=None, stable_seconds=0.3, max_workers=2):
+        self.client = client
+        self.generate_response_func = generate_response_func or generate_response_robmove
+        self.stable_seconds = stable_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.timer = None
+        self.speculations = {}
+        self.stats = {"launched": 0, "reused": 0, "abandoned": 0, "wasted_tokens": 0, "latency_saved": 0.0}
+
+    def on_partial(self, text):
+        """Callback for SpeechRecognizer.listen: (re)arms the stability timer for a new partial."""
+        key = normalize_prompt(text)
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            if not key or key in self.speculations:
+                return
+            self.timer = threading.Timer(self.stable_seconds, self.speculate, args=(text,))
+            self.timer.daemon = True
+            self.timer.start()
+
+    def speculate(self, text):
+        """Starts interpreting text in the background and abandons the other speculations."""
+        key = normalize_prompt(text)
+        with self.lock:
+            if key in self.speculations:
+                return
+            running = [self.abandon(other) for other in list(self.speculations)]
+            future = self.executor.submit(self.run, text)
+            self.speculations[key] = {"future": future, "start": time.perf_counter()}
+            self.stats["launched"] += 1
+        self.count_waste_later(running)
+
+    def run(self, text):
+        """Runs one interpretation and records when it finished."""
+        result = self.generate_response_func(text, self.client)
+        return result, time.perf_counter()
+
+    def abandon(self, key):
+        """
+        Drops a speculation. Needs self.lock.
+
+        Returns:
+        - Future or None: The speculation's future if it could not be cancelled; pass it to
+          count_waste_later after releasing self.lock.
+        """
+        speculation = self.speculations.pop(key)
+        self.stats["abandoned"] += 1
+        if not speculation["future"].cancel():
+            return speculation["future"]
+        return None
+
+    def count_waste_later(self, futures):
+        """
+        Adds the tokens of abandoned speculations to wasted_tokens once they finish. Must be called
+        without self.lock: a future that is already done runs count_waste right away on this thread.
+        """
+        for future in futures:
+            if future is not None:
+                future.add_done_callback(self.count_waste)
+
+    def count_waste(self, future):
+        if future.exception() is None:
+            usage = future.result()[0][1]
+            with self.lock:
+                self.stats["wasted_tokens"] += usage.total_tokens
+
+    def final(self, text):
+        """
+        Returns the interpretation of the final transcript, reusing a matching speculation.
+
+        Returns:
+        - str, usage: As generate_response_func.
+        """
+        key = normalize_prompt(text)
+        final_time = time.perf_counter()
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            speculation = self.speculations.pop(key, None)
+            running = [self.abandon(other) for other in list(self.speculations)]
+        self.count_waste_later(running)
+        if speculation is not None:
+            try:
+                result, done_time = speculation["future"].result()
+            except Exception:
+                speculation = None
+        if speculation is None:
+            return self.generate_response_func(text, self.client)
+        with self.lock:
+            self.stats["reused"] += 1
+            # the part of the request that ran before the operator finished speaking
+            self.stats["latency_saved"] += min(done_time, final_time) - speculation["start"]
+        return result
+
+    def shutdown(self):
+        """Stops the stability timer and the worker threads at the end of a session."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        self.executor.shutdown(wait=False)
+
+    def report(self):
+        """Prints reuse, wasted tokens and latency saved so far."""
+        print(f"Speculation: {self.stats['launched']} launched, {self.stats['reused']} reused, "
+              f"{self.stats['abandoned']} abandoned, {self.stats['wasted_tokens']} wasted tokens, "
+              f"{self.stats['latency_saved']:.3f} s latency saved")
+        return dict(self.stats)
+
+# state of one operator and robot served by HRIServer
+class HRISession:
+    """
+    Everything one operator/robot pair needs between turns, so several sessions can share a process.
+    Audio is kept in memory per session instead of in the shared AudioStream\\speech.mp3 file.
+
+    Args:
+    - session_id (str): Unique name of the session.
+    - robot: Optional label or handle of the robot driven by this session.
+    - client: The client this session's API calls go through (the server's client, or a
+      MeteredClient bound to this session so its usage is booked under the session id).
+    """
+    def __init__(self, session_id, robot=None, client=None):
+        self.session_id = session_id
+        self.robot = robot
+        self.client = client
+        self.history = []
+        self.audio = {}
+        self.move_successful = False
+        self.tracer = Tracer()
+
+    def latency_summary(self):
+        """Returns this session's per-stage latency percentiles, see Tracer.summary."""
+        return self.tracer.summary()
+
+# asyncio service running the voice-to-motion loop for many sessions at once
+class HRIServer:
+    """
+    Runs the robmove, ask4conf, speech synthesis and confirmation steps of many sessions concurrently.
+    The blocking API calls run on a shared thread pool behind one token bucket and one client
+    (with its connection pool), so the sessions together stay under the API rate limit.
+
+    Args:
+    - client: The OpenAI API client shared by all sessions.
+    - generate_response_func (callable): e.g. generate_response_robmove or generate_response_robmove_local.
+    - clip_cache (AudioClipCache): Optional source of the fixed confirmation phrases.
+    - max_workers (int): API calls in flight across all sessions.
+    - requests_per_second (float): Token bucket refill rate shared by all sessions.
+    - max_retries (int): Retries per call on 429/5xx errors.
+    - voice (str): The voice for speech synthesis.
+    """
+    def __init__(self, client, generate_response_func=None, clip_cache=None, max_workers=16,
+                 requests_per_second=20.0, max_retries=5, voice="nova"):
+        self.client = client
+        self.generate_response_func = generate_response_func or generate_response_robmove
+        self.clip_cache = clip_cache
+        self.max_retries = max_retries
+        self.voice = voice
+        self.rate_limiter = TokenBucket(requests_per_second, capacity=max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.sessions = {}
+
+    def open_session(self, session_id, robot=None):
+        """Creates and registers a new session."""
+        if session_id in self.sessions:
+            raise ValueError(f"session {session_id!r} already exists")
+        client = self.client.for_session(session_id) if isinstance(self.client, MeteredClient) else self.client
+        session = self.sessions[session_id] = HRISession(session_id, robot, client)
+        return session
+
+    def close_session(self, session_id):
+        """Forgets a session and its audio buffers."""
+        return self.sessions.pop(session_id, None)
+
+    def shutdown(self):
+        """Waits for the calls in flight and stops the thread pool."""
+        self.executor.shutdown(wait=True)
+
+    async def call(self, session, stage, func, *args):
+        """Runs func(*args) on the shared pool with rate limiting and retries, timed as a session stage."""
+        loop = asyncio.get_running_loop()
+        with session.tracer.span(stage):
+            return await loop.run_in_executor(self.executor, call_with_retry, func, args, self.rate_limiter, self.max_retries)
+
+    def synthesize(self, text, client=None):
+        """Returns the whole PCM audio of text as bytes."""
+        return b"".join(synthesize_speech_chunks(text, client or self.client, self.voice))
+
+    async def interpret(self, session, prompt):
+        """
+        Turns an operator command into a motion and a spoken confirmation question.
+
+        Returns:
+        - str: The robmove completion.
+        - str: The reiteration and confirmation question.
+        - bytes: The question as 24 kHz 16-bit mono PCM, also kept in session.audio["question"].
+        """
+        prompt_exe = (await self.call(session, "robmove", self.generate_response_func, prompt, session.client))[0]
+        question = (await self.call(session, "ask4conf", generate_response_ask4conf, prompt, prompt_exe, session.client))[0]
+        session.audio["question"] = await self.call(session, "tts", self.synthesize, question, session.client)
+        return prompt_exe, question, session.audio["question"]
+
+    async def confirm(self, session, accepted):
+        """
+        Server side of confirm2action: renders the spoken answer to the operator's decision.
+
+        Returns:
+        - int: 1 if the move was accepted, 0 otherwise, like confirm2action.
+        """
+        text = CONFIRM_TEXT_ACCEPTED if accepted else CONFIRM_TEXT_REJECTED
+        if self.clip_cache is not None:
+            session.audio["answer"] = await self.call(session, "confirmation_audio", self.clip_cache.get_clip, text, session.client)
+        else:
+            session.audio["answer"] = await self.call(session, "confirmation_audio", self.synthesize, text, session.client)
+        session.move_successful = bool(accepted)
+        return 1 if accepted else 0
+
+    async def turn(self, session, prompt, decide):
+        """
+        One pass of the interactive loop for a session.
+
+        Args:
+        - session (HRISession): The session.
+        - prompt (str): The recognized operator command.
+        - decide (async callable): decide(session, prompt_exe, question, audio) returns True to accept the move.
+
+        Returns:
+        - int: 1 if the move was accepted, 0 otherwise.
+        """
+        with session.tracer.span("turn"):
+            prompt_exe, question, audio = await self.interpret(session, prompt)
+            with session.tracer.span("confirmation_wait"):
+                accepted = await decide(session, prompt_exe, question, audio)
+            outcome = await self.confirm(session, accepted)
+        session.history.append({"prompt": prompt, "prompt_exe": prompt_exe, "question": question, "accepted": bool(accepted)})
+        return outcome
+
+# drive HRIServer with simulated operators against the local stub API
+def load_test_sessions(prompt_list, operators=8, turns_per_operator=3, think_time=0.5, accept_rate=0.8,
+                       max_workers=16, requests_per_second=20.0, generate_response_func=None, seed=0, ledger=None, **stub_kwargs):
+    """
+    Runs operators simulated sessions at once. Each operator repeatedly picks a command from prompt_list,
+    waits think_time seconds to "listen" to the question, and accepts it with probability accept_rate.
+
+    Args:
+    - prompt_list (list of str): Commands the operators pick from.
+    - operators (int): Number of concurrent sessions.
+    - turns_per_operator (int): Turns run by each session.
+    - think_time (float): Seconds each operator takes to decide.
+    - accept_rate (float): Probability of accepting a proposed move.
+    - max_workers (int): API calls in flight across all sessions.
+    - requests_per_second (float): Shared rate limit.
+    - generate_response_func (callable): Robmove function, see HRIServer.
+    - seed: Seed of the operators' choices.
+    - ledger (UsageLedger): Optional ledger booking the stub calls per operator session.
+    - **stub_kwargs: Passed to StubOpenAIServer, e.g. latency, jitter, error_rate.
+
+    Returns:
+    - dict: Wall time, turns per second and the per-session latency summaries.
+    """
+    async def operator(server, index):
+        session = server.open_session(f"operator-{index}")
+        rng = random.Random(f"{seed}:{index}")
+        async def decide(session, prompt_exe, question, audio):
+            await asyncio.sleep(think_time)
+            return rng.random() < accept_rate
+        for _ in range(turns_per_operator):
+            await server.turn(session, rng.choice(prompt_list), decide)
+        return session
+
+    async def run_all(server):
+        return await asyncio.gather(*(operator(server, index) for index in range(operators)))
+
+    with StubOpenAIServer(**stub_kwargs) as stub:
+        client = create_client(api_key="stub", base_url=stub.base_url, max_connections=max_workers, max_retries=0)
+        if ledger is not None:
+            client = MeteredClient(client, ledger, "load-test")
+        server = HRIServer(client, generate_response_func, max_workers=max_workers, requests_per_second=requests_per_second)
+        start_time = time.perf_counter()
+        sessions = asyncio.run(run_all(server))
+        wall_time = time.perf_counter() - start_time
+        server.shutdown()
+
+    turns = operators * turns_per_operator
+    result = {"operators": operators, "turns": turns, "wall_time": wall_time, "turns_per_second": turns / wall_time,
+              "requests_served": stub.requests_served, "errors_injected": stub.errors_injected,
+              "sessions": {session.session_id: session.latency_summary() for session in sessions}}
+
+    print(f"{operators} operators, {turns} turns in {wall_time:.3f} s ({result['turns_per_second']:.1f} turns/s), "
+          f"{stub.requests_served} requests, {stub.errors_injected} injected errors")
+    print(f"{'session':16s} {'turns':>6s} {'accepted':>9s} {'turn p50 ms':>12s} {'turn p95 ms':>12s} {'robmove p50 ms':>15s}")
+    for session in sessions:
+        stats = session.latency_summary()
+        print(f"{session.session_id:16s} {stats['turn']['count']:6d} {sum(turn['accepted'] for turn in session.history):9d} "
+              f"{1000 * stats['turn']['p50']:12.1f} {1000 * stats['turn']['p95']:12.1f} {1000 * stats['robmove']['p50']:15.1f}")
+    return result
+
+# safety envelope of the robot in millimeters, relative to where the session started
+WORKSPACE_MIN_MM = (-1500.0, -1500.0, -1500.0)
+WORKSPACE_MAX_MM = (1500.0, 1500.0, 1500.0)
+# largest move along any axis accepted in one command
+MAX_STEP_MM = 1000.0
+# moves up to this length count as nudges and are merged when confirmed back to back
+NUDGE_THRESHOLD_MM = 2.0
+
+# one robmove command as numbers
+class MotionDelta:
+    """
+    Compact typed form of a robmove completion 'delta_x, delta_y, delta_z = a, b, c' (millimeters).
+
+    Args:
+    - x, y, z (float): Deltas along the axes in millimeters.
+    """
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    @classmethod
+    def parse(cls, text):
+        """Parses a robmove completion; returns None if it does not follow the output format."""
+        delta = parse_delta_string(text)
+        return None if delta is None else cls(*delta)
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __add__(self, other):
+        return MotionDelta(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __eq__(self, other):
+        return isinstance(other, MotionDelta) and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return f"MotionDelta({self.x}, {self.y}, {self.z})"
+
+    def __str__(self):
+        return format_delta_string(self)
+
+    def length(self):
+        """Euclidean length of the move in millimeters."""
+        return math.sqrt(self.x ** 2 + self.y ** 2 + self.z ** 2)
+
+# confirmed moves waiting for the controller
+class MotionQueue:
+    """
+    Checks moves against the workspace envelope and per-move caps, and hands confirmed moves to the
+    controller with consecutive nudges merged into one move (five confirmed 'a little bit up' become
+    one 5 mm move). Positions are tracked relative to the start of the session.
+
+    Args:
+    - workspace_min, workspace_max (tuple of float): Envelope of reachable positions in millimeters.
+    - max_step (float): Largest accepted move along any axis in millimeters.
+    - nudge_threshold (float): Moves up to this length are merged with neighbouring nudges.
+    - position (tuple of float): Current position in millimeters.
+    """
+    def __init__(self, workspace_min=WORKSPACE_MIN_MM, workspace_max=WORKSPACE_MAX_MM, max_step=MAX_STEP_MM,
+                 nudge_threshold=NUDGE_THRESHOLD_MM, position=(0.0, 0.0, 0.0)):
+        self.workspace_min = np.asarray(workspace_min, dtype=float)
+        self.workspace_max = np.asarray(workspace_max, dtype=float)
+        self.max_step = max_step
+        self.nudge_threshold = nudge_threshold
+        self.position = np.asarray(position, dtype=float)
+        self.pending = []
+        self.stats = {"confirmed": 0, "sent": 0}
+
+    def planned_position(self):
+        """Position after the sent and the pending moves."""
+        return self.position + sum((np.asarray(tuple(delta)) for delta in self.pending), np.zeros(3))
+
+    def check(self, deltas, cumulative=True):
+        """
+        Checks a batch of moves at once.
+
+        Args:
+        - deltas: (N, 3) array-like in millimeters, NaN rows for completions that did not parse
+          (e.g. the output of parse_delta_array).
+        - cumulative (bool): Moves run one after another from the planned position; False checks
+          every move on its own from the planned position (e.g. a column of independent completions).
+
+        Returns:
+        - dict of (N,) bool arrays: "parsed", "within_step", "inside_workspace" and "ok" (all three),
+          plus the (N, 3) "positions" reached.
+        """
+        deltas = np.atleast_2d(np.asarray(deltas, dtype=float))
+        parsed = ~np.isnan(deltas).any(axis=1)
+        steps = np.where(parsed[:, None], deltas, 0.0)
+        positions = self.planned_position() + (np.cumsum(steps, axis=0) if cumulative else steps)
+        within_step = (np.abs(steps) <= self.max_step).all(axis=1)
+        inside_workspace = ((positions >= self.workspace_min) & (positions <= self.workspace_max)).all(axis=1)
+        return {"parsed": parsed, "within_step": within_step, "inside_workspace": inside_workspace,
+                "ok": parsed & within_step & inside_workspace, "positions": positions}
+
+    def violations(self, delta):
+        """Returns the reasons why a single move (MotionDelta or None) is refused; empty if it is safe."""
+        if delta is None:
+            return ["the completion does not follow the delta_x, delta_y, delta_z format"]
+        result = self.check([tuple(delta)])
+        reasons = []
+        if not result["within_step"][0]:
+            reasons.append(f"a move of more than {self.max_step:g} mm along one axis")
+        if not result["inside_workspace"][0]:
+            reasons.append(f"the target {tuple(result['positions'][0].round(3).tolist())} mm is outside the workspace")
+        return reasons
+
+    def push(self, delta, check=True):
+        """
+        Queues a confirmed move; raises ValueError if it is not safe, or with check=False only if it is
+        None (the envelope check was switched off but there is still nothing to send).
+        """
+        reasons = self.violations(delta) if check or delta is None else []
+        if reasons:
+            raise ValueError("; ".join(reasons))
+        self.pending.append(delta)
+        self.stats["confirmed"] += 1
+
+    def drain(self):
+        """
+        Returns the pending moves for the controller, consecutive nudges merged, and marks them as sent.
+        Moves of zero length are dropped.
+
+        Returns:
+        - list of MotionDelta.
+        """
+        if not self.pending:
+            return []
+        deltas = np.array([tuple(delta) for delta in self.pending], dtype=float)
+        nudge = np.linalg.norm(deltas, axis=1) <= self.nudge_threshold
+        # a new group starts at every move that is not a nudge following a nudge
+        starts = np.ones(len(deltas), dtype=bool)
+        starts[1:] = ~(nudge[1:] & nudge[:-1])
+        groups = np.cumsum(starts) - 1
+        merged = np.zeros((groups[-1] + 1, 3))
+        np.add.at(merged, groups, deltas)
+        self.position = self.position + deltas.sum(axis=0)
+        self.pending = []
+        moves = [MotionDelta(*row) for row in merged if np.any(row != 0)]
+        self.stats["sent"] += len(moves)
+        return moves
+
+# terms of a command for the example index: words, numbers as '#', and word pairs
+def example_terms(text):
+    """Returns the term counts of text; numbers all map to '#' so that distances do not split phrasings."""
+    words = ["#" if word[0].isdigit() else word for word in re.findall(r"[a-z]+|\d+(?:\.\d+)?", str(text).lower())]
+    return collections.Counter(words + [first + " " + second for first, second in zip(words, words[1:])])
+
+# local store of few-shot examples with a TF-IDF similarity index
+class ExampleIndex:
+    """
+    Few-shot example store that picks the examples most similar to a prompt (TF-IDF cosine similarity,
+    computed with NumPy). Examples are added incrementally: only the new example is tokenized, the term
+    statistics are updated in place, and the term count matrix grows by the rows and columns of the new
+    examples; only the IDF weighting is reapplied to it. The store is persisted as JSON and reloaded on creation.
+
+    Args:
+    - path (str): JSON file of the index; None keeps it in memory only.
+    - examples (iterable of tuple): (user, assistant) pairs to add, e.g. ROBMOVE_EXAMPLES.
+    """
+    def __init__(self, path=None, examples=()):
+        self.path = path
+        self.examples = []
+        self.term_counts = []
+        self.document_frequency = collections.Counter()
+        self.keys = set()
+        self.vocabulary = {}
+        self.counts = None
+        self.vectors = None
+        if path is not None and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                stored = json.load(file)
+            for (user_content, assistant_content), terms in zip(stored["examples"], stored["term_counts"]):
+                self.insert(user_content, assistant_content, collections.Counter(terms))
+        for user_content, assistant_content in examples:
+            self.add(user_content, assistant_content)
+
+    def __len__(self):
+        return len(self.examples)
+
+    def insert(self, user_content, assistant_content, terms):
+        """Adds an example with its precomputed term counts."""
+        self.examples.append((user_content, assistant_content))
+        self.term_counts.append(terms)
+        self.document_frequency.update(terms.keys())
+        self.keys.add(normalize_prompt(user_content))
+        self.vectors = None
+
+    def add(self, user_content, assistant_content):
+        """Adds an example unless one with the same (normalized) user message exists; returns True if added."""
+        if normalize_prompt(user_content) in self.keys:
+            return False
+        self.insert(user_content, assistant_content, example_terms(user_content))
+        return True
+
+    def save(self):
+        """Writes the index to its path."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # write to a temporary file first so an interrupted save keeps the old index
+        with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump({"examples": self.examples, "term_counts": self.term_counts}, file)
+        os.replace(self.path + ".tmp", self.path)
+
+    def build_vectors(self):
+        """
+        Recomputes the L2-normalized TF-IDF matrix after examples were added. Only the examples added since
+        the last call are tokenized into new rows (and their new terms into new columns) of the count matrix.
+        """
+        counted = 0 if self.counts is None else self.counts.shape[0]
+        for term in self.document_frequency:
+            if term not in self.vocabulary:
+                self.vocabulary[term] = len(self.vocabulary)
+        new_counts = np.zeros((len(self.examples) - counted, len(self.vocabulary)))
+        for row, terms in enumerate(self.term_counts[counted:]):
+            for term, count in terms.items():
+                new_counts[row, self.vocabulary[term]] = count
+        if self.counts is None:
+            self.counts = new_counts
+        else:
+            old_counts = np.pad(self.counts, ((0, 0), (0, len(self.vocabulary) - self.counts.shape[1])))
+            self.counts = np.vstack([old_counts, new_counts])
+        frequency = np.array([self.document_frequency[term] for term in self.vocabulary], dtype=float)
+        self.idf = np.log((1 + len(self.examples)) / (1 + frequency)) + 1
+        vectors = self.counts * self.idf
+        self.vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def similarities(self, text):
+        """Returns the cosine similarity of text to every example."""
+        if self.vectors is None:
+            self.build_vectors()
+        query = np.zeros(len(self.vocabulary))
+        for term, count in example_terms(text).items():
+            if term in self.vocabulary:
+                query[self.vocabulary[term]] = count
+        query *= self.idf
+        return self.vectors @ (query / max(np.linalg.norm(query), 1e-12))
+
+    def select(self, text, k=4, exclude_same=False):
+        """
+        Returns the k examples most similar to text, most similar last so it sits next to the question.
+
+        Args:
+        - text (str): The user message to find examples for.
+        - k (int): Number of examples.
+        - exclude_same (bool): Skip an example whose user message equals text (leave-one-out evaluation
+          on prompts that were also used to seed the index).
+        """
+        if not self.examples:
+            return ()
+        scores = self.similarities(text)
+        if exclude_same:
+            key = normalize_prompt(text)
+            scores = np.where([normalize_prompt(user_content) == key for user_content, _ in self.examples], -np.inf, scores)
+        order = np.argsort(-scores, kind="stable")[:k]
+        order = [row for row in order if np.isfinite(scores[row])]
+        return tuple(self.examples[row] for row in reversed(order))
+
+# add the labeled rows of a prompt table to an example index
+def seed_example_index(index, file_path, prompt_column='Prompt Contents', completion_column='Prompt Execution',
+                       prompt_exe_column=None):
+    """
+    Adds every row of a workbook (or csv/parquet) whose completion column is filled as an example.
+    Use completion_column='Prompt Execution' for the labeled robmove ground truth, or a _Completion
+    workbook of an earlier run; set prompt_exe_column for ask4conf examples.
+
+    Returns:
+    - int: Number of examples added.
+    """
+    df = load_prompt_table(file_path)
+    if completion_column not in df.columns:
+        return 0
+    added = 0
+    for position in range(len(df)):
+        completion = df[completion_column].iloc[position]
+        if not isinstance(completion, str) or not completion.strip():
+            continue
+        user_content = str(df[prompt_column].iloc[position])
+        if prompt_exe_column is not None:
+            user_content = "prompt: " + user_content + "; prompt_exe: " + str(df[prompt_exe_column].iloc[position])
+        added += index.add(user_content, completion)
+    return added
+
+# robmove with few-shot examples picked per prompt
+def retrieval_response_robmove(index, k=4, system_prompt=ROBMOVE_SYSTEM_PROMPT, exclude_same=False):
+    """
+    Returns a generate_response_robmove variant whose prefix holds the k examples of index
+    most similar to each prompt instead of the fixed ROBMOVE_EXAMPLES.
+    """
+    def generate_response(prompt, client):
+        return generate_response_robmove(prompt, client, build_prefix(system_prompt, index.select(prompt, k, exclude_same)))
+    return generate_response
+
+# ask4conf with few-shot examples picked per prompt
+def retrieval_response_ask4conf(index, k=2, system_prompt=ASK4CONF_SYSTEM_PROMPT, exclude_same=False):
+    """Same as retrieval_response_robmove for generate_response_ask4conf."""
+    def generate_response(prompt, prompt_exe, client):
+        examples = index.select("prompt: " + prompt + "; prompt_exe: " + prompt_exe, k, exclude_same)
+        return generate_response_ask4conf(prompt, prompt_exe, client, build_prefix(system_prompt, examples))
+    return generate_response
+
+# compare the fixed few-shot list with retrieved examples
+def benchmark_example_selection(prompt_list, expected_list, client, index, k_values=(2, 4, 6), max_workers=8):
+    """
+    Runs robmove with the fixed ROBMOVE_EXAMPLES and with k retrieved examples for every k, and prints
+    accuracy, prompt tokens per request (API usage and counted locally) and wall time. Examples equal
+    to the evaluated prompt are left out, so seeding the index with the same workbook does not leak answers.
+
+    Args:
+    - prompt_list (list of str): List of prompts to process.
+    - expected_list (list of str): Ground-truth 'delta_x, delta_y, delta_z = ...' strings.
+    - client: The OpenAI API client (or one pointed at a StubOpenAIServer).
+    - index (ExampleIndex): The seeded example index.
+    - k_values (tuple of int): Numbers of retrieved examples to try.
+    - max_workers (int): Concurrent requests per variant.
+
+    Returns:
+    - list of dict: One row per variant.
+    """
+    variants = {"fixed examples": (generate_response_robmove, lambda prompt: ROBMOVE_PREFIX)}
+    for k in k_values:
+        variants[f"{k} retrieved"] = (retrieval_response_robmove(index, k, exclude_same=True),
+                                      lambda prompt, k=k: build_prefix(ROBMOVE_SYSTEM_PROMPT, index.select(prompt, k, True)))
+    rows = []
+    for name, (func, prefix_of) in variants.items():
+        start_time = time.perf_counter()
+        completions, token_usage = process_prompts_concurrent(prompt_list, client, func, max_workers=max_workers)
+        seconds = time.perf_counter() - start_time
+        counted = sum(sum(tokens for _, tokens in profile_prompt_tokens(build_messages_robmove(prompt, prefix_of(prompt)), verbose=False))
+                      for prompt in prompt_list)
+        rows.append({"variant": name, "accuracy": delta_accuracy(completions, expected_list), "seconds": seconds,
+                     "prompt_tokens_per_request": token_usage["prompt_tokens"] / max(len(prompt_list), 1),
+                     "counted_tokens_per_request": counted / max(len(prompt_list), 1)})
+    for row in rows:
+        print(f"{row['accuracy']:6.1%} {row['prompt_tokens_per_request']:8.1f} prompt tokens/request "
+              f"({row['counted_tokens_per_request']:.1f} counted) {row['seconds']:7.3f} s  {row['variant']}")
+    return rows
+
+# model tiers of the router, cheapest first; the fast tier is the model used everywhere else, so
+# turning the router on only changes the model of the complex commands
+ROUTER_TIERS = {"fast": "gpt-3.5-turbo", "strong": "gpt-4o"}
+
+# how hard a command is to interpret
+def command_complexity(prompt):
+    """
+    Scores a movement command by the features that make the robmove prompt go wrong:
+    - clauses: number of comma/and/then separated parts; each extra clause adds 1,
+    - unitless: distances without a unit (rule 2 applies, but the operator may have meant otherwise); 1 each,
+    - mismatch: 1 if the number of directions differs from the number of distances,
+    - not_parsed: 2 if parse_command_local is not confident.
+
+    Returns:
+    - dict: The features and their sum "score".
+    """
+    text = str(prompt).lower().replace("-", " ")
+    clauses = len([clause for clause in re.split(r"[,;]|\band\b|\bthen\b", text) if clause.strip()])
+    distances = DISTANCE_PATTERN.findall(text)
+    quantities = len(distances) + len(VAGUE_PATTERN.findall(text))
+    # "lower down" names one direction twice; count distinct directions like parse_command_local
+    directions = set()
+    for pattern, direction in DIRECTION_PATTERNS:
+        for match in pattern.finditer(text):
+            directions.add(direction if direction is not None else (match.group(2), match.group(1)))
+    features = {
+        "clauses": max(clauses - 1, 0),
+        "unitless": sum(1 for _, unit in distances if not unit),
+        "mismatch": int(len(directions) != quantities),
+        "not_parsed": 2 * (parse_command_local(prompt) is None),
+    }
+    features["score"] = sum(features.values())
+    return features
+
+# route robmove requests to a fast or a strong model by command complexity
+class ModelRouter:
+    """
+    Drop-in generate_response_robmove(prompt, client) that sends commands scoring below threshold
+    (see command_complexity) to the first tier and the rest to the last one. An answer that does
+    not parse as 'delta_x, delta_y, delta_z = ...' is escalated to the next tier. Commands the local
+    parser is confident about can be answered locally without any request.
+
+    Every decision is kept in decisions (and written to log_path as JSONL when given); the latency of
+    each tier is recorded as the tracer stage "route_<tier>".
+
+    Args:
+    - tiers (dict): Tier name -> model, cheapest first.
+    - threshold (int): Lowest complexity score sent to the strongest tier.
+    - clients (dict): Optional tier name -> client for tiers served by another backend.
+    - use_local_parser (bool): Answer confidently parsed commands locally (tier "local").
+    - log_path (str): Optional JSONL file of the routing decisions.
+    """
+    def __init__(self, tiers=None, threshold=2, clients=None, use_local_parser=False, log_path=None):
+        self.tiers = dict(tiers or ROUTER_TIERS)
+        self.threshold = threshold
+        self.clients = clients or {}
+        self.use_local_parser = use_local_parser
+        self.log = JSONLExporter(log_path) if log_path is not None else None
+        self.decisions = []
+        self.lock = threading.Lock()
+
+    def choose_tier(self, complexity):
+        """Returns the tier name for a command_complexity result."""
+        names = list(self.tiers)
+        return names[-1] if complexity["score"] >= self.threshold else names[0]
+
+    def generate_response(self, prompt, client):
+        """Same interface as generate_response_robmove."""
+        complexity = command_complexity(prompt)
+        decision = {"prompt": prompt, **complexity, "escalated": False}
+        if self.use_local_parser and not complexity["not_parsed"]:
+            start_time = time.perf_counter()
+            with TRACER.span("route_local"):
+                content = parse_command_local(prompt)
+            decision.update(tier="local", final_tier="local", latency={"local": time.perf_counter() - start_time})
+            self.record(decision)
+            return content, SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+
+        names = list(self.tiers)
+        tier = self.choose_tier(complexity)
+        decision["tier"] = tier
+        decision["latency"] = {}
+        usages = []
+        while True:
+            start_time = time.perf_counter()
+            with TRACER.span(f"route_{tier}", model=self.tiers[tier]):
+                content, usage = generate_response_robmove(prompt, self.clients.get(tier, client), model=self.tiers[tier])
+            decision["latency"][tier] = time.perf_counter() - start_time
+            usages.append(usage)
+            if parse_delta_string(content) is not None or tier == names[-1]:
+                break
+            # unparsable answer: try the next stronger tier
+            tier = names[names.index(tier) + 1]
+            decision["escalated"] = True
+        decision["final_tier"] = tier
+        self.record(decision)
+        return content, add_usage(*usages)
+
+    def record(self, decision):
+        """Keeps a routing decision and logs it."""
+        with self.lock:
+            self.decisions.append(decision)
+        if self.log is not None:
+            self.log(decision)
+
+    def summary(self):
+        """Returns {tier: {count, escalated, mean latency}} over the decisions so far."""
+        with self.lock:
+            decisions = list(self.decisions)
+        tiers = {}
+        for decision in decisions:
+            stats = tiers.setdefault(decision["tier"], {"count": 0, "escalated": 0, "latencies": []})
+            stats["count"] += 1
+            stats["escalated"] += decision["escalated"]
+            stats["latencies"].extend(decision["latency"].values())
+        return {tier: {"count": stats["count"], "escalated": stats["escalated"],
+                       "mean_latency": sum(stats["latencies"]) / max(len(stats["latencies"]), 1)}
+                for tier, stats in tiers.items()}
+
+    def print_summary(self):
+        """Prints how many commands each tier received, escalations and mean latency."""
+        for tier, stats in self.summary().items():
+            print(f"{tier:10s} {stats['count']:6d} commands {stats['escalated']:4d} escalated "
+                  f"{1000 * stats['mean_latency']:9.1f} ms mean latency")
+
+# instruction heading a packed robmove request; the numbered commands follow one per line
+PACKED_INSTRUCTION = ("Interpret each numbered command below on its own, following the rules above. "
+                      "Answer with exactly one line per command, in the same order, in the form "
+                      "'N) delta_x, delta_y, delta_z = a, b, c' where N is the number of the command, and nothing else.")
+
+# one numbered line of a packed request or reply
+PACKED_LINE_PATTERN = re.compile(r"^\s*(\d+)\s*[).:]\s*(.+?)\s*$", re.M)
+
+# build one robmove request for many commands
+def build_messages_robmove_packed(prompt_list, prefix=ROBMOVE_PREFIX):
+    """
+    Builds a robmove request carrying several commands, numbered from 1, so the few-shot prefix
+    is sent once for all of them.
+
+    Args:
+    - prompt_list (list of str): The commands.
+    - prefix (tuple of dict): Static system and few-shot messages.
+
+    Returns:
+    - list of dict: The chat messages.
+    """
+    # line breaks inside a command would break the numbering
+    commands = "\n".join(f"{number}) {' '.join(str(prompt).split())}" for number, prompt in enumerate(prompt_list, 1))
+    return [*prefix, {"role": "user", "content": PACKED_INSTRUCTION + "\n" + commands}]
+
+# robmove for many commands in one request
+@traced("robmove_packed_llm")
+def generate_response_robmove_packed(prompt_list, client, prefix=ROBMOVE_PREFIX, model="gpt-3.5-turbo"):
+    """
+    Sends build_messages_robmove_packed(prompt_list) and splits the numbered reply.
+
+    Returns:
+    - list: 'delta_x, delta_y, delta_z = a, b, c' per command, None where the reply has no parsable line.
+    - usage: Token usage of the request.
+    """
+    response = client.chat.completions.create(
+        model=model,
+        temperature=0,
+        messages=build_messages_robmove_packed(prompt_list, prefix)
+    )
+    completions = [None] * len(prompt_list)
+    for number, answer in PACKED_LINE_PATTERN.findall(response.choices[0].message.content or ""):
+        index = int(number) - 1
+        match = re.search(DELTA_PATTERN, answer)
+        if 0 <= index < len(prompt_list) and completions[index] is None and match is not None:
+            completions[index] = match.group(0)
+    return completions, response.usage
+
+# packed version of process_prompts for generate_response_robmove
+def process_prompts_packed(prompt_list, client, pack_size=10, max_pack_size=40, max_workers=4,
+                           requests_per_second=5.0, max_retries=5, prefix=ROBMOVE_PREFIX):
+    """
+    Processes prompts pack_size at a time with generate_response_robmove_packed. Packs are sent in
+    waves of max_workers; after a wave the pack size is halved if more than 5% of its commands came
+    back unparsable and doubled (up to max_pack_size) if none did. Commands that never got a parsable
+    answer are re-run one by one with generate_response_robmove.
+
+    Args:
+    - prompt_list (list of str): List of prompts to process.
+    - client: The OpenAI API client.
+    - pack_size (int): Commands per request of the first wave.
+    - max_pack_size (int): Upper bound of the adaptive pack size.
+    - max_workers (int): Packs in flight.
+    - requests_per_second (float): Token bucket refill rate.
+    - max_retries (int): Retries per request on 429/5xx errors.
+    - prefix (tuple of dict): Static system and few-shot messages.
+
+    Returns:
+    - list: A list of completions in the order of prompt_list.
+    - dict: Token usage statistics.
+    - dict: "requests", "pack_sizes" (per wave) and "reruns".
+    """
+    completions = [None] * len(prompt_list)
+    total_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    stats = {"requests": 0, "pack_sizes": [], "reruns": 0}
+    rate_limiter = TokenBucket(requests_per_second, capacity=max_workers)
+    pending = list(range(len(prompt_list)))
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending:
+            wave, pending = pending[:pack_size * max_workers], pending[pack_size * max_workers:]
+            packs = [wave[start:start + pack_size] for start in range(0, len(wave), pack_size)]
+            results = executor.map(
+                lambda pack: call_with_retry(generate_response_robmove_packed, ([prompt_list[index] for index in pack], client, prefix),
+                                             rate_limiter, max_retries),
+                packs)
+            wave_failures = 0
+            for pack, (answers, usage) in zip(packs, results):
+                for key in total_usage:
+                    total_usage[key] += getattr(usage, key)
+                for index, answer in zip(pack, answers):
+                    if answer is None:
+                        failed.append(index)
+                        wave_failures += 1
+                    else:
+                        completions[index] = answer
+            stats["requests"] += len(packs)
+            stats["pack_sizes"].append(pack_size)
+            if wave_failures > 0.05 * len(wave):
+                pack_size = max(1, pack_size // 2)
+            elif wave_failures == 0:
+                pack_size = min(max_pack_size, pack_size * 2)
+
+    # rows the packed replies missed go through the row-by-row path
+    if failed:
+        reruns, usage = process_prompts_concurrent([prompt_list[index] for index in failed], client, generate_response_robmove,
+                                                   max_workers=max_workers, requests_per_second=requests_per_second, max_retries=max_retries)
+        for index, completion in zip(failed, reruns):
+            completions[index] = completion
+        for key in total_usage:
+            total_usage[key] += usage[key]
+        stats["requests"] += len(failed)
+        stats["reruns"] = len(failed)
+    return completions, total_usage, stats
+
+# tokens and wall time of packed requests against one request per row
+def compare_packed_requests(prompt_list, client, pack_size=10, max_workers=4):
+    """
+    Runs the prompts row by row (process_prompts_concurrent) and packed (process_prompts_packed),
+    and prints tokens, requests and wall time of both and how often their deltas agree.
+
+    Returns:
+    - dict: "row" and "packed" results with completions, token_usage, seconds and requests.
+    """
+    results = {}
+    start_time = time.perf_counter()
+    completions, token_usage = process_prompts_concurrent(prompt_list, client, generate_response_robmove, max_workers=max_workers)
+    results["row"] = {"completions": completions, "token_usage": token_usage, "requests": len(prompt_list),
+                      "seconds": time.perf_counter() - start_time}
+    start_time = time.perf_counter()
+    completions, token_usage, stats = process_prompts_packed(prompt_list, client, pack_size, max_workers=max_workers)
+    results["packed"] = {"completions": completions, "token_usage": token_usage, "requests": stats["requests"],
+                         "seconds": time.perf_counter() - start_time, **stats}
+
+    for name, result in results.items():
+        print(f"{name:7s} {result['token_usage']['total_tokens']:8d} tokens {result['requests']:5d} requests "
+              f"{result['seconds']:8.3f} s")
+    row, packed = results["row"], results["packed"]
+    print(f"Packed saves {1 - packed['token_usage']['total_tokens'] / max(row['token_usage']['total_tokens'], 1):.1%} of the tokens "
+          f"and {1 - packed['seconds'] / row['seconds']:.1%} of the wall time; pack sizes {packed['pack_sizes']}, "
+          f"{packed['reruns']} rows re-run; deltas agree on {delta_accuracy(packed['completions'], row['completions']):.1%} of the rows")
+    return results
+
+# play audio from memory on a background thread that can be stopped at any time
+class BackgroundPlayer:
+    """
+    Plays 24 kHz 16-bit mono PCM on a background thread in short slices, checking a stop flag between
+    slices, so stop() silences the speaker within about chunk_ms (the output is aborted, not drained).
+    The audio is bytes or an iterable of byte chunks such as synthesize_speech_chunks(...), which is
+    closed on stop so the rest is not downloaded. Without sounddevice, PCMOutput plays the whole audio
+    through playsound when it ends, which stop() cannot interrupt.
+
+    Args:
+    - audio (bytes or iterable of bytes): The PCM audio.
+    - output: Audio sink with write/close/abort methods; defaults to PCMOutput().
+    - chunk_ms (int): Length of one slice in milliseconds.
+    """
+    def __init__(self, audio, output=None, chunk_ms=50):
+        self.audio = audio
+        self.output = output if output is not None else PCMOutput()
+        self.chunk_size = 2 * PCM_SAMPLE_RATE * chunk_ms // 1000
+        self.stop_event = threading.Event()
+        self.done = threading.Event()
+        self.bytes_played = 0
+        self.interrupted = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        """Starts playback and returns immediately."""
+        self.thread.start()
+        return self
+
+    def run(self):
+        chunks = [self.audio] if isinstance(self.audio, (bytes, bytearray)) else self.audio
+        try:
+            for chunk in chunks:
+                for start in range(0, len(chunk), self.chunk_size):
+                    if self.stop_event.is_set():
+                        self.interrupted = True
+                        return
+                    self.output.write(chunk[start:start + self.chunk_size])
+                    self.bytes_played += len(chunk[start:start + self.chunk_size])
+        finally:
+            if self.interrupted:
+                self.output.abort()
+            else:
+                self.output.close()
+            if hasattr(chunks, "close"):
+                chunks.close()
+            self.done.set()
+
+    def stop(self, timeout=1.0):
+        """Interrupts playback and waits (up to timeout seconds) until the output is released."""
+        self.stop_event.set()
+        self.done.wait(timeout)
+
+    def wait(self, timeout=None):
+        """Waits until playback ends; returns False on timeout."""
+        return self.done.wait(timeout)
+
+    @property
+    def seconds_played(self):
+        return self.bytes_played / (2 * PCM_SAMPLE_RATE)
+
+# words of a spoken confirmation; any "no" word wins over a "yes" word
+DECISION_WORDS = {
+    True: {"yes", "yeah", "yep", "ok", "okay", "go", "confirm", "confirmed", "correct", "sure", "y"},
+    False: {"no", "nope", "stop", "cancel", "wrong", "wait", "n"},
+}
+
+# map an answer of the operator onto accept / reject
+def classify_decision(text):
+    """Returns True for a yes, False for a no or stop, None if text holds neither."""
+    words = set(re.findall(r"[a-z]+", str(text).lower()))
+    if words & DECISION_WORDS[False]:
+        return False
+    if words & DECISION_WORDS[True]:
+        return True
+    return None
+
+# decision source reading Y/N from the console
+class KeyboardDecision:
+    """
+    Decision source for confirm2action_bargein reading the console through CONSOLE, so when another
+    source decides first, the line being read goes to the next console prompt instead of being lost.
+
+    Args:
+    - question (str): Printed when the source starts listening.
+    """
+    def __init__(self, question="Does the proposed movement align with expectations?? Y/N "):
+        self.question = question
+
+    def __call__(self, stop_event):
+        line = CONSOLE.readline(self.question, stop_event)
+        if line is None:
+            return None
+        # anything but Y counts as a no, like confirm2action
+        return line.strip() in ("y", "Y")
+
+# decision source listening for a spoken yes / no / stop
+def speech_decision(recognizer):
+    """
+    Returns a decision source for confirm2action_bargein that listens with a SpeechRecognizer until it hears yes or no.
+    It listens through recognizer.clone(), so a listener still stopping after the decision does not share
+    VAD state or timings with the next command listen on the same recognizer, and it gives up within one
+    audio frame of the decision.
+    """
+    recognizer = recognizer.clone()
+    def listen(stop_event):
+        while not stop_event.is_set():
+            decision = classify_decision(recognizer.listen(stop_event=stop_event))
+            if decision is not None:
+                return decision
+        return None
+    return listen
+
+# run decision sources side by side and return the first decision
+def wait_for_decision(sources, timeout=None):
+    """
+    Runs every source (callable taking a threading.Event, returning True, False or None) on its own
+    thread and returns the first True/False. The event tells the other sources to give up.
+
+    Returns:
+    - bool or None: The decision; None if every source gave up or the timeout passed.
+    - int: Index of the deciding source, or None.
+    """
+    stop_event = threading.Event()
+    results = queue.Queue()
+    def run(index, source):
+        try:
+            results.put((index, source(stop_event)))
+        except Exception as error:
+            print(f"Decision source {index} failed: {error}")
+            results.put((index, None))
+    for index, source in enumerate(sources):
+        threading.Thread(target=run, args=(index, source), daemon=True).start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        for _ in sources:
+            try:
+                index, decision = results.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if decision is not None:
+                return decision, index
+        return None, None
+    finally:
+        stop_event.set()
+
+# confirmation step that listens while the question is still being spoken
+def confirm2action_bargein(audio, client, clip_cache=None, sources=None, on_accept=None, output_factory=None):
+    """
+    Non-blocking version of confirm2action. The question is played in the background while the decision
+    sources listen; the first decision stops the question at once, starts the motion through on_accept
+    and only then plays the spoken answer. The time from the decision to the motion start is recorded
+    as the tracer stage "decision_to_motion", with the source and whether the operator barged in.
+    Needs sounddevice for the default output: the playsound fallback of PCMOutput plays the question
+    in one piece that cannot be interrupted and would overlap the answer, so RuntimeError is raised
+    without it; use confirm2action there.
+
+    Args:
+    - audio (bytes or iterable of bytes): The spoken question as PCM, e.g. synthesize_speech_chunks(text, client).
+    - client: The OpenAI API client.
+    - clip_cache (AudioClipCache): Optional source of the fixed answer phrases.
+    - sources (list of callable): Decision sources, see wait_for_decision; defaults to [KeyboardDecision()].
+    - on_accept (callable): Starts the motion, e.g. handing the move to the controller.
+    - output_factory (callable): Returns a new audio sink per clip; defaults to PCMOutput.
+
+    Returns:
+    - int: 1 if the move was accepted, 0 otherwise, like confirm2action.
+    """
+    if output_factory is None and importlib.util.find_spec("sounddevice") is None:
+        raise RuntimeError("barge-in needs sounddevice to interrupt the question; use confirm2action instead")
+    output_factory = output_factory or PCMOutput
+    sources = sources if sources is not None else [KeyboardDecision()]
+    question = BackgroundPlayer(audio, output_factory()).start()
+    with TRACER.span("confirmation_wait") as span:
+        decision, index = wait_for_decision(sources)
+        span["source"] = index
+    decision_time = time.perf_counter()
+    barge_in = not question.done.is_set()
+    question.stop()
+
+    # start the motion before fetching the answer audio, which may need a TTS round trip
+    if decision:
+        if on_accept is not None:
+            on_accept()
+        motion_delay = time.perf_counter() - decision_time
+        TRACER.record({"name": "decision_to_motion", "start": time.time() - motion_delay, "duration": motion_delay,
+                       "source": index, "barge_in": barge_in, "question_seconds_played": question.seconds_played})
+        print("Trajectory confirmed. The robot is now in motion...")
+    else:
+        print("Incorrect trajectory. Kindly input the correct parameters and attempt again.")
+    text = CONFIRM_TEXT_ACCEPTED if decision else CONFIRM_TEXT_REJECTED
+    answer_audio = clip_cache.get_clip(text, client) if clip_cache is not None else synthesize_speech_chunks(text, client)
+    # the answer is spoken while the robot moves; wait so it does not overlap the next question
+    BackgroundPlayer(answer_audio, output_factory()).start().wait()
+    return 1 if decision else 0
+
+# vocabulary of the synthetic corpus, following rule 5 of the robmove system prompt: (axis, sign) -> phrases
+CORPUS_DIRECTIONS = {
+    (0, 1.0): ["right", "rightward", "to the right", "along the positive x-axis", "in x direction", "along x direction"],
+    (0, -1.0): ["left", "leftward", "to the left", "along the negative x-axis", "in negative x direction"],
+    (1, 1.0): ["back", "backwards", "away", "away from me", "along the positive y-axis", "in y direction"],
+    (1, -1.0): ["forward", "forwards", "closer", "towards me", "along the negative y-axis"],
+    (2, 1.0): ["up", "upward", "upwards", "along the positive z-axis", "in z direction"],
+    (2, -1.0): ["down", "downward", "downwards", "along the negative z-axis"],
+}
+# verbs that carry the direction themselves
+CORPUS_DIRECTION_VERBS = {(2, 1.0): ["raise", "lift", "ascend", "lift the arm", "raise the arm"],
+                          (2, -1.0): ["lower", "descend", "lower the arm"]}
+CORPUS_VERBS = ["move", "shift", "slide", "go", "displace", "adjust the position", "nudge", "bring the arm"]
+# unit words and factor to millimeters (rule 1), value range and decimals of the drawn distances
+CORPUS_UNITS = [
+    (["mm", "millimeters", "millimeter"], 1.0, (1, 200), 0),
+    (["cm", "centimeters"], 10.0, (1, 100), 0),
+    (["m", "meters", "meter"], 1000.0, (0.1, 1.5), 1),
+    (["inches", "inch"], 25.4, (1, 24), 0),
+    (["ft", "feet"], 304.8, (2, 3), 0),
+    ([""], 1.0, (1, 200), 0),  # rule 2: no unit means millimeters
+]
+CORPUS_VAGUE = ["a little", "a bit", "slightly", "a little bit", "a lil bit", "a tiny bit"]
+CORPUS_JOINERS = [" and ", ", ", ", then ", " and then "]
+CORPUS_PREFIXES = ["", "", "", "please ", "can you ", "robot, ", "now "]
+CORPUS_SUFFIXES = ["", "", "", " please", ".", " now"]
+
+# labeled synthetic movement commands
+def generate_command_corpus(count, seed=0, batch_size=100000, max_clauses=3, vague_rate=0.1):
+    """
+    Yields DataFrames of random movement commands built from the grammar of the robmove system prompt
+    (directions, direction verbs, units, missing units, vague quantities, several clauses on distinct
+    axes, polite prefixes and suffixes) with their ground truth, batch by batch so memory stays flat.
+
+    Args:
+    - count (int): Number of commands.
+    - seed (int): Seed of the random choices; the same seed gives the same corpus.
+    - batch_size (int): Rows per yielded DataFrame.
+    - max_clauses (int): Most clauses per command (1 to 3).
+    - vague_rate (float): Share of clauses with a vague quantity (rule 3: 1 mm).
+
+    Yields:
+    - DataFrame: 'Prompt ID', 'Prompt Contents', 'Prompt Execution' and float columns 'delta_x', 'delta_y', 'delta_z'.
+    """
+    rng = np.random.default_rng(seed)
+    for first in range(0, count, batch_size):
+        size = min(batch_size, count - first)
+        # draw everything at once with NumPy; Python lists make the per-row lookups below cheap
+        clause_counts = rng.integers(1, max_clauses + 1, size).tolist()
+        # distinct axes per command: the first clause_counts entries of a random permutation
+        axes = np.argsort(rng.random((size, 3)), axis=1).tolist()
+        signs = rng.choice([-1.0, 1.0], (size, 3)).tolist()
+        units = rng.integers(0, len(CORPUS_UNITS), (size, 3)).tolist()
+        vague = (rng.random((size, 3)) < vague_rate).tolist()
+        fractions = rng.random((size, 3)).tolist()
+        picks = rng.integers(0, 1 << 30, (size, 8)).tolist()
+        prompts = []
+        deltas = []
+        for row in range(size):
+            clauses = []
+            delta = [0.0, 0.0, 0.0]
+            for clause in range(clause_counts[row]):
+                axis, sign, pick = axes[row][clause], signs[row][clause], picks[row][clause]
+                bare = False
+                if vague[row][clause]:
+                    distance, millimeters = CORPUS_VAGUE[pick % len(CORPUS_VAGUE)], 1.0
+                else:
+                    words, factor, (low, high), decimals = CORPUS_UNITS[units[row][clause]]
+                    value = round(low + fractions[row][clause] * (high - low), decimals)
+                    value = int(value) if decimals == 0 else value
+                    word = words[pick % len(words)]
+                    bare = not word
+                    distance, millimeters = f"{value} {word}".strip() if pick % 3 else f"{value}{word}", value * factor
+                delta[axis] = sign * millimeters
+                verbs = CORPUS_DIRECTION_VERBS.get((axis, sign))
+                if verbs and pick % 4 == 0:
+                    verb = verbs[pick // 4 % len(verbs)]
+                    text = f"{verb} {distance}" if vague[row][clause] else f"{verb} {['', 'by ', 'for '][pick // 7 % 3]}{distance}"
+                else:
+                    verb = CORPUS_VERBS[pick // 5 % len(CORPUS_VERBS)] if clause == 0 or pick % 2 else ""
+                    direction = CORPUS_DIRECTIONS[(axis, sign)][pick // 11 % len(CORPUS_DIRECTIONS[(axis, sign)])]
+                    if vague[row][clause] or pick % 3 == 0:
+                        # a bare number always comes after the direction: '12 in y direction' would read as inches
+                        text = f"{verb} {direction} {distance}" if pick % 2 or bare else f"{verb} {distance} {direction}"
+                    else:
+                        text = f"{verb} {direction} {['for ', 'by '][pick // 13 % 2]}{distance}"
+                clauses.append(" ".join(text.split()))
+            text = CORPUS_JOINERS[picks[row][3] % len(CORPUS_JOINERS)].join(clauses)
+            text = CORPUS_PREFIXES[picks[row][4] % len(CORPUS_PREFIXES)] + text + CORPUS_SUFFIXES[picks[row][5] % len(CORPUS_SUFFIXES)]
+            prompts.append(text[:1].upper() + text[1:] if picks[row][6] % 2 else text)
+            deltas.append(delta)
+        # round away float noise such as 0.3 * 1000 and turn -0.0 into 0.0
+        deltas = np.round(np.array(deltas), 6) + 0.0
+        yield pd.DataFrame({
+            "Prompt ID": np.arange(first + 1, first + size + 1),
+            "Prompt Contents": prompts,
+            "Prompt Execution": [format_delta_string(delta) for delta in deltas.tolist()],
+            "delta_x": deltas[:, 0], "delta_y": deltas[:, 1], "delta_z": deltas[:, 2],
+        })
+
+# write a synthetic corpus to a columnar file
+def write_command_corpus(path, count, seed=0, batch_size=100000):
+    """
+    Streams generate_command_corpus to a Parquet file (one row group per batch, needs pyarrow)
+    or, for a .csv path, to a CSV file, without holding the corpus in memory.
+
+    Returns:
+    - str: The path.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    writer = None
+    try:
+        for batch in generate_command_corpus(count, seed, batch_size):
+            if path.endswith(".csv"):
+                batch.to_csv(path, mode="w" if writer is None else "a", header=writer is None, index=False)
+                writer = True
+                continue
+            import pyarrow
+            import pyarrow.parquet
+            table = pyarrow.Table.from_pandas(batch, preserve_index=False)
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(path, table.schema, compression="zstd")
+            writer.write_table(table)
+    finally:
+        if writer is not None and writer is not True:
+            writer.close()
+    return path
+
+# read a corpus back batch by batch
+def iter_command_corpus(path, batch_size=100000, limit=None):
+    """Yields DataFrames of at most batch_size rows from a Parquet or CSV corpus, stopping after limit rows."""
+    if path.endswith(".csv"):
+        batches = pd.read_csv(path, chunksize=batch_size)
+        # close the CSV file also when the reader stops early at limit
+        reader = contextlib.closing(batches)
+    else:
+        import pyarrow.parquet
+        batches = (batch.to_pandas() for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size))
+        reader = contextlib.nullcontext()
+    seen = 0
+    with reader:
+        for batch in batches:
+            if limit is not None and seen + len(batch) > limit:
+                batch = batch.iloc[:limit - seen]
+            seen += len(batch)
+            yield batch
+            if limit is not None and seen >= limit:
+                break
+
+# peak resident memory of this process
+def peak_rss_mb():
+    """Returns the peak resident set size in MB, or None where it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 2 ** 20
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+# default stages of stress_pipeline; each takes a corpus batch and returns a dict of counters
+def corpus_stages(cache=None):
+    """
+    Returns name -> stage for stress_pipeline:
+    - local_parser: parse_command_local on every command (hits = confident answers, correct = equal to the label),
+    - response_cache: ResponseCache lookups of the robmove request of every command, storing the label on a miss,
+    - score: score_completions of the parser answers against the labels,
+    - motion_check: MotionQueue envelope check of the labels.
+    The parser answers of the current batch are shared between the stages through the batch DataFrame.
+    """
+    cache = cache if cache is not None else ResponseCache(path=":memory:", max_entries=100000)
+    def local_parser(batch):
+        answers = [parse_command_local(prompt) for prompt in batch["Prompt Contents"]]
+        batch["Local Parser"] = answers
+        hits = sum(answer is not None for answer in answers)
+        return {"hits": hits, "correct": round(delta_accuracy([answer or "" for answer in answers], batch["Prompt Execution"]) * len(batch))}
+    def response_cache(batch):
+        hits = 0
+        for prompt, label in zip(batch["Prompt Contents"], batch["Prompt Execution"]):
+            key = ResponseCache.make_key("gpt-3.5-turbo", build_messages_robmove(prompt), 0)
+            if cache.get(key) is not None:
+                hits += 1
+            else:
+                cache.put(key, label, 0, 0)
+        return {"hits": hits}
+    def score(batch):
+        answered = batch["Local Parser"].notna().to_numpy()
+        result = score_completions(batch["Local Parser"][answered].tolist(), batch["Prompt Execution"][answered].tolist())
+        return {"exact": round(result["exact_match"] * result["count"])}
+    def motion_check(batch):
+        check = MotionQueue().check(batch[["delta_x", "delta_y", "delta_z"]].to_numpy(), cumulative=False)
+        return {"ok": int(check["ok"].sum())}
+    return {"local_parser": local_parser, "response_cache": response_cache, "score": score, "motion_check": motion_check}
+
+# stream a corpus through the pipeline stages and report their throughput
+def stress_pipeline(path, stages=None, batch_size=100000, limit=None):
+    """
+    Reads a corpus written by write_command_corpus batch by batch and runs every stage on each batch,
+    so memory stays flat however large the corpus is. Tracing is switched off meanwhile, as a span per
+    command would cost more than the parser itself.
+
+    Args:
+    - path (str): Parquet or CSV corpus.
+    - stages (dict): Name -> callable(batch DataFrame) returning a dict of counters; defaults to corpus_stages().
+    - batch_size (int): Rows per batch.
+    - limit (int): Stop after this many rows.
+
+    Returns:
+    - dict: Per stage the commands, seconds, commands per second, counters and the process's
+      peak RSS in MB when the stage last finished.
+    """
+    stages = stages if stages is not None else corpus_stages()
+    report = {name: {"commands": 0, "seconds": 0.0, "counters": collections.Counter(), "peak_rss_mb": None} for name in stages}
+    tracing, TRACER.enabled = TRACER.enabled, False
+    try:
+        for batch in iter_command_corpus(path, batch_size, limit):
+            for name, stage in stages.items():
+                start_time = time.perf_counter()
+                counters = stage(batch)
+                report[name]["seconds"] += time.perf_counter() - start_time
+                report[name]["commands"] += len(batch)
+                report[name]["counters"].update(counters or {})
+                report[name]["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        TRACER.enabled = tracing
+
+    print(f"{'stage':16s} {'commands':>10s} {'seconds':>9s} {'commands/s':>12s} {'peak RSS MB':>12s}  counters")
+    for name, stats in report.items():
+        stats["commands_per_second"] = stats["commands"] / stats["seconds"] if stats["seconds"] else float("nan")
+        rss = f"{stats['peak_rss_mb']:12.1f}" if stats["peak_rss_mb"] is not None else f"{'n/a':>12s}"
+        print(f"{name:16s} {stats['commands']:10d} {stats['seconds']:9.2f} {stats['commands_per_second']:12.0f} {rss}  "
+              f"{dict(stats['counters'])}")
+    return report
+
+# list prices in US dollars per million tokens (chat) or per million input characters (speech);
+# check them against the provider's current price list before relying on the cost figures
+MODEL_PRICES = {
+    "gpt-3.5-turbo": {"prompt": 0.50, "cached": 0.50, "completion": 1.50},
+    "gpt-4o": {"prompt": 2.50, "cached": 1.25, "completion": 10.00},
+    "gpt-4o-mini": {"prompt": 0.15, "cached": 0.075, "completion": 0.60},
+    "tts-1": {"characters": 15.00},
+}
+
+# counters kept per call by UsageLedger; total_tokens is derived from them
+USAGE_FIELDS = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "response_cache_hits",
+                "tts_characters", "latency", "cost")
+
+# raised before an API call once a UsageLedger budget is used up
+class BudgetExceeded(RuntimeError):
+    pass
+
+# persistent per-call record of tokens, speech characters, latency and cost
+class UsageLedger:
+    """
+    Books every API call with its session, stage (the innermost TRACER span, e.g. robmove_llm or
+    tts_stream), model, prompt/completion/cached tokens, ResponseCache hits, TTS characters, latency
+    and cost. Rows go to a SQLite file so usage can be queried across runs; running totals per
+    (session, stage, model) and per-bucket counters of the last window seconds are kept in memory,
+    so budgets and rolling aggregates cost O(1) per call however long a shift runs.
+
+    Args:
+    - path (str): SQLite file (":memory:" keeps nothing on disk).
+    - prices (dict): Model -> prices, see MODEL_PRICES; the longest matching model prefix is used,
+      so "gpt-4o-2024-08-06" is priced as "gpt-4o". Unknown models cost 0.
+    - budget (dict): Limits since the ledger was opened, e.g. {"cost": 1.0, "total_tokens": 200000};
+      keys are USAGE_FIELDS or total_tokens.
+    - window_budget (dict): Limits over the rolling window, e.g. {"cost": 0.5} per hour of a shift.
+    - window (float): Seconds of the rolling window. The window is reloaded from the file on start,
+      so a restarted process keeps counting the same shift.
+    - bucket_seconds (float): Resolution of the rolling window.
+    - warn_fraction (float): Share of a limit at which a warning is printed once.
+    - commit_interval (float): Seconds between commits of the SQLite file; close() commits the rest.
+    - scope (str): Only sessions whose name starts with scope count towards the budgets and the rolling
+      window (and are reloaded on start), e.g. "shift-" so batch runs booked in the same file do not
+      use up an operator's budget; None counts every session.
+    """
+    def __init__(self, path=os.path.join("Cache", "usage.sqlite"), prices=None, budget=None, window_budget=None,
+                 window=3600.0, bucket_seconds=60.0, warn_fraction=0.8, commit_interval=5.0, scope=None):
+        self.path = path
+        self.prices = prices if prices is not None else MODEL_PRICES
+        self.budget = budget or {}
+        self.window_budget = window_budget or {}
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.warn_fraction = warn_fraction
+        self.commit_interval = commit_interval
+        self.scope = scope
+        self.totals = {}
+        self.buckets = collections.deque()
+        self.window_totals = collections.Counter()
+        self.warned = set()
+        self.last_commit = time.time()
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS usage (
+            time REAL, session TEXT, stage TEXT, model TEXT, prompt_tokens INTEGER, completion_tokens INTEGER,
+            cached_tokens INTEGER, response_cache_hit INTEGER, tts_characters INTEGER, latency REAL, cost REAL)""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS usage_time ON usage (time)")
+        self.connection.commit()
+        self.load_window()
+
+    def in_scope(self, session):
+        """True if calls of session count towards the budgets and the rolling window."""
+        return self.scope is None or str(session).startswith(self.scope)
+
+    def price(self, model):
+        """Returns the price entry of model, matching the longest known prefix."""
+        if model in self.prices:
+            return self.prices[model]
+        matches = [name for name in self.prices if str(model).startswith(name)]
+        return self.prices[max(matches, key=len)] if matches else {}
+
+    def cost(self, model, prompt_tokens=0, completion_tokens=0, cached_tokens=0, tts_characters=0):
+        """Returns the cost in US dollars; cached tokens are part of prompt_tokens and billed at the cached price."""
+        price = self.price(model)
+        return (price.get("prompt", 0.0) * (prompt_tokens - cached_tokens) + price.get("cached", price.get("prompt", 0.0)) * cached_tokens
+                + price.get("completion", 0.0) * completion_tokens + price.get("characters", 0.0) * tts_characters) / 1e6
+
+    @staticmethod
+    def counters(prompt_tokens, completion_tokens, cached_tokens, response_cache_hit, tts_characters, latency, cost):
+        """Returns the USAGE_FIELDS counters of one call."""
+        return collections.Counter({"calls": 1, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                    "cached_tokens": cached_tokens, "response_cache_hits": int(response_cache_hit),
+                                    "tts_characters": tts_characters, "latency": latency, "cost": cost})
+
+    def add_to_window(self, timestamp, counters):
+        """Adds counters to the bucket of timestamp and drops buckets that left the window; call under self.lock."""
+        bucket = int(timestamp // self.bucket_seconds)
+        # a call that finished slightly out of order is booked in the newest bucket
+        if self.buckets and self.buckets[-1][0] >= bucket:
+            self.buckets[-1][1].update(counters)
+        else:
+            self.buckets.append((bucket, collections.Counter(counters)))
+        self.window_totals.update(counters)
+        self.expire_window(timestamp)
+
+    def expire_window(self, now):
+        """Drops buckets older than the window; call under self.lock."""
+        oldest = int((now - self.window) // self.bucket_seconds)
+        while self.buckets and self.buckets[0][0] <= oldest:
+            self.window_totals.subtract(self.buckets.popleft()[1])
+
+    def load_window(self):
+        """Fills the rolling window from the rows of the last window seconds in the file."""
+        scope = self.scope or ""
+        rows = self.connection.execute("""SELECT time, prompt_tokens, completion_tokens, cached_tokens, response_cache_hit,
+            tts_characters, latency, cost FROM usage WHERE time > ? AND substr(session, 1, ?) = ? ORDER BY time""",
+            (time.time() - self.window, len(scope), scope)).fetchall()
+        with self.lock:
+            for timestamp, *values in rows:
+                self.add_to_window(timestamp, self.counters(*values))
+
+    def record(self, model, stage=None, session="default", prompt_tokens=0, completion_tokens=0, cached_tokens=0,
+               response_cache_hit=False, tts_characters=0, latency=0.0):
+        """
+        Books one call and prints a warning the first time a budget passes warn_fraction.
+
+        Returns:
+        - float: The cost of the call in US dollars.
+        """
+        now = time.time()
+        stage = stage or "other"
+        cost = self.cost(model, prompt_tokens, completion_tokens, cached_tokens, tts_characters)
+        counters = self.counters(prompt_tokens, completion_tokens, cached_tokens, response_cache_hit, tts_characters, latency, cost)
+        with self.lock:
+            self.connection.execute("INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (now, session, stage, model, prompt_tokens, completion_tokens, cached_tokens,
+                                     int(response_cache_hit), tts_characters, latency, cost))
+            if now - self.last_commit >= self.commit_interval:
+                self.connection.commit()
+                self.last_commit = now
+            self.totals.setdefault((session, stage, model), collections.Counter()).update(counters)
+            if self.in_scope(session):
+                self.add_to_window(now, counters)
+        for budget, problem in self.over_budget(self.warn_fraction):
+            if budget not in self.warned:
+                self.warned.add(budget)
+                print(f"Usage warning: {problem}")
+        return cost
+
+    @staticmethod
+    def with_total_tokens(counters):
+        """Returns the counters as a dict with total_tokens added."""
+        result = {field: counters.get(field, 0) for field in USAGE_FIELDS}
+        result["total_tokens"] = result["prompt_tokens"] + result["completion_tokens"]
+        return result
+
+    def overall(self):
+        """Returns the counters of every call in scope booked since the ledger was opened."""
+        with self.lock:
+            counters = collections.Counter()
+            for (session, stage, model), stage_counters in self.totals.items():
+                if self.in_scope(session):
+                    counters.update(stage_counters)
+        return self.with_total_tokens(counters)
+
+    def rolling(self):
+        """Returns the counters of the calls in scope of the last window seconds, plus cost_per_hour and calls_per_minute over that window."""
+        with self.lock:
+            self.expire_window(time.time())
+            result = self.with_total_tokens(self.window_totals)
+        result["cost_per_hour"] = result["cost"] * 3600.0 / self.window
+        result["calls_per_minute"] = result["calls"] * 60.0 / self.window
+        return result
+
+    def over_budget(self, fraction=1.0):
+        """
+        Lists every budget whose usage reached fraction of its limit.
+
+        Returns:
+        - list of ((str, str), str): The budget as (scope, key), and a description with the current usage.
+        """
+        problems = []
+        for scope, limits, usage in (("since start", self.budget, self.overall() if self.budget else None),
+                                     (f"in the last {self.window:.0f} s", self.window_budget, self.rolling() if self.window_budget else None)):
+            for key, limit in limits.items():
+                if usage[key] >= fraction * limit:
+                    problems.append(((scope, key), f"{key} {usage[key]:.6g} of {limit:.6g} {scope}"))
+        return problems
+
+    def exceeded(self, fraction=1.0):
+        """Returns a description of every budget whose usage reached fraction of its limit."""
+        return [problem for budget, problem in self.over_budget(fraction)]
+
+    def check(self):
+        """Raises BudgetExceeded if a budget is used up; called before every metered API call."""
+        problems = self.exceeded()
+        if problems:
+            raise BudgetExceeded("; ".join(problems))
+
+    def summary(self, by=("stage",)):
+        """
+        Returns the counters since the ledger was opened, grouped by any of "session", "stage" and "model".
+
+        Returns:
+        - dict: Group (a name, or a tuple for several keys) -> counters with total_tokens.
+        """
+        positions = [("session", "stage", "model").index(key) for key in by]
+        groups = {}
+        with self.lock:
+            for key, counters in self.totals.items():
+                group = tuple(key[position] for position in positions)
+                groups.setdefault(group[0] if len(group) == 1 else group, collections.Counter()).update(counters)
+        return {group: self.with_total_tokens(counters) for group, counters in groups.items()}
+
+    def query(self, by=("stage",), since=None):
+        """Same as summary, but read from the file, so it covers every run since since (a Unix time)."""
+        columns = ", ".join(key for key in by if key in ("session", "stage", "model"))
+        self.flush()
+        with self.lock:
+            rows = self.connection.execute(f"""SELECT {columns}, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens),
+                SUM(cached_tokens), SUM(response_cache_hit), SUM(tts_characters), SUM(latency), SUM(cost)
+                FROM usage WHERE time >= ? GROUP BY {columns} ORDER BY {columns}""", (since or 0.0,)).fetchall()
+        width = len(by)
+        return {(row[0] if width == 1 else tuple(row[:width])): self.with_total_tokens(dict(zip(USAGE_FIELDS, row[width:])))
+                for row in rows}
+
+    def print_summary(self, by=("stage",), groups=None):
+        """Prints a usage table; groups defaults to summary(by)."""
+        groups = groups if groups is not None else self.summary(by)
+        print(f"{' / '.join(by):40s} {'calls':>6s} {'prompt':>8s} {'cached':>8s} {'complet.':>8s} {'cache hits':>10s} "
+              f"{'tts chars':>9s} {'mean ms':>8s} {'cost $':>9s}")
+        for group, stats in sorted(groups.items(), key=lambda item: str(item[0])):
+            name = " / ".join(map(str, group)) if isinstance(group, tuple) else str(group)
+            print(f"{name:40s} {stats['calls']:6d} {stats['prompt_tokens']:8d} {stats['cached_tokens']:8d} "
+                  f"{stats['completion_tokens']:8d} {stats['response_cache_hits']:10d} {stats['tts_characters']:9d} "
+                  f"{1000 * stats['latency'] / max(stats['calls'], 1):8.1f} {stats['cost']:9.4f}")
+        rolling = self.rolling()
+        print(f"Last {self.window:.0f} s: {rolling['calls']} calls, {rolling['total_tokens']} tokens, "
+              f"${rolling['cost']:.4f} (${rolling['cost_per_hour']:.4f} per hour)")
+
+    def flush(self):
+        """Commits the rows booked since the last commit."""
+        with self.lock:
+            self.connection.commit()
+            self.last_commit = time.time()
+
+    def close(self):
+        """Commits and closes the file."""
+        self.flush()
+        self.connection.close()
+
+# OpenAI client wrapper that books every chat and speech call in a UsageLedger
+class MeteredClient:
+    """
+    Wraps an OpenAI client (or a CachedClient) so that client.chat.completions.create and
+    client.audio.speech.(with_streaming_response.)create check the ledger's budgets before the call
+    and book its usage after it. The stage is the innermost TRACER span open when the call is made.
+    Streamed chat completions ask for the usage in their last chunk; if it does not come, the tokens are
+    estimated with count_tokens. Every other attribute is passed through, like CachedClient.
+
+    Args:
+    - client: The OpenAI API client, or a CachedClient to also count ResponseCache hits.
+    - ledger (UsageLedger): Where the calls are booked.
+    - session (str): Session the calls are booked under, e.g. an operator shift or a batch file.
+    """
+    def __init__(self, client, ledger, session="default"):
+        self.client = client
+        self.ledger = ledger
+        self.session = session
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_chat_completion))
+        audio = getattr(client, "audio", None)
+        self.audio = SimpleNamespace(
+            speech=SimpleNamespace(create=self.create_speech,
+                                   with_streaming_response=SimpleNamespace(create=self.create_speech_streaming)),
+            transcriptions=getattr(audio, "transcriptions", None))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def for_session(self, session):
+        """Returns a MeteredClient on the same client and ledger that books under another session."""
+        return MeteredClient(self.client, self.ledger, session)
+
+    def create_chat_completion(self, **kwargs):
+        """Metered version of client.chat.completions.create."""
+        self.ledger.check()
+        stage = TRACER.current_stage()
+        if kwargs.get("stream"):
+            kwargs.setdefault("stream_options", {"include_usage": True})
+            return self.metered_stream(kwargs, stage)
+        start_time = time.perf_counter()
+        response = self.client.chat.completions.create(**kwargs)
+        usage = response.usage
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.ledger.record(kwargs.get("model"), stage, self.session, usage.prompt_tokens, usage.completion_tokens,
+                           getattr(details, "cached_tokens", 0) or 0, getattr(response, "cache_hit", False),
+                           latency=time.perf_counter() - start_time)
+        return response
+
+    def metered_stream(self, kwargs, stage):
+        """Passes the chunks of a streamed chat completion through and books it when the stream ends."""
+        start_time = time.perf_counter()
+        usage = None
+        pieces = []
+        try:
+            for chunk in self.client.chat.completions.create(**kwargs):
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    pieces.append(chunk.choices[0].delta.content)
+                yield chunk
+        finally:
+            if usage is not None:
+                details = getattr(usage, "prompt_tokens_details", None)
+                tokens = (usage.prompt_tokens, usage.completion_tokens, getattr(details, "cached_tokens", 0) or 0)
+            else:
+                model = kwargs.get("model", "gpt-3.5-turbo")
+                prompt_text = "\n".join(str(message.get("content", "")) for message in kwargs.get("messages", []))
+                tokens = (count_tokens(prompt_text, model), count_tokens("".join(pieces), model), 0)
+            self.ledger.record(kwargs.get("model"), stage, self.session, *tokens, latency=time.perf_counter() - start_time)
+
+    def create_speech(self, **kwargs):
+        """Metered version of client.audio.speech.create."""
+        self.ledger.check()
+        stage = TRACER.current_stage()
+        start_time = time.perf_counter()
+        response = self.client.audio.speech.create(**kwargs)
+        self.ledger.record(kwargs.get("model"), stage, self.session, tts_characters=len(kwargs.get("input", "")),
+                           latency=time.perf_counter() - start_time)
+        return response
+
+    @contextlib.contextmanager
+    def create_speech_streaming(self, **kwargs):
+        """Metered version of client.audio.speech.with_streaming_response.create; booked when the response is closed."""
+        self.ledger.check()
+        stage = TRACER.current_stage()
+        start_time = time.perf_counter()
+        try:
+            with self.client.audio.speech.with_streaming_response.create(**kwargs) as response:
+                yield response
+        finally:
+            self.ledger.record(kwargs.get("model"), stage, self.session, tts_characters=len(kwargs.get("input", "")),
+                               latency=time.perf_counter() - start_time)
@@ -0,0 +1,57 @@
+"""Tests of the audio clip cache and the template confirmation spoken from clips (AudioClipCache)."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import HRILLM
+from HRILLM import AudioClipCache, CONFIRMATION_PHRASES, MotionDelta
+
+
+class AudioClipCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.synthesized = []
+        def synthesize(text, client, voice="nova", model="tts-1"):
+            self.synthesized.append(text)
+            yield text.encode("utf-8")
+        patcher = mock.patch.object(HRILLM, "synthesize_speech_chunks", synthesize)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_clips_are_reloaded_from_disk(self):
+        AudioClipCache(self.directory).preload(["Is that OK?"], None)
+        cache = AudioClipCache(self.directory)
+        self.assertEqual(cache.get_clip("Is that OK?", None), b"Is that OK?")
+        self.assertEqual(self.synthesized, ["Is that OK?"])
+
+    def test_confirmation_is_spoken_from_cached_phrases(self):
+        cache = AudioClipCache(self.directory)
+        cache.preload(CONFIRMATION_PHRASES, None)
+        del self.synthesized[:]
+        delta = MotionDelta(-5.0, 0.0, 20.0)
+        clips = [clip.decode("utf-8") for clip in cache.confirmation_clips("Move up 20 mm.", delta, None)]
+        self.assertEqual(clips, ["I heard you said", "move up 20 mm", "I will move along", "negative x-axis", "for", "5 mm",
+                                 "and", "positive z-axis", "for", "20 mm", "Is that OK?"])
+        # only the operator's words and the new distances are synthesized
+        self.assertEqual(self.synthesized, ["move up 20 mm", "5 mm", "20 mm"])
+        del self.synthesized[:]
+        list(cache.confirmation_clips("Go up 20 mm", delta, None))
+        self.assertEqual(self.synthesized, ["go up 20 mm"])
+
+    def test_operator_words_are_not_stored(self):
+        cache = AudioClipCache(self.directory)
+        list(cache.confirmation_clips("move up 20 mm", MotionDelta(0.0, 0.0, 20.0), None))
+        self.assertNotIn(cache.key("move up 20 mm"), cache.clips)
+        self.assertIn(cache.key("20 mm"), cache.clips)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Tests of the synthetic command corpus and the streaming stress harness (generate_command_corpus, stress_pipeline)."""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from HRILLM import generate_command_corpus, parse_delta_string, stress_pipeline, write_command_corpus
+
+
+class CommandCorpusTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_same_seed_gives_the_same_corpus(self):
+        first = pd.concat(generate_command_corpus(500, seed=3, batch_size=200))
+        second = pd.concat(generate_command_corpus(500, seed=3, batch_size=200))
+        pd.testing.assert_frame_equal(first, second)
+        self.assertEqual(first["Prompt ID"].tolist(), list(range(1, 501)))
+
+    def test_labels_match_the_delta_columns(self):
+        corpus = pd.concat(generate_command_corpus(500, seed=1))
+        for label, *delta in corpus[["Prompt Execution", "delta_x", "delta_y", "delta_z"]].itertuples(index=False):
+            self.assertEqual(parse_delta_string(label), tuple(delta))
+
+    def test_stress_pipeline_streams_every_row(self):
+        path = write_command_corpus(os.path.join(self.directory, "corpus.csv"), 1000, seed=2, batch_size=300)
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = stress_pipeline(path, batch_size=250, limit=900)
+        for stats in report.values():
+            self.assertEqual(stats["commands"], 900)
+        # the local parser is only confident when it is right
+        parser = report["local_parser"]["counters"]
+        self.assertGreater(parser["hits"], 0)
+        self.assertEqual(parser["correct"], parser["hits"])
+        self.assertEqual(report["score"]["counters"]["exact"], parser["hits"])
+
+
+if __name__ == "__main__":
+    unittest.main()
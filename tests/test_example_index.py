@@ -0,0 +1,39 @@
+"""Tests of the retrieval-based few-shot example store (ExampleIndex)."""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from HRILLM import ExampleIndex
+
+EXAMPLES = [("move up 5 mm", "delta_x, delta_y, delta_z = 0, 0, 5"),
+            ("move left 2 cm", "delta_x, delta_y, delta_z = -20, 0, 0"),
+            ("go forward a little bit", "delta_x, delta_y, delta_z = 0, 1, 0"),
+            ("move down 3 inches and right 10 mm", "delta_x, delta_y, delta_z = 10, 0, -76.2")]
+
+
+class ExampleIndexTest(unittest.TestCase):
+    def test_incremental_matrix_matches_a_full_build(self):
+        index = ExampleIndex()
+        for example in EXAMPLES:
+            index.add(*example)
+            index.select("move up 5 mm")
+        rebuilt = ExampleIndex(examples=EXAMPLES)
+        for text in ("move up 5 mm", "forward a bit", "right 3 inches"):
+            np.testing.assert_allclose(index.similarities(text), rebuilt.similarities(text))
+
+    def test_most_similar_example_comes_last(self):
+        index = ExampleIndex(examples=EXAMPLES)
+        self.assertEqual(index.select("move left 4 cm", k=2)[-1], EXAMPLES[1])
+
+    def test_exclude_same_leaves_out_the_prompt_itself(self):
+        index = ExampleIndex(examples=EXAMPLES)
+        self.assertIn(EXAMPLES[0], index.select("Move up 5 mm.", k=4))
+        self.assertNotIn(EXAMPLES[0], index.select("Move up 5 mm.", k=4, exclude_same=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""Tests of the rule-based command parser (parse_command_local)."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from HRILLM import parse_command_local, parse_delta_string
+
+
+class LocalParserTest(unittest.TestCase):
+    def assertDelta(self, prompt, expected):
+        result = parse_command_local(prompt)
+        self.assertIsNotNone(result, prompt)
+        for value, target in zip(parse_delta_string(result), expected):
+            self.assertAlmostEqual(value, target, places=6, msg=prompt)
+
+    def test_units(self):
+        self.assertDelta("move up 20 mm", (0.0, 0.0, 20.0))
+        self.assertDelta("move left 3 cm", (-30.0, 0.0, 0.0))
+        self.assertDelta("move back 0.5 m", (0.0, 500.0, 0.0))
+        self.assertDelta("move down 2 inches", (0.0, 0.0, -50.8))
+        self.assertDelta("move forward 1 foot", (0.0, -304.8, 0.0))
+
+    def test_missing_unit_means_millimeters(self):
+        self.assertDelta("move up 20", (0.0, 0.0, 20.0))
+        self.assertDelta("Move right 37", (37.0, 0.0, 0.0))
+
+    def test_several_clauses(self):
+        self.assertDelta("lift the arm 3 cm and go left 2 in", (-50.8, 0.0, 30.0))
+        self.assertDelta("move right 10 mm, then move up a little", (10.0, 0.0, 1.0))
+
+    def test_inch_at_the_end_of_a_clause(self):
+        self.assertDelta("move up 5 in", (0.0, 0.0, 127.0))
+        self.assertDelta("move 2 inches in negative x direction", (-50.8, 0.0, 0.0))
+
+    def test_ambiguous_in_is_left_to_the_llm(self):
+        self.assertIsNone(parse_command_local("move 3 in to the left"))
+        self.assertIsNone(parse_command_local("move 20 in x direction"))
+
+    def test_negative_numbers_are_left_to_the_llm(self):
+        self.assertIsNone(parse_command_local("move up -5 mm"))
+        self.assertDelta("move along the x-axis 5 cm", (50.0, 0.0, 0.0))
+
+    def test_unknown_words_are_left_to_the_llm(self):
+        self.assertIsNone(parse_command_local("move up until you touch the table"))
+        self.assertIsNone(parse_command_local("move up 5 mm and up 3 mm"))
+
+
+if __name__ == "__main__":
+    unittest.main()
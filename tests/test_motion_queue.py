@@ -0,0 +1,53 @@
+"""Tests of the motion envelope checks and nudge coalescing (MotionDelta, MotionQueue)."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from HRILLM import MotionDelta, MotionQueue
+
+
+class MotionQueueTest(unittest.TestCase):
+    def test_consecutive_nudges_are_merged(self):
+        queue = MotionQueue()
+        for _ in range(5):
+            queue.push(MotionDelta(0.0, 0.0, 1.0))
+        self.assertEqual([tuple(move) for move in queue.drain()], [(0.0, 0.0, 5.0)])
+        self.assertEqual(tuple(queue.position), (0.0, 0.0, 5.0))
+
+    def test_large_moves_are_not_merged(self):
+        queue = MotionQueue()
+        for delta in [(0.0, 0.0, 1.0), (0.0, 0.0, 1.0), (100.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, -1.0, 0.0)]:
+            queue.push(MotionDelta(*delta))
+        # the last two nudges cancel out and the zero move is dropped
+        self.assertEqual([tuple(move) for move in queue.drain()], [(0.0, 0.0, 2.0), (100.0, 0.0, 0.0)])
+        self.assertEqual(queue.drain(), [])
+
+    def test_unsafe_moves_are_refused(self):
+        queue = MotionQueue()
+        self.assertTrue(queue.violations(MotionDelta(1001.0, 0.0, 0.0)))
+        with self.assertRaises(ValueError):
+            queue.push(MotionDelta(0.0, 0.0, 1001.0))
+        queue.push(MotionDelta(0.0, 0.0, 800.0))
+        # pending moves count: 1600 mm up is outside the +-1500 mm workspace
+        with self.assertRaises(ValueError):
+            queue.push(MotionDelta(0.0, 0.0, 800.0))
+
+    def test_unparsable_moves_are_refused_without_the_envelope_check(self):
+        queue = MotionQueue()
+        self.assertIsNone(MotionDelta.parse("I cannot do that"))
+        with self.assertRaises(ValueError):
+            queue.push(None, check=False)
+        queue.push(MotionDelta(0.0, 0.0, 1200.0), check=False)
+        self.assertEqual(len(queue.drain()), 1)
+
+    def test_check_of_many_moves(self):
+        result = MotionQueue().check([(0.0, 0.0, 900.0), (0.0, 0.0, 900.0)], cumulative=True)
+        self.assertEqual(list(result["ok"]), [True, False])
+        result = MotionQueue().check([(0.0, 0.0, 900.0), (0.0, 0.0, 900.0)], cumulative=False)
+        self.assertEqual(list(result["ok"]), [True, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
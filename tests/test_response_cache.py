@@ -0,0 +1,62 @@
+"""Tests of the SQLite response cache (ResponseCache)."""
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from HRILLM import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def count(self, cache):
+        return cache.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def test_hit_and_miss(self):
+        cache = ResponseCache(path=":memory:")
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", "content", 3, 4)
+        self.assertEqual(cache.get("a"), ("content", 3, 4))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_eviction_keeps_recently_used_entries(self):
+        cache = ResponseCache(path=":memory:", max_entries=10)
+        for index in range(10):
+            cache.put(str(index), "content", 0, 0)
+        # touch the oldest entry so it becomes the most recently used one
+        time.sleep(0.01)
+        cache.get("0")
+        cache.put("10", "content", 0, 0)
+        self.assertLessEqual(self.count(cache), 10)
+        self.assertEqual(cache.size, self.count(cache))
+        self.assertIsNotNone(cache.get("0"))
+        self.assertIsNotNone(cache.get("10"))
+        self.assertIsNone(cache.get("1"))
+
+    def test_size_stays_bounded(self):
+        cache = ResponseCache(path=":memory:", max_entries=50)
+        for index in range(500):
+            cache.put(str(index), "content", 0, 0)
+            self.assertLessEqual(self.count(cache), 50)
+        self.assertEqual(cache.size, self.count(cache))
+
+    def test_replacing_an_entry_does_not_grow_the_count(self):
+        cache = ResponseCache(path=":memory:", max_entries=10)
+        for _ in range(5):
+            cache.put("a", "content", 0, 0)
+        self.assertEqual(cache.size, 1)
+        cache.clear()
+        self.assertEqual(cache.size, 0)
+
+    def test_expired_entries_are_dropped(self):
+        cache = ResponseCache(path=":memory:", ttl=0.0)
+        cache.put("a", "content", 0, 0)
+        time.sleep(0.01)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.size, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
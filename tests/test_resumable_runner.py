@@ -0,0 +1,82 @@
+"""Tests of the resumable batch runner and its JSONL checkpoint (run_batch_resumable, trim_checkpoint)."""
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from HRILLM import read_checkpoint, run_batch_resumable, trim_checkpoint
+
+PROMPTS = ["move up 1 cm", "move left 2 cm", "move down 3 cm", "move right 4 cm"]
+
+
+class ResumableRunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.table_path = os.path.join(self.directory, "prompts.csv")
+        with open(self.table_path, "w", encoding="utf-8") as table_file:
+            table_file.write("Prompt ID,Prompt Contents\n")
+            for row_id, prompt in enumerate(PROMPTS, 1):
+                table_file.write(f"{row_id},{prompt}\n")
+        self.checkpoint_path = os.path.join(self.directory, "prompts_Completion.jsonl")
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def generate(self, prompt, client):
+        self.calls.append(prompt)
+        return f"answer to {prompt}", SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+
+    def run_batch(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return run_batch_resumable(self.table_path, None, self.generate)
+
+    def test_resume_skips_finished_rows(self):
+        self.run_batch()
+        self.assertEqual(self.calls, PROMPTS)
+        del self.calls[:]
+        df, usage = self.run_batch()
+        self.assertEqual(self.calls, [])
+        self.assertEqual(df["Completion"].tolist(), [f"answer to {prompt}" for prompt in PROMPTS])
+        self.assertEqual(usage["total_tokens"], 15 * len(PROMPTS))
+
+    def test_resume_after_a_partially_written_line(self):
+        self.run_batch()
+        with open(self.checkpoint_path, encoding="utf-8") as checkpoint_file:
+            lines = checkpoint_file.readlines()
+        # the crash happened while the last record was being written
+        with open(self.checkpoint_path, "w", encoding="utf-8") as checkpoint_file:
+            checkpoint_file.writelines(lines[:-1])
+            checkpoint_file.write(lines[-1][:20])
+        del self.calls[:]
+        self.run_batch()
+        self.assertEqual(self.calls, PROMPTS[-1:])
+        self.assertEqual(len(read_checkpoint(self.checkpoint_path)), len(PROMPTS))
+        # the resumed record was not glued onto the fragment, so a further resume has nothing to do
+        del self.calls[:]
+        self.run_batch()
+        self.assertEqual(self.calls, [])
+
+    def test_complete_record_without_newline_is_kept(self):
+        with open(self.checkpoint_path, "w", encoding="utf-8") as checkpoint_file:
+            checkpoint_file.write(json.dumps({"id": "a"}) + "\n" + json.dumps({"id": "b"}))
+        trim_checkpoint(self.checkpoint_path)
+        with open(self.checkpoint_path, encoding="utf-8") as checkpoint_file:
+            self.assertEqual(checkpoint_file.read(), '{"id": "a"}\n{"id": "b"}\n')
+
+    def test_fragment_without_any_newline_is_removed(self):
+        with open(self.checkpoint_path, "w", encoding="utf-8") as checkpoint_file:
+            checkpoint_file.write('{"id": "a", "comp')
+        trim_checkpoint(self.checkpoint_path)
+        self.assertEqual(os.path.getsize(self.checkpoint_path), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
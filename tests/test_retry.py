@@ -0,0 +1,80 @@
+"""Tests of rate limiting and retries under concurrency (TokenBucket, call_with_retry, process_prompts_concurrent)."""
+import os
+import sys
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from HRILLM import TokenBucket, call_with_retry, process_prompts_concurrent
+
+
+class APIStatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_threads_share_the_rate(self):
+        bucket = TokenBucket(rate=50.0, capacity=5)
+        start_time = time.monotonic()
+        threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 40 tokens: a burst of 5, then 35 at 50 per second
+        self.assertGreaterEqual(time.monotonic() - start_time, 35 / 50.0 * 0.95)
+
+
+class CallWithRetryTest(unittest.TestCase):
+    def flaky(self, failures, status_code=429):
+        calls = []
+        def func(value):
+            calls.append(value)
+            if len(calls) <= failures:
+                raise APIStatusError(status_code)
+            return value
+        return func, calls
+
+    def test_retries_rate_limit_errors(self):
+        func, calls = self.flaky(2)
+        self.assertEqual(call_with_retry(func, ("ok",), max_retries=2, base_delay=0.001), "ok")
+        self.assertEqual(len(calls), 3)
+
+    def test_gives_up_after_max_retries(self):
+        func, calls = self.flaky(3)
+        with self.assertRaises(APIStatusError):
+            call_with_retry(func, ("ok",), max_retries=2, base_delay=0.001)
+        self.assertEqual(len(calls), 3)
+
+    def test_client_errors_are_not_retried(self):
+        func, calls = self.flaky(1, status_code=400)
+        with self.assertRaises(APIStatusError):
+            call_with_retry(func, ("ok",), max_retries=5, base_delay=0.001)
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrent_prompts_keep_their_order(self):
+        lock = threading.Lock()
+        attempts = {}
+        def generate(prompt, client):
+            with lock:
+                attempts[prompt] = attempts.get(prompt, 0) + 1
+                first_attempt = attempts[prompt] == 1
+            # every third prompt hits a server error once
+            if first_attempt and int(prompt) % 3 == 0:
+                raise APIStatusError(503)
+            time.sleep(0.001 * (int(prompt) % 5))
+            return f"answer {prompt}", SimpleNamespace(prompt_tokens=2, completion_tokens=1, total_tokens=3)
+        prompts = [str(number) for number in range(12)]
+        completions, usage = process_prompts_concurrent(prompts, None, generate, max_workers=4, requests_per_second=1000.0)
+        self.assertEqual(completions, [f"answer {prompt}" for prompt in prompts])
+        self.assertEqual(usage["total_tokens"], 3 * len(prompts))
+        self.assertEqual(sum(attempts.values()), len(prompts) + 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""Tests of speculative robmove interpretation on partial transcripts (SpeculativeInterpreter)."""
+import os
+import sys
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from HRILLM import SpeculativeInterpreter
+
+
+def fake_robmove(prompt, client):
+    return f"moved: {prompt}", SimpleNamespace(total_tokens=10)
+
+
+class SpeculativeInterpreterTest(unittest.TestCase):
+    def setUp(self):
+        self.speculator = SpeculativeInterpreter(None, fake_robmove, stable_seconds=0.01)
+
+    def tearDown(self):
+        self.speculator.shutdown()
+
+    def wait_for_speculation(self, text):
+        self.speculator.on_partial(text)
+        deadline = time.time() + 2
+        while time.time() < deadline:
+            speculation = next(iter(self.speculator.speculations.values()), None)
+            if speculation is not None and speculation["future"].done():
+                return
+            time.sleep(0.01)
+        self.fail("the speculation did not finish")
+
+    def call_with_timeout(self, func, *args):
+        results = []
+        worker = threading.Thread(target=lambda: results.append(func(*args)), daemon=True)
+        worker.start()
+        worker.join(timeout=2)
+        self.assertFalse(worker.is_alive(), "call did not return (deadlock)")
+        return results[0]
+
+    def test_matching_final_reuses_the_speculation(self):
+        self.wait_for_speculation("move up 5 mm")
+        result = self.call_with_timeout(self.speculator.final, "move up 5 mm")
+        self.assertEqual(result[0], "moved: move up 5 mm")
+        self.assertEqual(self.speculator.stats["reused"], 1)
+
+    def test_abandoning_a_finished_speculation_does_not_deadlock(self):
+        self.wait_for_speculation("move up")
+        result = self.call_with_timeout(self.speculator.final, "move up 5 mm")
+        self.assertEqual(result[0], "moved: move up 5 mm")
+        self.assertEqual(self.speculator.stats["abandoned"], 1)
+        self.assertEqual(self.speculator.stats["wasted_tokens"], 10)
+
+    def test_new_partial_abandons_a_finished_speculation(self):
+        self.wait_for_speculation("move up")
+        self.call_with_timeout(self.speculator.speculate, "move down")
+        self.assertEqual(self.speculator.stats["abandoned"], 1)
+        self.assertEqual(self.speculator.stats["wasted_tokens"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
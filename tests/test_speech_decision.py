@@ -0,0 +1,96 @@
+"""Tests of the spoken decision source used by confirm2action_bargein (speech_decision, VoskRecognizer)."""
+import itertools
+import json
+import os
+import sys
+import threading
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from HRILLM import EnergyVAD, SpeechRecognizer, VoskRecognizer, speech_decision, STT_SAMPLE_RATE
+
+# 30 ms of silence
+SILENT_FRAME = bytes(2 * STT_SAMPLE_RATE * 30 // 1000)
+
+
+# stands in for vosk.KaldiRecognizer: never hears anything
+class SilentKaldiRecognizer:
+    def __init__(self, model, sample_rate):
+        pass
+
+    def AcceptWaveform(self, frame):
+        return False
+
+    def PartialResult(self):
+        return json.dumps({"partial": ""})
+
+    def FinalResult(self):
+        return json.dumps({"text": ""})
+
+
+def silent_recognizer():
+    recognizer = VoskRecognizer.__new__(VoskRecognizer)
+    recognizer.vosk = SimpleNamespace(KaldiRecognizer=SilentKaldiRecognizer)
+    recognizer.model = None
+    recognizer.vad = EnergyVAD()
+    recognizer.frame_ms = 30
+    recognizer.max_seconds = 15.0
+    recognizer.last_timings = {}
+    return recognizer
+
+
+class SpeechDecisionTest(unittest.TestCase):
+    def test_transcribe_stops_within_a_frame(self):
+        recognizer = silent_recognizer()
+        stop_event = threading.Event()
+        frames_read = []
+        def frames():
+            for index in itertools.count():
+                frames_read.append(index)
+                if index == 3:
+                    stop_event.set()
+                yield SILENT_FRAME
+        self.assertEqual(recognizer.transcribe(frames(), stop_event=stop_event), "")
+        self.assertEqual(len(frames_read), 4)
+        self.assertEqual(recognizer.last_timings, {})
+
+    def test_clone_has_its_own_vad_and_timings(self):
+        recognizer = silent_recognizer()
+        twin = recognizer.clone()
+        self.assertIs(twin.model, recognizer.model)
+        self.assertIsNot(twin.vad, recognizer.vad)
+        twin.vad.speech_started = True
+        twin.last_timings["audio_seconds"] = 1.0
+        self.assertFalse(recognizer.vad.speech_started)
+        self.assertEqual(recognizer.last_timings, {})
+
+    def test_decision_source_listens_on_a_clone_and_gives_up_once_stopped(self):
+        listening = threading.Event()
+        class WaitingRecognizer(SpeechRecognizer):
+            clones = []
+            def clone(self):
+                twin = WaitingRecognizer()
+                self.clones.append(twin)
+                return twin
+            def listen(self, on_partial=None, stop_event=None):
+                listening.set()
+                stop_event.wait()
+                return ""
+        recognizer = WaitingRecognizer()
+        source = speech_decision(recognizer)
+        self.assertEqual(len(WaitingRecognizer.clones), 1)
+        stop_event = threading.Event()
+        results = []
+        worker = threading.Thread(target=lambda: results.append(source(stop_event)), daemon=True)
+        worker.start()
+        self.assertTrue(listening.wait(timeout=2))
+        stop_event.set()
+        worker.join(timeout=2)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(results, [None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests of the usage ledger (UsageLedger) and its budgets."""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from HRILLM import UsageLedger, BudgetExceeded, TRACER
+
+
+class UsageLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "usage.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cost_uses_the_cached_price_and_model_prefix(self):
+        ledger = UsageLedger(path=":memory:")
+        # 1000 uncached prompt tokens at 2.50, 1000 cached at 1.25 and 1000 completion tokens at 10.00 per million
+        cost = ledger.record("gpt-4o-2024-08-06", "robmove_llm", prompt_tokens=2000, completion_tokens=1000, cached_tokens=1000)
+        self.assertAlmostEqual(cost, (2500 + 1250 + 10000) / 1e6)
+        self.assertAlmostEqual(ledger.record("tts-1", "tts_stream", tts_characters=1000), 15.0 / 1000)
+        self.assertEqual(ledger.record("unknown-model", prompt_tokens=1000), 0.0)
+
+    def test_budget_stops_calls(self):
+        ledger = UsageLedger(path=":memory:", budget={"total_tokens": 100})
+        ledger.record("gpt-3.5-turbo", prompt_tokens=60, completion_tokens=30)
+        ledger.check()
+        ledger.record("gpt-3.5-turbo", prompt_tokens=10)
+        with self.assertRaises(BudgetExceeded):
+            ledger.check()
+
+    def test_each_budget_warns_once(self):
+        ledger = UsageLedger(path=":memory:", budget={"total_tokens": 1000, "calls": 100}, warn_fraction=0.8)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            # 850, 900, 950 and 1000 tokens are all past the warning threshold
+            ledger.record("gpt-3.5-turbo", prompt_tokens=850)
+            for _ in range(3):
+                ledger.record("gpt-3.5-turbo", prompt_tokens=50)
+        self.assertEqual(output.getvalue().count("Usage warning"), 1)
+        self.assertIn("total_tokens 850 of 1000", output.getvalue())
+
+    def test_summary_groups_by_session_stage_and_model(self):
+        ledger = UsageLedger(path=":memory:")
+        ledger.record("gpt-3.5-turbo", "robmove_llm", "a", prompt_tokens=10)
+        ledger.record("gpt-3.5-turbo", "ask4conf_llm", "a", prompt_tokens=20)
+        ledger.record("tts-1", "tts_stream", "b", tts_characters=5)
+        self.assertEqual(ledger.summary(by=("session",))["a"]["prompt_tokens"], 30)
+        self.assertEqual(ledger.summary(by=("stage", "model"))[("tts_stream", "tts-1")]["tts_characters"], 5)
+        self.assertEqual(ledger.query(by=("session",))["b"]["calls"], 1)
+
+    def test_window_is_reloaded_for_the_same_scope_only(self):
+        ledger = UsageLedger(path=self.path)
+        ledger.record("gpt-3.5-turbo", "robmove_llm", "Prompts_TestData_4_1.xlsx", prompt_tokens=100000)
+        ledger.record("gpt-3.5-turbo", "robmove_llm", "shift-1", prompt_tokens=10)
+        ledger.close()
+        ledger = UsageLedger(path=self.path, scope="shift-", window_budget={"prompt_tokens": 1000})
+        self.assertEqual(ledger.rolling()["prompt_tokens"], 10)
+        ledger.check()
+        # sessions outside the scope are booked but do not count towards the budgets
+        ledger.record("gpt-3.5-turbo", "robmove_llm", "batch", prompt_tokens=5000)
+        ledger.check()
+        ledger.record("gpt-3.5-turbo", "robmove_llm", "shift-2", prompt_tokens=1000)
+        with self.assertRaises(BudgetExceeded):
+            ledger.check()
+        ledger.close()
+
+    def test_window_drops_old_buckets(self):
+        ledger = UsageLedger(path=":memory:", window=180.0, bucket_seconds=60.0)
+        with ledger.lock:
+            ledger.add_to_window(1000.0, UsageLedger.counters(10, 0, 0, False, 0, 0.0, 0.0))
+            ledger.add_to_window(1100.0, UsageLedger.counters(20, 0, 0, False, 0, 0.0, 0.0))
+            self.assertEqual(ledger.window_totals["prompt_tokens"], 30)
+            # the bucket of the first call (960-1020 s) has left the window of the last 180 s
+            ledger.expire_window(1150.0)
+            self.assertEqual(ledger.window_totals["prompt_tokens"], 20)
+
+    def test_stage_is_the_innermost_span(self):
+        with TRACER.span("outer"):
+            with TRACER.span("inner"):
+                self.assertEqual(TRACER.current_stage(), "inner")
+            self.assertEqual(TRACER.current_stage(), "outer")
+        self.assertIsNone(TRACER.current_stage())
+
+
+if __name__ == "__main__":
+    unittest.main()